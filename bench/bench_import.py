@@ -0,0 +1,82 @@
+"""
+
+Benchmark the cold-start cost of importing dimensionful.
+
+Each case runs in a fresh interpreter, so nothing is cached between runs. The
+"everything" case builds all common units and constants, which is what
+``import dimensionful`` used to do.
+
+    $ python bench/bench_import.py
+    $ python bench/bench_import.py --path /some/other/checkout
+
+To compare with an older version, check it out somewhere else (for example
+with ``git worktree add /tmp/old <rev>``) and run with ``--path``.
+
+Copyright 2012, Casey W. Stark. See LICENSE.txt for more information.
+
+"""
+
+import os
+import subprocess
+import sys
+
+repo_path = os.path.join(os.path.dirname(os.path.abspath(__file__)),
+                         os.pardir)
+
+cases = [
+    ("import dimensionful", "import dimensionful"),
+    ("from dimensionful import Msun", "from dimensionful import Msun"),
+    ("from dimensionful import G", "from dimensionful import G"),
+    ("everything", "from dimensionful import *"),
+]
+
+# Prints the import time in seconds and whether sympy got loaded.
+timing_script = """
+import sys
+from timeit import default_timer as clock
+start = clock()
+%s
+print("%%r %%r" %% (clock() - start, "sympy" in sys.modules))
+"""
+
+
+def time_import(statement, path, repeat):
+    """
+    Run `statement` in `repeat` fresh interpreters with `path` first on the
+    module search path. Return the fastest time and whether sympy was loaded.
+
+    """
+    env = dict(os.environ)
+    env["PYTHONPATH"] = os.path.abspath(path)
+    env["PYTHONDONTWRITEBYTECODE"] = ""
+
+    times = []
+    for i in range(repeat):
+        output = subprocess.check_output(
+            [sys.executable, "-c", timing_script % statement], env=env,
+            cwd=path)
+        seconds, sympy_loaded = output.decode().split()
+        times.append(float(seconds))
+
+    return min(times), sympy_loaded == "True"
+
+
+def main(path=repo_path, repeat=5):
+    # warm the bytecode cache, so we time imports rather than compiling
+    time_import("from dimensionful import *", path, 1)
+
+    print("%-32s %10s %8s" % ("case", "time (ms)", "sympy"))
+    results = {}
+    for name, statement in cases:
+        seconds, sympy_loaded = time_import(statement, path, repeat)
+        results[name] = seconds
+        print("%-32s %10.1f %8s" % (name, seconds * 1e3,
+                                    "yes" if sympy_loaded else "no"))
+    return results
+
+
+if __name__ == "__main__":
+    if "--path" in sys.argv:
+        main(path=sys.argv[sys.argv.index("--path") + 1])
+    else:
+        main()
@@ -0,0 +1,102 @@
+"""
+
+Benchmark the memory used by scalar quantities.
+
+Builds a million scalar quantities with the same units in a fresh interpreter,
+and reports the bytes per instance (the list holding them is not counted).
+The float data is made before measuring, so only the Quantity objects count.
+
+    $ python bench/bench_memory.py
+    $ python bench/bench_memory.py --path /some/other/checkout
+
+To compare with an older version, check it out somewhere else (for example
+with ``git worktree add /tmp/old <rev>``) and run with ``--path``.
+
+Copyright 2012, Casey W. Stark. See LICENSE.txt for more information.
+
+"""
+
+import os
+import subprocess
+import sys
+
+repo_path = os.path.join(os.path.dirname(os.path.abspath(__file__)),
+                         os.pardir)
+
+cases = [
+    ("Quantity", "from dimensionful.quantity import Quantity as cls"),
+    ("ScalarQuantity",
+     "from dimensionful.quantity import ScalarQuantity as cls"),
+]
+
+# Prints the bytes per instance. Uses tracemalloc when it is available, and
+# sys.getsizeof of the object and its __dict__ otherwise (Python 2).
+memory_script = """
+import gc
+import sys
+%s
+from dimensionful.units import Unit
+
+number = %d
+units = Unit("Msun")
+values = [float(i) for i in range(number)]
+
+try:
+    import tracemalloc
+except ImportError:
+    tracemalloc = None
+
+gc.collect()
+if tracemalloc is not None:
+    tracemalloc.start()
+    start = tracemalloc.get_traced_memory()[0]
+quantities = [cls(value, units) for value in values]
+if tracemalloc is not None:
+    used = tracemalloc.get_traced_memory()[0] - start
+    tracemalloc.stop()
+else:
+    q = quantities[0]
+    used = sys.getsizeof(q)
+    if hasattr(q, "__dict__"):
+        used += sys.getsizeof(q.__dict__)
+    used = used * number + sys.getsizeof(quantities)
+used -= sys.getsizeof(quantities)
+print(repr(float(used) / number))
+"""
+
+
+def measure(statement, path, number):
+    """
+    Return the bytes per instance of `number` quantities made by the class
+    that `statement` imports as ``cls``, with `path` first on the module
+    search path. Returns None if the class does not exist there.
+
+    """
+    env = dict(os.environ)
+    env["PYTHONPATH"] = os.path.abspath(path)
+
+    try:
+        output = subprocess.check_output(
+            [sys.executable, "-c", memory_script % (statement, number)],
+            env=env, cwd=path, stderr=subprocess.STDOUT)
+    except subprocess.CalledProcessError:
+        return None
+    return float(output.decode().split()[-1])
+
+
+def main(path=repo_path, number=10**6):
+    print("%-32s %16s" % ("case", "bytes/instance"))
+    results = {}
+    for name, statement in cases:
+        bytes_per_instance = measure(statement, path, number)
+        results[name] = bytes_per_instance
+        print("%-32s %16s" % (name, "-" if bytes_per_instance is None
+                              else "%.1f" % bytes_per_instance))
+    return results
+
+
+if __name__ == "__main__":
+    if "--path" in sys.argv:
+        main(path=sys.argv[sys.argv.index("--path") + 1])
+    else:
+        main()
@@ -0,0 +1,113 @@
+"""
+
+Benchmark how the parallel backends scale with the number of workers.
+
+Times a conversion, an addition with a conversion, and a sum over one big
+array, with plain numpy and with 1, 2, 4, ... threads and processes up to
+the number of cores. For processes, the data is moved into shared memory
+before timing, like it would be for a chain of operations.
+
+    $ python bench/bench_parallel.py
+    $ python bench/bench_parallel.py --size 100000000 --workers 16
+
+Copyright 2012, Casey W. Stark. See LICENSE.txt for more information.
+
+"""
+
+import os
+import sys
+from multiprocessing import cpu_count
+from timeit import default_timer as clock
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)),
+                                os.pardir))
+
+import numpy as np
+
+from dimensionful.parallel import ProcessBackend, ThreadBackend
+from dimensionful.quantity import Quantity
+
+
+def best_time(function, repeat=3):
+    best = None
+    for i in range(repeat):
+        start = clock()
+        function()
+        elapsed = clock() - start
+        best = elapsed if best is None else min(best, elapsed)
+    return best
+
+
+def worker_counts(most):
+    """ 1, 2, 4, ... up to `most`, and `most` itself. """
+    counts = []
+    count = 1
+    while count < most:
+        counts.append(count)
+        count *= 2
+    return counts + [most]
+
+
+def make_cases(backend, size):
+    q1 = backend.share(Quantity(np.random.random(size), "Msun"))
+    q2 = backend.share(Quantity(np.random.random(size), "g"))
+
+    def convert():
+        backend.convert_to(q1, "g")
+        backend.convert_to(q1, "Msun")
+
+    return [("convert_to x2", convert),
+            ("add", lambda: backend.add(q1, q2)),
+            ("sum", lambda: backend.sum(q1))]
+
+
+def numpy_cases(size):
+    data = np.random.random(size)
+    other = np.random.random(size)
+    factor = 1.0 / 1.98892e33
+
+    def convert():
+        data.__imul__(1.98892e33)
+        data.__imul__(factor)
+
+    return [("convert_to x2", convert),
+            ("add", lambda: data + other * factor),
+            ("sum", lambda: data.sum())]
+
+
+def main(size=10**8, most_workers=None):
+    most_workers = most_workers or cpu_count()
+    print("%d elements, %d cores" % (size, cpu_count()))
+    print("%-16s %8s %8s %12s %10s" % ("case", "backend", "workers",
+                                       "seconds", "speedup"))
+
+    baseline = {}
+    for name, function in numpy_cases(size):
+        baseline[name] = best_time(function)
+        print("%-16s %8s %8s %12.4f %10s" % (name, "numpy", "", baseline[name],
+                                             "1.00"))
+
+    # one worker runs in this process, so that row is the backend overhead
+    results = {}
+    for kind, backend_class, most_chunk in [("thread", ThreadBackend, 2**18),
+                                            ("process", ProcessBackend, 2**20)]:
+        for workers in worker_counts(most_workers):
+            # at least a few chunks per worker, to share the work out evenly
+            chunk_size = max(min(most_chunk, size // (4 * workers)), 1)
+            with backend_class(workers, chunk_size) as backend:
+                for name, function in make_cases(backend, size):
+                    seconds = best_time(function)
+                    results[(name, kind, workers)] = seconds
+                    print("%-16s %8s %8d %12.4f %10.2f" % (
+                        name, kind, workers, seconds,
+                        baseline[name] / seconds))
+    return results
+
+
+if __name__ == "__main__":
+    def option(flag, default):
+        if flag in sys.argv:
+            return int(sys.argv[sys.argv.index(flag) + 1])
+        return default
+
+    main(option("--size", 10**8), option("--workers", None))
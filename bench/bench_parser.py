@@ -0,0 +1,80 @@
+"""
+
+Benchmark the unit string parser against the sympy parsing path.
+
+Times building a Unit from each unit string used in `test/test_units.py`, once
+through `sympy.parsing.sympy_parser.parse_expr` and the sympy expression path
+of the Unit constructor, and once through `dimensionful.parser`. The intern
+table is bypassed, so every call does the full work.
+
+    $ python bench/bench_parser.py
+
+Copyright 2012, Casey W. Stark. See LICENSE.txt for more information.
+
+"""
+
+import os
+import re
+import sys
+import timeit
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)),
+                                os.pardir))
+
+from sympy.parsing.sympy_parser import parse_expr
+
+from dimensionful.parser import parse_unit_string
+from dimensionful.units import Unit
+
+test_file = os.path.join(os.path.dirname(os.path.abspath(__file__)),
+                         os.pardir, "test", "test_units.py")
+
+
+def get_unit_strings():
+    """ Collect the valid unit strings from the unit tests. """
+    unit_strings = []
+    for unit_string in re.findall(r'Unit\("([^"]+)"', open(test_file).read()):
+        try:
+            parse_unit_string(unit_string)
+        except Exception:
+            continue
+        if unit_string not in unit_strings:
+            unit_strings.append(unit_string)
+    return unit_strings
+
+
+def sympy_path(unit_string):
+    return Unit._build(parse_expr(unit_string), None, None)
+
+
+def parser_path(unit_string):
+    return Unit._build(unit_string, None, None)
+
+
+def time_call(function, unit_string, number):
+    timer = timeit.Timer(lambda: function(unit_string))
+    return min(timer.repeat(repeat=3, number=number)) / number
+
+
+def main(number=200):
+    print("%-28s %12s %12s %12s %8s" % ("unit string", "sympy (us)",
+                                         "parser (us)", "Unit (us)",
+                                         "speedup"))
+    total_sympy = total_unit = 0.0
+    for unit_string in get_unit_strings():
+        t_sympy = time_call(sympy_path, unit_string, number)
+        t_parse = time_call(parse_unit_string, unit_string, number)
+        t_unit = time_call(parser_path, unit_string, number)
+        total_sympy += t_sympy
+        total_unit += t_unit
+        print("%-28s %12.1f %12.1f %12.1f %7.1fx" %
+              (unit_string, t_sympy * 1e6, t_parse * 1e6, t_unit * 1e6,
+               t_sympy / t_unit))
+
+    print("")
+    print("total speedup of Unit construction: %.1fx" %
+          (total_sympy / total_unit))
+
+
+if __name__ == "__main__":
+    main()
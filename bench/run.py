@@ -0,0 +1,470 @@
+"""
+
+Benchmark suite for the hot paths of Unit and Quantity.
+
+Runs offline and covers unit construction, unit algebra, scalar and array
+Quantity arithmetic, conversions, comparisons, cold import time, peak memory,
+and the scripts in `example/` end to end. Peak memory comes from tracemalloc,
+or on Python 2 from the size of the new arrays each case returns.
+
+    $ python bench/run.py                          # run and print
+    $ python bench/run.py --save results.json      # also save JSON results
+    $ python bench/run.py --save-baseline          # store bench/baseline.json
+    $ python bench/run.py --compare                # compare to the baseline
+    $ python bench/run.py --compare old.json --threshold 0.25
+    $ python bench/run.py --quick --filter convert
+
+With ``--compare``, the run fails (exit status 1) if any benchmark got slower,
+or used more memory, than the baseline by more than the threshold (a fraction,
+0.2 by default).
+
+Copyright 2012, Casey W. Stark. See LICENSE.txt for more information.
+
+"""
+
+import json
+import os
+import platform
+import runpy
+import sys
+import time
+import timeit
+
+bench_path = os.path.dirname(os.path.abspath(__file__))
+repo_path = os.path.join(bench_path, os.pardir)
+sys.path.insert(0, repo_path)
+sys.path.insert(0, bench_path)
+
+import numpy as np
+
+from dimensionful import units
+from dimensionful.units import Unit
+from dimensionful.quantity import Quantity
+from dimensionful.quantity_array import QuantityArray
+from dimensionful.decorators import check_units
+from dimensionful.lazy import lazy
+from dimensionful.table import QuantityTable
+
+import bench_import
+
+try:
+    import tracemalloc
+except ImportError:  # Python 2
+    tracemalloc = None
+
+default_baseline = os.path.join(bench_path, "baseline.json")
+
+array_sizes = [10**3, 10**6, 10**7]
+
+# List of (group name, make) pairs. `make` takes the list of array sizes and
+# returns a list of (case name, function to time) pairs.
+benchmarks = []
+
+def benchmark(name):
+    """ Register a benchmark. See `benchmarks`. """
+    def decorator(make):
+        benchmarks.append((name, make))
+        return make
+    return decorator
+
+
+### Unit construction
+simple_unit_string = "Msun"
+compound_unit_string = "Msun * Mpc**-3 * km**2 * s**(-1/2)"
+
+@benchmark("unit.construct")
+def unit_construct(sizes):
+    cases = []
+    for kind, unit_string in (("simple", simple_unit_string),
+                              ("compound", compound_unit_string)):
+        Unit(unit_string)
+        cases.append(("%s.interned" % kind,
+                      lambda unit_string=unit_string: Unit(unit_string)))
+        cases.append(("%s.parse" % kind,
+                      lambda unit_string=unit_string:
+                      Unit._build(unit_string, None, None)))
+    return cases
+
+### Unit algebra
+@benchmark("unit.algebra")
+def unit_algebra(sizes):
+    a = Unit("cm**3 * g**-1 * s**-2")
+    b = Unit("Msun")
+    c = Unit("AU")
+
+    def formula():
+        return a * b * b / c**2
+
+    def uncached():
+        units.algebra_cache.clear()
+        return a * b * b / c**2
+
+    return [("memoized", formula), ("uncached", uncached)]
+
+### Quantity arithmetic
+def arithmetic_cases(q1, q2, q3):
+    """ q1 and q2 have the same units, q3 compatible ones. """
+    return [("add", lambda: q1 + q2),
+            ("add_convert", lambda: q1 + q3),
+            ("sub", lambda: q1 - q3),
+            ("mul", lambda: q1 * q2),
+            ("div", lambda: q1 / q2),
+            ("pow", lambda: q1**2)]
+
+@benchmark("quantity.scalar")
+def quantity_scalar(sizes):
+    return arithmetic_cases(Quantity(1.0, "km"), Quantity(2.0, "km"),
+                            Quantity(3.0, "m"))
+
+def array_benchmark(name, make_cases):
+    """ Register a benchmark that runs for each array size. """
+    @benchmark(name)
+    def make(sizes):
+        cases = []
+        for size in sizes:
+            for case, function in make_cases(size):
+                cases.append(("%s.%d" % (case, size), function))
+        return cases
+    return make
+
+def array_quantities(size, cls=Quantity):
+    data = np.random.random(size) + 1.0
+    return (cls(data, "km"), cls(data.copy(), "km"),
+            cls(data.copy(), "m"))
+
+array_benchmark("quantity.array",
+                lambda size: arithmetic_cases(*array_quantities(size)))
+array_benchmark("quantity_array.ufunc",
+                lambda size: arithmetic_cases(
+                    *array_quantities(size, QuantityArray)))
+
+def in_place_cases(size):
+    q1, q2, q3 = array_quantities(size)
+
+    def iadd_convert():
+        q1.__iadd__(q3)
+        q1.__isub__(q3)
+
+    return [("iadd_convert", iadd_convert)]
+
+array_benchmark("quantity.in_place", in_place_cases)
+
+def lazy_cases(size):
+    a, b, c = array_quantities(size)
+
+    def formula(a, b, c):
+        return (a * a + 3 * b * b - a * c) / (b * 2)
+
+    def lazy_formula():
+        return formula(*lazy(a, b, c)).data
+
+    return [("eager", lambda: formula(a, b, c)), ("lazy", lazy_formula)]
+
+array_benchmark("quantity.formula", lazy_cases)
+
+def table_cases(size):
+    names = ["mass", "distance", "velocity", "luminosity"]
+    units = ["Msun", "pc", "km / s", "erg / s"]
+    table = QuantityTable([(name, QuantityArray(np.random.random(size), u))
+                           for name, u in zip(names, units)])
+    batch = table[:max(size // 100, 1)].copy()
+    cut = Quantity(1.0, "ly")
+
+    def to_system():
+        table.to_system("cgs")
+        table.convert_to(dict(zip(names, units)))
+
+    def append():
+        grown = QuantityTable(batch)
+        for i in range(100):
+            grown.append(batch)
+
+    return [("to_system", to_system), ("append", append),
+            ("select", lambda: table.select(table["distance"] < cut))]
+
+array_benchmark("table", table_cases)
+
+### Conversions
+def conversion_cases(size):
+    if size is None:
+        q1 = Quantity(1.0, "Msun / yr")
+    else:
+        q1 = Quantity(np.random.random(size), "Msun / yr")
+    target = Unit("g / s")
+    back = Unit("Msun / yr")
+
+    def convert_to():
+        q1.convert_to(target)
+        q1.convert_to(back)
+
+    return [("convert_to", convert_to),
+            ("get_in", lambda: q1.get_in(target)),
+            ("get_in_string", lambda: q1.get_in("g / s")),
+            ("get_data_in", lambda: q1.get_data_in(target)),
+            ("get_data_in_same", lambda: q1.get_data_in(back))]
+
+@benchmark("convert.scalar")
+def convert_scalar(sizes):
+    return conversion_cases(None)
+
+array_benchmark("convert.array", conversion_cases)
+
+### Comparisons
+@benchmark("compare.scalar")
+def compare_scalar(sizes):
+    q1 = Quantity(1.0, "km")
+    q2 = Quantity(2000.0, "m")
+    return [("lt", lambda: q1 < q2), ("le", lambda: q1 <= q2),
+            ("eq", lambda: q1 == q2), ("ne", lambda: q1 != q2),
+            ("ge", lambda: q1 >= q2), ("gt", lambda: q1 > q2)]
+
+@benchmark("compare.array")
+def compare_array(sizes):
+    cases = []
+    for size in sizes:
+        q1, q2, q3 = array_quantities(size, QuantityArray)
+        cases += [("lt.%d" % size, lambda q1=q1, q3=q3: q1 < q3),
+                  ("le.%d" % size, lambda q1=q1, q3=q3: q1 <= q3),
+                  ("eq.%d" % size, lambda q1=q1, q3=q3: q1 == q3),
+                  ("ne.%d" % size, lambda q1=q1, q3=q3: q1 != q3),
+                  ("ge.%d" % size, lambda q1=q1, q3=q3: q1 >= q3),
+                  ("gt.%d" % size, lambda q1=q1, q3=q3: q1 > q3)]
+    return cases
+
+### Decorated formulas
+@benchmark("check_units")
+def decorated_formula(sizes):
+    def formula(P, dP, dt, M1, M2):
+        return dP * M1 * M2 / (3 * P * dt * (M1 - M2))
+
+    decorated = check_units("day", "s", "yr", "Msun", "Msun",
+                            output="Msun / yr")(formula)
+    args = (Quantity(2.49, "day"), Quantity(20.0, "s"), Quantity(100.0, "yr"),
+            Quantity(2.9, "Msun"), Quantity(1.4, "Msun"))
+
+    def plain():
+        formula(*args).convert_to("Msun / yr")
+
+    return [("plain", plain), ("decorated", lambda: decorated(*args))]
+
+### End to end
+class NullWriter(object):
+    def write(self, text):
+        pass
+
+    def flush(self):
+        pass
+
+def example_case(path):
+    def run():
+        stdout = sys.stdout
+        sys.stdout = NullWriter()
+        try:
+            runpy.run_path(path)
+        finally:
+            sys.stdout = stdout
+    return run
+
+@benchmark("example")
+def examples(sizes):
+    example_path = os.path.join(repo_path, "example")
+    return [(name[:-3], example_case(os.path.join(example_path, name)))
+            for name in sorted(os.listdir(example_path))
+            if name.endswith(".py")]
+
+
+def time_function(function, min_time=0.2, repeat=3):
+    """
+    Return the best time per call of `function`, in seconds. The number of
+    calls per repeat is scaled so each repeat takes about `min_time`.
+
+    """
+    timer = timeit.Timer(function)
+    number = 1
+    while True:
+        elapsed = timer.timeit(number)
+        if elapsed >= min_time or number >= 10**6:
+            break
+        number *= 10 if elapsed < min_time / 10 else 2
+
+    return min([elapsed] + timer.repeat(repeat - 1, number)) / number
+
+
+def peak_memory(function):
+    """
+    Return the peak bytes allocated while calling `function` once. Without
+    tracemalloc (Python 2), return `new_bytes` instead.
+
+    """
+    if tracemalloc is None:
+        return new_bytes(function)
+    tracemalloc.start()
+    try:
+        start = tracemalloc.get_traced_memory()[0]
+        function()
+        peak = tracemalloc.get_traced_memory()[1]
+    finally:
+        tracemalloc.stop()
+    return peak - start
+
+
+def find_arrays(value, found, depth=3):
+    """ Add the numpy arrays in `value` (and a few levels into it). """
+    if isinstance(value, np.ndarray):
+        found.append(value)
+    elif depth == 0:
+        return
+    elif isinstance(value, (list, tuple)):
+        for item in value:
+            find_arrays(item, found, depth - 1)
+    elif isinstance(value, dict):
+        for item in value.values():
+            find_arrays(item, found, depth - 1)
+    elif isinstance(value, (Quantity, QuantityTable)):
+        for name in ("data", "_buffers"):
+            find_arrays(getattr(value, name, None), found, depth - 1)
+
+
+def new_bytes(function):
+    """
+    Return the bytes of the new arrays `function` returns, plus the size of
+    the object itself. Arrays that share memory with the function's inputs
+    (its closure and defaults) are not new. Temporaries made during the call
+    are not seen, so this is a lower bound on the peak, for Python 2 where
+    tracemalloc is missing.
+
+    """
+    inputs = []
+    cells = [cell.cell_contents for cell in
+             getattr(function, "__closure__", None) or ()]
+    find_arrays(cells + list(getattr(function, "__defaults__", None) or ()),
+                inputs)
+
+    result = function()
+    outputs = []
+    find_arrays(result, outputs)
+    # getsizeof of an array counts the data it owns, which is counted below
+    total = 0 if isinstance(result, np.ndarray) else sys.getsizeof(result)
+    for array in outputs:
+        if not any(np.may_share_memory(array, old) for old in inputs):
+            total += array.nbytes
+    return total
+
+
+def run(sizes=array_sizes, name_filter=None, min_time=0.2):
+    """
+    Run the benchmarks and return a dict of results, keyed on the benchmark
+    name. Each result has the time per call in `seconds` and `peak_bytes`.
+
+    """
+    results = {}
+    def report(name, seconds, peak_bytes):
+        results[name] = {"seconds": seconds, "peak_bytes": peak_bytes}
+        print("%-48s %12.3f us %14s" % (
+            name, seconds * 1e6,
+            "-" if peak_bytes is None else "%d B" % peak_bytes))
+        sys.stdout.flush()
+
+    for group, make in benchmarks:
+        for case, function in make(sizes):
+            name = "%s.%s" % (group, case)
+            if name_filter and name_filter not in name:
+                continue
+            report(name, time_function(function, min_time=min_time),
+                   peak_memory(function))
+
+    # cold imports, each in a fresh interpreter
+    for case, statement in bench_import.cases:
+        name = "import.%s" % case.replace(" ", "_")
+        if name_filter and name_filter not in name:
+            continue
+        report(name, bench_import.time_import(statement, repo_path, 3)[0],
+               None)
+
+    return results
+
+
+def compare(results, baseline, threshold):
+    """
+    Print how `results` compare to `baseline`. Return the names of the
+    benchmarks that regressed by more than `threshold`.
+
+    """
+    regressions = []
+    print("")
+    print("%-48s %10s %10s" % ("benchmark", "time", "memory"))
+    for name in sorted(results):
+        if name not in baseline:
+            continue
+        old, new = baseline[name], results[name]
+        time_ratio = new["seconds"] / old["seconds"]
+        memory_ratio = None
+        if new["peak_bytes"] and old["peak_bytes"]:
+            memory_ratio = float(new["peak_bytes"]) / old["peak_bytes"]
+
+        regressed = time_ratio > 1 + threshold or \
+            (memory_ratio is not None and memory_ratio > 1 + threshold)
+        if regressed:
+            regressions.append(name)
+        print("%-48s %9.2fx %10s %s" % (
+            name, time_ratio,
+            "-" if memory_ratio is None else "%9.2fx" % memory_ratio,
+            "REGRESSION" if regressed else ""))
+
+    return regressions
+
+
+def metadata():
+    return {"python": platform.python_version(),
+            "numpy": np.__version__,
+            "platform": platform.platform(),
+            "time": time.strftime("%Y-%m-%dT%H:%M:%S")}
+
+
+def main(argv):
+    def option(flag, default=None):
+        if flag not in argv:
+            return default
+        index = argv.index(flag)
+        if index + 1 < len(argv) and not argv[index + 1].startswith("--"):
+            return argv[index + 1]
+        return True
+
+    sizes = [10**3, 10**5] if "--quick" in argv else array_sizes
+    min_time = 0.05 if "--quick" in argv else 0.2
+    results = run(sizes, option("--filter"), min_time)
+    output = {"metadata": metadata(), "results": results}
+
+    save_path = option("--save")
+    if save_path:
+        with open(save_path, "w") as f:
+            json.dump(output, f, indent=2, sort_keys=True,
+                      separators=(",", ": "))
+
+    if "--save-baseline" in argv:
+        baseline_path = option("--save-baseline")
+        if baseline_path is True:
+            baseline_path = default_baseline
+        with open(baseline_path, "w") as f:
+            json.dump(output, f, indent=2, sort_keys=True,
+                      separators=(",", ": "))
+
+    compare_path = option("--compare")
+    if compare_path:
+        if compare_path is True:
+            compare_path = default_baseline
+        with open(compare_path) as f:
+            baseline = json.load(f)["results"]
+        threshold = float(option("--threshold", 0.2))
+        regressions = compare(results, baseline, threshold)
+        if regressions:
+            print("")
+            print("%d benchmarks regressed by more than %d%%." %
+                  (len(regressions), threshold * 100))
+            return 1
+
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main(sys.argv[1:]))
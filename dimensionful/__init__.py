@@ -2,12 +2,43 @@
 
 Package level imports.
 
+Everything is imported on first use, so ``import dimensionful`` is cheap and
+does not load sympy. ``from dimensionful import Msun`` only builds Msun.
+
 Copyright 2012, Casey W. Stark. See LICENSE.txt for more information.
 
 """
 
-from dimensionful.units import Unit
-from dimensionful.quantity import Quantity
+from dimensionful import common_units, constants
+from dimensionful.lazy_import import install_lazy_attributes
+
+def make_attribute_factory(module_name, name):
+    """ Return a function that gets `name` from the module `module_name`. """
+    def get_attribute():
+        module = __import__(module_name, fromlist=[name])
+        return getattr(module, name)
+    return get_attribute
+
+package_attributes = {
+    "Unit": "dimensionful.units",
+    "UnitRegistry": "dimensionful.units",
+    "register_unit": "dimensionful.units",
+    "Quantity": "dimensionful.quantity",
+    "ScalarQuantity": "dimensionful.quantity",
+    "QuantityArray": "dimensionful.quantity_array",
+    "QuantityTable": "dimensionful.table",
+    "trusted": "dimensionful.quantity",
+    "check_units": "dimensionful.decorators",
+    "stats": "dimensionful.instrument",
+    "profile": "dimensionful.instrument",
+}
+for name in common_units.__all__:
+    package_attributes[name] = "dimensionful.common_units"
+for name in constants.__all__:
+    package_attributes[name] = "dimensionful.constants"
+
+__all__ = sorted(package_attributes)
 
-from dimensionful.common_units import *
-from dimensionful.constants import *
+install_lazy_attributes(__name__, dict(
+    (name, make_attribute_factory(module_name, name))
+    for name, module_name in package_attributes.items()))
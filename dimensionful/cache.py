@@ -0,0 +1,100 @@
+"""
+
+A small thread-safe LRU cache, used to intern units and memoize unit work.
+
+Copyright 2012, Casey W. Stark. See LICENSE.txt for more information.
+
+"""
+
+from collections import OrderedDict
+from threading import Lock
+
+
+class LRUCache(object):
+    """
+    A bounded mapping that evicts the least recently used entry when full, and
+    counts hits and misses. All methods are safe to call from multiple
+    threads.
+
+    """
+
+    def __init__(self, maxsize=1024):
+        """
+        Parameters
+        ----------
+        maxsize : int
+            The most entries to keep. 0 disables caching, None means no bound.
+
+        """
+        self._data = OrderedDict()
+        self._lock = Lock()
+        self.maxsize = maxsize
+        self.hits = 0
+        self.misses = 0
+
+    def __len__(self):
+        return len(self._data)
+
+    def __contains__(self, key):
+        return key in self._data
+
+    def get(self, key, default=None):
+        """
+        Return the value for `key` and mark it as recently used, or `default`
+        if it is not cached. Counts a hit or a miss.
+
+        """
+        with self._lock:
+            try:
+                value = self._data.pop(key)
+            except KeyError:
+                self.misses += 1
+                return default
+            self._data[key] = value
+            self.hits += 1
+            return value
+
+    def setdefault(self, key, value):
+        """
+        Store `value` under `key` unless another thread got there first, and
+        return whichever value is cached. This keeps cached objects unique.
+
+        """
+        with self._lock:
+            if key in self._data:
+                return self._data[key]
+            if self.maxsize == 0:
+                return value
+            self._data[key] = value
+            self._evict()
+            return value
+
+    def resize(self, maxsize):
+        """ Change the maximum size, evicting old entries if needed. """
+        with self._lock:
+            self.maxsize = maxsize
+            self._evict()
+
+    def clear(self):
+        """ Drop all entries and reset the statistics. """
+        with self._lock:
+            self._data.clear()
+            self.hits = 0
+            self.misses = 0
+
+    def info(self):
+        """
+        Return a dict with the `hits`, `misses`, `maxsize`, and current `size`
+        of the cache.
+
+        """
+        with self._lock:
+            return {"hits": self.hits, "misses": self.misses,
+                    "maxsize": self.maxsize, "size": len(self._data)}
+
+    def _evict(self):
+        # caller holds the lock
+        if self.maxsize is None:
+            return
+        while len(self._data) > self.maxsize:
+            self._data.popitem(last=False)
@@ -2,42 +2,66 @@
 
 Define some common units, so users can import the objects directly.
 
+The units are built the first time they are used, so importing this module is
+cheap.
+
 Copyright 2012, Casey W. Stark. See LICENSE.txt for more information.
 
 """
 
+from dimensionful import dimensions
 from dimensionful.dimensions import *
-from dimensionful.units import Unit
-
-# cgs base units
-g  = Unit("g")
-cm = Unit("cm")
-s  = Unit("s")
-K  = Unit("K")
-
-# other cgs
-dyne = Unit("dyne")
-erg  = Unit("erg")
-esu  = Unit("esu")
-
-# SI stuff
-m = Unit("m")
-
-# times
-minute = Unit("min")  # can't use `min` because of Python keyword :(
-hr = Unit("hr")
-day = Unit("day")
-yr = Unit("yr")
-
-# solar units
-Msun = Unit("Msun")
-Rsun = Unit("Rsun")
-Lsun = Unit("Lsun")
-Tsum = Unit("Tsun")
-
-# astro distances
-AU = Unit("AU")
-pc = Unit("pc")
-ly = Unit("ly")
-
-gauss = Unit("gauss")
+from dimensionful.lazy_import import install_lazy_attributes
+
+# Unit symbol strings of the common units, keyed on the attribute name.
+common_unit_symbols = {
+    # cgs base units
+    "g": "g",
+    "cm": "cm",
+    "s": "s",
+    "K": "K",
+
+    # other cgs
+    "dyne": "dyne",
+    "erg": "erg",
+    "esu": "esu",
+
+    # SI stuff
+    "m": "m",
+
+    # times
+    "minute": "min",  # can't use `min` because of Python keyword :(
+    "hr": "hr",
+    "day": "day",
+    "yr": "yr",
+
+    # solar units
+    "Msun": "Msun",
+    "Rsun": "Rsun",
+    "Lsun": "Lsun",
+    "Tsum": "Tsun",
+
+    # astro distances
+    "AU": "AU",
+    "pc": "pc",
+    "ly": "ly",
+
+    "gauss": "gauss",
+}
+
+def make_unit_factory(unit_string):
+    """ Return a function that builds the Unit for `unit_string`. """
+    def make_unit():
+        from dimensionful.units import Unit
+        return Unit(unit_string)
+    return make_unit
+
+# the named dimensions are re-exported, as before
+dimension_names = sorted(name for name, value in vars(dimensions).items()
+                         if isinstance(value, Dimensions))
+
+__all__ = dimension_names + sorted(common_unit_symbols)
+
+install_lazy_attributes(__name__, dict(
+    (name, make_unit_factory(unit_string))
+    for name, unit_string in common_unit_symbols.items()))
@@ -2,35 +2,59 @@
 
 Physical constants in cgs.
 
+The constants are built the first time they are used, so importing this module
+is cheap.
+
 Copyright 2012, Casey W. Stark. See LICENSE.txt for more information.
 
 """
 
-from dimensionful.common_units import *
-from dimensionful.quantity import Quantity
+from dimensionful.lazy_import import install_lazy_attributes
 
 pi = 3.141592653589793
 
-# speed of light
-c = Quantity(2.99792458e10, cm / s)
+# The value and unit string of each constant, keyed on the attribute name.
+constant_data = {
+    # speed of light
+    "c": (2.99792458e10, "cm / s"),
+
+    # Gravitational constant
+    "G": (6.673e-8, "cm**3 * g**-1 * s**-2"),
+
+    # Boltzmann constant
+    "k": (1.38064e-16, "erg / K"),
+
+    # Planck constant
+    "h": (6.626070e-27, "erg * s"),
+
+    # atomic constants
+    "e": (4.8032068e-10, "esu"),
+    "m_p": (1.672623e-24, "g"),
+    "m_e": (9.109389e-28, "g"),
+    "amu": (1.6605402e-24, "g"),
+
+    # radiation
+    "sigma_T": (6.6524588e-25, "cm**2"),
+    "sigma_SB": (5.67e-5, "g * K**(-4) * s**(-3)"),
+    "a": (7.5657e-15, "g * K**(-4) * cm**(-1) * s**(-2)"),
+}
 
-# Gravitational constant
-G = Quantity(6.673e-8, cm**3 * g**-1 * s**-2)
+def make_constant_factory(value, unit_string):
+    """ Return a function that builds the constant Quantity. """
+    def make_constant():
+        from dimensionful.quantity import Quantity
+        return Quantity(value, unit_string)
+    return make_constant
 
-# Boltzmann constant
-k = Quantity(1.38064e-16, erg / K)
+def make_hbar():
+    from dimensionful.constants import h
+    return h / (2 * pi)
 
-# Planck constant
-h = Quantity(6.626070e-27, erg * s)
-hbar = h / (2 * pi)
+constant_factories = dict((name, make_constant_factory(value, unit_string))
+                          for name, (value, unit_string)
+                          in constant_data.items())
+constant_factories["hbar"] = make_hbar
 
-# atomic constants
-e = Quantity(4.8032068e-10, esu)
-m_p = Quantity(1.672623e-24, g)
-m_e = Quantity(9.109389e-28, g)
-amu = Quantity(1.6605402e-24, g)
+__all__ = ["pi"] + sorted(constant_factories)
 
-# radiation
-sigma_T = Quantity(6.6524588e-25, cm**2)
-sigma_SB = Quantity(5.67e-5, g * K**(-4) * s**(-3))
-a = Quantity(7.5657e-15, g * K**(-4) * cm**(-1) * s**(-2))
+install_lazy_attributes(__name__, constant_factories)
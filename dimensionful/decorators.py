@@ -0,0 +1,377 @@
+"""
+
+Decorators for functions of quantities.
+
+`check_units` declares the units of a function's inputs and output. The unit
+algebra and dimension checks are done once per combination of input units,
+and later calls with the same units work on the raw data.
+
+    >>> @check_units("day", "s", "yr", "Msun", "Msun", output="Msun / yr")
+    ... def mass_transfer_rate(P, dP, dt, M1, M2):
+    ...     return dP * M1 * M2 / (3 * P * dt * (M1 - M2))
+
+Copyright 2012, Casey W. Stark. See LICENSE.txt for more information.
+
+"""
+
+from functools import wraps
+
+from dimensionful.cache import LRUCache
+from dimensionful.quantity import Quantity
+from dimensionful.units import Unit, get_conversion_factor
+
+
+class UnitPlan(object):
+    """
+    What `check_units` learned from the first call with some input units
+    (`input_units`, None for plain arguments): the factors that convert each
+    input to its declared units, the factor that converts the raw result to
+    the output units, and the output units.
+
+    If `fast` is False, the function body can't be run on raw data (it uses
+    Quantity methods or constants, or converts units, for example), so calls
+    go through the normal Quantity operations.
+
+    """
+    __slots__ = ["input_units", "input_factors", "output_factor",
+                 "output_units", "output_class", "fast"]
+
+    def __init__(self, input_factors, output_factor, output_units,
+                 output_class, fast):
+        self.input_units = None
+        self.input_factors = input_factors
+        self.output_factor = output_factor
+        self.output_units = output_units
+        self.output_class = output_class
+        self.fast = fast
+
+
+class Trace(object):
+    """
+    What a traced body did. `fast` stays True while everything it did would
+    give the same numbers on raw data in the declared units.
+
+    """
+    __slots__ = ["fast"]
+
+    def __init__(self):
+        self.fast = True
+
+
+def untrace(value):
+    """ Replace Tracers in `value`, or in a tuple or list of values. """
+    if isinstance(value, Tracer):
+        return value.quantity
+    if isinstance(value, (tuple, list)):
+        return value.__class__(untrace(v) for v in value)
+    return value
+
+
+def traced_operator(name, checks_units=False, scales_numbers=False):
+    """
+    Make a Tracer method for the binary operator `name`. With `checks_units`,
+    an operand in other units means a conversion, which raw data would skip.
+    With `scales_numbers`, so does a plain number next to dimensionless units
+    with a scale, like km / m.
+
+    """
+    def method(self, other):
+        trace = self.trace
+        units = self.quantity.units
+        if isinstance(other, Tracer):
+            if checks_units and other.quantity.units is not units:
+                trace.fast = False
+            other = other.quantity
+        elif isinstance(other, Quantity):
+            # a constant, or a quantity passed around the declared arguments
+            trace.fast = False
+        elif scales_numbers and units.cgs_value != 1.0:
+            trace.fast = False
+
+        result = getattr(self.quantity, name)(other)
+        if isinstance(result, Quantity):
+            return Tracer(result, trace)
+        return result
+
+    method.__name__ = name
+    return method
+
+
+class Tracer(Quantity):
+    """
+    Stands in for an argument while `check_units` traces the body. Operations
+    are done on the real quantity, and give Tracers. Anything that would give
+    other numbers on raw data, like a conversion, a constant, or a Quantity
+    method or attribute, marks the trace as slow.
+
+    """
+    __slots__ = ["quantity", "trace"]
+
+    def __init__(self, quantity, trace):
+        object.__setattr__(self, "quantity", quantity)
+        object.__setattr__(self, "trace", trace)
+
+    def __getattribute__(self, name):
+        if name in ("quantity", "trace", "__class__"):
+            return object.__getattribute__(self, name)
+        object.__getattribute__(self, "trace").fast = False
+        return getattr(object.__getattribute__(self, "quantity"), name)
+
+    def __setattr__(self, name, value):
+        object.__getattribute__(self, "trace").fast = False
+        setattr(self.quantity, name, value)
+
+    def __repr__(self):
+        return repr(self.quantity)
+
+    def __str__(self):
+        return str(self.quantity)
+
+    __add__ = traced_operator("__add__", True)
+    __radd__ = traced_operator("__radd__", True)
+    __sub__ = traced_operator("__sub__", True)
+    __rsub__ = traced_operator("__rsub__", True)
+    __mul__ = traced_operator("__mul__")
+    __rmul__ = traced_operator("__rmul__")
+    __div__ = traced_operator("__div__")
+    __rdiv__ = traced_operator("__rdiv__")
+    __truediv__ = traced_operator("__truediv__")
+    __rtruediv__ = traced_operator("__rtruediv__")
+    __lt__ = traced_operator("__lt__", True, True)
+    __le__ = traced_operator("__le__", True, True)
+    __eq__ = traced_operator("__eq__", True, True)
+    __ne__ = traced_operator("__ne__", True, True)
+    __ge__ = traced_operator("__ge__", True, True)
+    __gt__ = traced_operator("__gt__", True, True)
+
+    def __neg__(self):
+        return Tracer(-self.quantity, self.trace)
+
+    def __abs__(self):
+        return Tracer(abs(self.quantity), self.trace)
+
+    def __pow__(self, power):
+        trace = self.trace
+        if isinstance(power, Quantity):
+            # the result units depend on the data, which the plan can't see
+            trace.fast = False
+        return Tracer(self.quantity**untrace(power), trace)
+
+    def __len__(self):
+        self.trace.fast = False
+        return len(self.quantity)
+
+    def __getitem__(self, key):
+        self.trace.fast = False
+        return self.quantity[key]
+
+    def __iter__(self):
+        self.trace.fast = False
+        return iter(self.quantity)
+
+    def __array_ufunc__(self, ufunc, method, *inputs, **kwargs):
+        # numpy functions may convert the data, so leave them to the quantity
+        self.trace.fast = False
+        return getattr(ufunc, method)(*untrace(inputs), **kwargs)
+
+
+def get_parameters(function):
+    """ Return the names of the positional parameters and their defaults. """
+    try:
+        from inspect import getfullargspec as getargspec
+    except ImportError:  # Python 2
+        from inspect import getargspec
+    spec = getargspec(function)
+    return spec.args, spec.defaults or ()
+
+
+def check_units(*input_units, **kwargs):
+    """
+    Declare the units of a function's positional arguments and result.
+
+    The first call with a given tuple of input units checks each input's
+    dimensions and runs the body once, on stand-ins for the quantities that
+    give the result and trace what the body does with their units. If it only
+    does unit algebra that gives the same numbers on raw data in the declared
+    units (no conversions, constant quantities, or Quantity methods), later
+    calls with the same input units skip the unit algebra entirely: the data
+    is converted to the declared units (if needed), the body runs on the raw
+    data, and the result is scaled by one factor and wrapped in the cached
+    output units.
+
+    Declared arguments can also be given by keyword, or left to their
+    defaults. Other keyword arguments are passed to the body as is. Plain
+    arguments, declared None or not declared, can change what the body does,
+    so plans are also keyed on their values. Calls with plain arguments that
+    can't be keys, like arrays or quantities, always use the normal Quantity
+    operations.
+
+    Parameters
+    ----------
+    *input_units : Unit objects, strings, or None
+        The units each positional argument is converted to before the body
+        runs. Arguments must have the same dimensions as these. Use None for
+        arguments that are not quantities; they are passed through as is.
+    output : Unit object or string, optional
+        The units of the result. The result must have these dimensions. If
+        not given, the result keeps the units the body gives it.
+    maxsize : int, optional
+        The number of input unit combinations to remember. Defaults to 128.
+
+    Returns
+    -------
+    A decorator. The decorated function has a `plans` attribute, the
+    LRUCache of UnitPlan objects keyed on the input units.
+
+    """
+    output = kwargs.pop("output", None)
+    maxsize = kwargs.pop("maxsize", 128)
+    if kwargs:
+        raise Exception("Unknown arguments to check_units: %s" % ", ".join(sorted(kwargs)))
+
+    declared_units = [u if u is None or isinstance(u, Unit) else Unit(u)
+                      for u in input_units]
+    if output is not None and not isinstance(output, Unit):
+        output = Unit(output)
+
+    def decorator(function):
+        plans = LRUCache(maxsize)
+        names, defaults = get_parameters(function)
+
+        def bind(args, kwargs):
+            """
+            Return `args` with the declared arguments given by keyword, or left
+            to their defaults, moved in. Those are taken out of `kwargs`.
+
+            """
+            args = list(args)
+            for i in range(len(args), len(declared_units)):
+                name = names[i] if i < len(names) else None
+                if name in kwargs:
+                    args.append(kwargs.pop(name))
+                elif name is not None and i >= len(names) - len(defaults):
+                    args.append(defaults[i - len(names)])
+                else:
+                    raise Exception("%s takes at least %d arguments (%d given)." % (function.__name__, len(declared_units), i))
+            return args
+
+        def run_quantities(args, kwargs, trace=None):
+            """
+            Check the units of `args` and run the body with quantities in the
+            declared units, or Tracers of them if `trace` is given. Returns the
+            factors that convert the inputs, the result in the output units,
+            and the factor that converted it (None for plain results).
+
+            """
+            input_factors = []
+            quantity_args = list(args)
+            for i, (arg, units) in enumerate(zip(args, declared_units)):
+                if units is None:
+                    input_factors.append(None)
+                    continue
+                if not isinstance(arg, Quantity):
+                    raise Exception("Argument %d of %s must be a Quantity in units of %s, got %s." % (i, function.__name__, units, arg))
+                if not arg.units.same_dimensions_as(units):
+                    raise Exception("Argument %d of %s must have the dimensions of %s, got %s." % (i, function.__name__, units, arg.units))
+                factor = get_conversion_factor(arg.units, units)
+                input_factors.append(factor)
+                data = arg.data if factor == 1.0 else arg.data * factor
+                quantity_args[i] = arg.__class__(data, units)
+                if trace is not None:
+                    quantity_args[i] = Tracer(quantity_args[i], trace)
+
+            result = function(*quantity_args, **kwargs)
+            if trace is not None:
+                if not isinstance(result, Tracer):
+                    # a plain result, or one made from other quantities
+                    trace.fast = False
+                result = untrace(result)
+
+            if not isinstance(result, Quantity):
+                # a plain result, like a dimensionless ratio
+                if output is not None and not output.is_dimensionless:
+                    raise Exception("%s should return a quantity in %s, got %s." % (function.__name__, output, result))
+                return input_factors, result, None
+
+            output_units = result.units if output is None else output
+            if not result.units.same_dimensions_as(output_units):
+                raise Exception("%s should return a quantity in %s, got %s." % (function.__name__, output_units, result.units))
+            output_factor = get_conversion_factor(result.units, output_units)
+            result_data = result.data if output_factor == 1.0 \
+                else result.data * output_factor
+            result = result.__class__(result_data, output_units)
+            return input_factors, result, output_factor
+
+        def run_plan(plan, args, kwargs):
+            """ Run the body for a known combination of input units. """
+            if not plan.fast:
+                return run_quantities(args, kwargs)[1]
+
+            raw_args = list(args)
+            for i, factor in enumerate(plan.input_factors):
+                if factor is not None:
+                    data = args[i].data
+                    raw_args[i] = data if factor == 1.0 else data * factor
+
+            data = function(*raw_args, **kwargs)
+            if plan.output_factor != 1.0:
+                data = data * plan.output_factor
+            return plan.output_class(data, plan.output_units)
+
+        @wraps(function)
+        def wrapper(*args, **kwargs):
+            if len(args) < len(declared_units):
+                args = bind(args, kwargs)
+
+            # key on the ids of the units, like the unit algebra cache, and
+            # check the plan was made for these same unit objects. Plain
+            # arguments are keyed on their values, by type so 1 and True stay
+            # apart.
+            input_units = []
+            key = []
+            plain_args = []
+            for arg, units in zip(args, declared_units):
+                if units is None:
+                    input_units.append(None)
+                    key.append((arg.__class__, arg))
+                    plain_args.append(arg)
+                    continue
+                units = arg.units if isinstance(arg, Quantity) else None
+                input_units.append(units)
+                key.append((arg.__class__, id(units)))
+            for arg in args[len(declared_units):]:
+                key.append((arg.__class__, arg))
+                plain_args.append(arg)
+            if kwargs:
+                key.append(tuple(sorted((name, arg.__class__, arg)
+                                        for name, arg in kwargs.items())))
+                plain_args += kwargs.values()
+            key = tuple(key)
+
+            # no plans for plain arguments that can't be keys
+            if plain_args and any(isinstance(arg, Quantity)
+                                  for arg in plain_args):
+                return run_quantities(args, kwargs)[1]
+            try:
+                plan = plans.get(key)
+            except TypeError:
+                return run_quantities(args, kwargs)[1]
+            if plan is not None and plan.input_units == input_units:
+                return run_plan(plan, args, kwargs)
+
+            trace = Trace()
+            input_factors, result, output_factor = \
+                run_quantities(args, kwargs, trace)
+            if output_factor is None:
+                plan = UnitPlan(input_factors, 1.0, None, None, False)
+            else:
+                plan = UnitPlan(input_factors, output_factor, result.units,
+                                result.__class__, trace.fast)
+            plan.input_units = input_units
+            plans.setdefault(key, plan)
+            return result
+
+        wrapper.plans = plans
+        return wrapper
+
+    return decorator
@@ -6,7 +6,10 @@ Copyright 2012, Casey W. Stark. See LICENSE.txt for more information.
 
 """
 
-from sympy import Symbol, Rational
+import numbers
+from fractions import Fraction
+
+from dimensionful.instrument import timed
 
 # NB: For sanity, we use Gaussian E&M conventions. That is, charge is not
 # a fundamental unit and you must use the appropriate form of E&M laws.
@@ -14,15 +17,223 @@ from sympy import Symbol, Rational
 # Number of base dimensions
 num_base = 4
 
+# Names of the base dimensions, in the order they are stored in a Dimensions
+# vector.
+base_names = ["mass", "length", "time", "temperature"]
+
+# Largest denominator we accept when turning a float power into a Rational.
+# This plays the role `nsimplify` used to play, so 1.0/3 becomes 1/3.
+max_power_denominator = 1000
+
+
+def rational_power(power):
+    """
+    Convert a power (int, float, Fraction, or sympy number) to an exact
+    Fraction. Floats are rounded to the nearest fraction with a denominator of
+    at most `max_power_denominator`.
+
+    """
+    if isinstance(power, Fraction):
+        return power
+    if isinstance(power, numbers.Integral):
+        return Fraction(int(power))
+    if isinstance(power, numbers.Real) and not isinstance(power, numbers.Rational):
+        return Fraction(float(power)).limit_denominator(max_power_denominator)
+
+    # sympy Integers and Rationals print as "p/q"
+    try:
+        return Fraction(str(power))
+    except ValueError:
+        raise Exception("Cannot use '%s' as a power of dimensions. Please use an int, float, or Fraction." % (power,))
+
+
+def exact_value(value):
+    """
+    Convert a cgs value (int, float, Fraction, or sympy number) to an exact
+    Fraction. Floats are taken at their shortest decimal repr, so 1.98892e33
+    is exactly 198892 * 10**28, the number that was written down.
+
+    """
+    if isinstance(value, Fraction):
+        return value
+    if isinstance(value, numbers.Integral):
+        return Fraction(int(value))
+    if isinstance(value, float):
+        return Fraction(repr(value))
+    try:
+        return Fraction(str(value))
+    except ValueError:
+        return Fraction(repr(float(value)))
+
+
+def exact_value_power(value, power):
+    """
+    Raise an exact cgs value to a Fraction power. Integer powers are exact.
+    Other powers are irrational in general, so the result is the Fraction of
+    the float result.
+
+    """
+    if power.denominator == 1:
+        return value**int(power)
+    return Fraction(float(value)**float(power))
+
+
+class Dimensions(object):
+    """
+    The dimensionality of a unit. This is a fixed-length vector of exact
+    rational powers of the base dimensions (mass, length, time, temperature).
+
+    Dimensions are immutable. The hash is computed once at construction, so
+    comparing and hashing them is cheap. Sympy expressions are only built when
+    asked for, with `as_expr`.
+
+    """
+
+    __slots__ = ["powers", "_hash"]
+
+    def __init__(self, powers):
+        """
+        Parameters
+        ----------
+        powers : sequence of length `num_base`
+            The powers of mass, length, time, and temperature, in that order.
+            Converted to Fractions.
+
+        """
+        powers = tuple(rational_power(p) for p in powers)
+        if len(powers) != num_base:
+            raise Exception("Dimensions need exactly %d powers, got %s." % (num_base, powers))
+
+        object.__setattr__(self, "powers", powers)
+        object.__setattr__(self, "_hash", hash(powers))
+
+    def __setattr__(self, name, value):
+        raise AttributeError("Dimensions objects are immutable.")
+
+    @classmethod
+    @timed("sympy")
+    def from_expr(cls, expr):
+        """
+        Build Dimensions from a sympy expression made of the base dimension
+        symbols, like the ones `as_expr` returns. Raise an Exception if the
+        expression contains anything else.
+
+        """
+        powers = [0] * num_base
+        for base, power in expr.as_powers_dict().items():
+            if base == 1:
+                continue
+            name = str(base).strip("()")
+            if not (getattr(base, "is_Symbol", False) and name in base_names
+                    and str(base) == "(%s)" % name):
+                raise Exception("Dimensions expression contains a non-base dimension symbol '%s'" % str(base))
+            if not getattr(power, "is_number", True):
+                raise Exception("Dimensions expression has a non-numeric power '%s'" % str(power))
+            powers[base_names.index(name)] = power
+
+        return cls(powers)
+
+    ### arithmetic
+    def __mul__(self, right_object):
+        if isinstance(right_object, Dimensions):
+            return Dimensions([a + b for a, b in
+                               zip(self.powers, right_object.powers)])
+        if right_object == 1:
+            return self
+        return NotImplemented
+
+    def __rmul__(self, left_object):
+        # only `1 * dims` makes sense, as in a running product.
+        if left_object == 1:
+            return self
+        return NotImplemented
+
+    def __div__(self, right_object):
+        if isinstance(right_object, Dimensions):
+            return Dimensions([a - b for a, b in
+                               zip(self.powers, right_object.powers)])
+        if right_object == 1:
+            return self
+        return NotImplemented
+
+    __truediv__ = __div__
+
+    def __rdiv__(self, left_object):
+        if left_object == 1:
+            return self**-1
+        return NotImplemented
+
+    __rtruediv__ = __rdiv__
+
+    def __pow__(self, power):
+        power = rational_power(power)
+        return Dimensions([p * power for p in self.powers])
+
+    ### comparisons
+    def __eq__(self, right_object):
+        if self is right_object:
+            return True
+        if isinstance(right_object, Dimensions):
+            return (self._hash == right_object._hash
+                    and self.powers == right_object.powers)
+        if isinstance(right_object, numbers.Number):
+            return right_object == 1 and self.is_dimensionless
+        if hasattr(right_object, "as_powers_dict"):
+            # sympy expression, compare in vector form
+            try:
+                return self == Dimensions.from_expr(right_object)
+            except Exception:
+                return False
+        return False
+
+    def __ne__(self, right_object):
+        return not self == right_object
+
+    def __hash__(self):
+        return self._hash
+
+    @property
+    def is_dimensionless(self):
+        return not any(self.powers)
+
+    ### sympy forms, for display
+    @timed("sympy")
+    def as_expr(self):
+        """ Build the sympy expression of base dimension symbols. """
+        from sympy import Rational, Symbol
+
+        expr = 1
+        for name, power in zip(base_names, self.powers):
+            if power:
+                symbol = Symbol("(%s)" % name, positive=True)
+                expr *= symbol**Rational(power.numerator, power.denominator)
+        return expr
+
+    # lets sympify and nsimplify accept Dimensions
+    def _sympy_(self):
+        from sympy import sympify
+        return sympify(self.as_expr())
+
+    def __repr__(self):
+        return str(self.as_expr())
+
+    def __str__(self):
+        return str(self.as_expr())
+
+    ### pickling, since we use __slots__ and block __setattr__
+    def __reduce__(self):
+        return (Dimensions, (self.powers,))
+
+
 # The base dimensions
-mass = Symbol("(mass)", positive=True)
-length = Symbol("(length)", positive=True)
-time = Symbol("(time)", positive=True)
-temperature = Symbol("(temperature)", positive=True)
+mass = Dimensions([1, 0, 0, 0])
+length = Dimensions([0, 1, 0, 0])
+time = Dimensions([0, 0, 1, 0])
+temperature = Dimensions([0, 0, 0, 1])
 base_dimensions = [mass, length, time, temperature]
 
-# If something is dimensionless, its dimension is just 1.
-dimensionless = mass**0 * length**0 * time**0 * temperature**0
+# If something is dimensionless, its dimension vector is all zeros.
+dimensionless = Dimensions([0, 0, 0, 0])
 
 # inverses
 per_mass    = mass**-1
@@ -54,7 +265,7 @@ momentum = mass * velocity
 force    = mass * acceleration
 energy   = force * length
 power    = energy / time
-charge   = (energy * length)**Rational(1, 2)  # proper 1/2 power
+charge   = (energy * length)**Fraction(1, 2)  # proper 1/2 power
 
 electric_field = charge / length**2
 magnetic_field = electric_field
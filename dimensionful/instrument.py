@@ -0,0 +1,192 @@
+"""
+
+Opt-in counters and timers for the work dimensionful does behind the scenes.
+
+When a job slows down, these show whether the time goes into parsing unit
+strings, unit algebra, sympy, working out conversion factors, checking
+dimensions, or converting data. Recording is off by default, and then each
+instrumented spot costs one attribute check.
+
+    >>> import dimensionful
+    >>> with dimensionful.profile() as profile:
+    ...     run_my_job()
+    >>> profile.stats["parse"]
+    {'count': 12, 'seconds': 0.00021}
+    >>> dimensionful.instrument.dump("stats.json")
+
+The categories are:
+
+    parse             unit strings parsed (interned strings are not parsed)
+    algebra           Units built by multiplying, dividing, and powers
+    sympy             Units built from sympy expressions, and other sympy use
+    conversion_factor conversion factors worked out (cached ones are not)
+    dimension_check   dimension checks for conversions and arithmetic
+    conversion        data converted, with the bytes of new arrays made
+
+Times are wall times, and a category's time includes anything it calls, so
+a parse that needs sympy counts in both.
+
+Copyright 2012, Casey W. Stark. See LICENSE.txt for more information.
+
+"""
+
+import json
+from contextlib import contextmanager
+from threading import Lock
+from timeit import default_timer as clock
+
+categories = ["parse", "algebra", "sympy", "conversion_factor",
+              "dimension_check", "conversion"]
+
+
+class Recorder(object):
+    """
+    The counters for the whole process. `enabled` is a class attribute, so
+    checking it is as cheap as it gets when recording is off.
+
+    """
+    enabled = False
+
+    def __init__(self):
+        self._lock = Lock()
+        self.reset()
+
+    def reset(self):
+        """ Set all the counters to zero. """
+        with self._lock:
+            self.counts = dict.fromkeys(categories, 0)
+            self.seconds = dict.fromkeys(categories, 0.0)
+            self.conversion_bytes = 0
+
+    def add(self, category, seconds, nbytes=0):
+        """ Count one event in `category` that took `seconds`. """
+        with self._lock:
+            self.counts[category] += 1
+            self.seconds[category] += seconds
+            self.conversion_bytes += nbytes
+
+    def get_stats(self):
+        """ Return a copy of the counters, as plain dicts and numbers. """
+        with self._lock:
+            stats = dict((category, {"count": self.counts[category],
+                                     "seconds": self.seconds[category]})
+                         for category in categories)
+            stats["conversion"]["bytes"] = self.conversion_bytes
+        return stats
+
+recorder = Recorder()
+
+
+def timed(category):
+    """
+    Decorator that counts and times calls in `category` while recording. For
+    functions off the hot paths, like the ones that fill caches.
+
+    """
+    def decorator(function):
+        def wrapper(*args, **kwargs):
+            if not recorder.enabled:
+                return function(*args, **kwargs)
+            start = clock()
+            try:
+                return function(*args, **kwargs)
+            finally:
+                recorder.add(category, clock() - start)
+
+        wrapper.__name__ = function.__name__
+        wrapper.__doc__ = function.__doc__
+        return wrapper
+    return decorator
+
+
+def enable():
+    """ Start recording. """
+    Recorder.enabled = True
+
+
+def disable():
+    """ Stop recording. The counters keep their values. """
+    Recorder.enabled = False
+
+
+def reset():
+    """ Set all the counters to zero. """
+    recorder.reset()
+
+
+def stats():
+    """
+    Return the counters recorded so far, as a dict of category name to a dict
+    with the "count" and total "seconds" of the category. The "conversion"
+    entry also has the "bytes" of the arrays made by conversions.
+
+    """
+    return recorder.get_stats()
+
+
+def subtract_stats(after, before):
+    """ Return the counters in `after` minus those in `before`. """
+    return dict((category, dict((key, value - before[category][key])
+                                for key, value in entry.items()))
+                for category, entry in after.items())
+
+
+class Profile(object):
+    """ What a `profile` block recorded, in `stats`, once it ends. """
+
+    def __init__(self):
+        self.stats = None
+
+    def dump(self, f=None):
+        """ Like `dump`, for this block's counters. """
+        return dump(f, self.stats)
+
+
+@contextmanager
+def profile():
+    """
+    Record inside a with block. The block's own counters are in the `stats`
+    attribute of the yielded Profile afterwards. Counters recorded outside the
+    block are left alone, and recording goes back to how it was.
+
+    """
+    was_enabled = Recorder.enabled
+    result = Profile()
+    before = recorder.get_stats()
+    Recorder.enabled = True
+    try:
+        yield result
+    finally:
+        Recorder.enabled = was_enabled
+        result.stats = subtract_stats(recorder.get_stats(), before)
+
+
+def dump(f=None, counters=None):
+    """
+    Write the counters as JSON.
+
+    Parameters
+    ----------
+    f : file object or string, optional
+        Where to write, an open text file or a path. If not given, nothing is
+        written.
+    counters : dict, optional
+        The counters to write. Defaults to `stats()`.
+
+    Returns
+    -------
+    The JSON string.
+
+    """
+    if counters is None:
+        counters = stats()
+    text = json.dumps(counters, indent=2, sort_keys=True)
+
+    if f is None:
+        return text
+    if not hasattr(f, "write"):
+        with open(f, "w") as output:
+            output.write(text)
+    else:
+        f.write(text)
+    return text
@@ -0,0 +1,184 @@
+"""
+
+Array kernels that fold a conversion factor into arithmetic.
+
+Writing ``a += b * factor`` in numpy allocates a temporary the size of ``b``.
+These kernels work through the arrays in blocks, with one small scratch
+buffer, so large in-place updates do not double peak memory.
+
+The Quantity operators use the kernels here for their numeric work. Inside
+``dimensionful.parallel.threads``, big arrays are handed to a thread pool
+backend instead, which splits them into chunks and runs the chunks at once.
+Conversions through `scale` and `scale_in_place` are recorded by
+``dimensionful.instrument`` when it is on.
+
+Copyright 2012, Casey W. Stark. See LICENSE.txt for more information.
+
+"""
+
+import operator
+import sys
+
+from dimensionful.instrument import clock, recorder
+
+# Number of elements per block. 64k float64s fit comfortably in L2 cache.
+block_size = 2**16
+
+
+class Execution(object):
+    """
+    The parallel backend the kernels use, or None to just use numpy. Set with
+    ``dimensionful.parallel.threads``. This is for the whole process, not one
+    thread, since a thread-local lookup would slow down every scalar
+    operation. Workers only get chunks, which are too small to split again.
+
+    """
+    backend = None
+
+execution = Execution()
+
+
+def is_ndarray(data):
+    """
+    Check if `data` is a numpy array, without importing numpy. If numpy has
+    not been imported, nothing can be an array.
+
+    """
+    numpy = sys.modules.get("numpy")
+    return numpy is not None and isinstance(data, numpy.ndarray)
+
+
+def can_use_blocks(data, other):
+    """
+    Check if `data` and `other` are arrays the blocked kernels can handle:
+    same shape, both contiguous, and `data` floating point.
+
+    """
+    return (is_ndarray(data) and is_ndarray(other)
+            and data.shape == other.shape
+            and data.size > block_size
+            and data.dtype.kind in "fc"
+            and data.flags.c_contiguous and other.flags.c_contiguous)
+
+
+def add_scaled(data, other, factor=1.0, subtract=False):
+    """
+    Compute ``data + other * factor`` (or ``-`` with `subtract`). If `data`
+    is a numpy array, the result is written into it and no temporary the size
+    of `other` is made.
+
+    Returns the result, which is `data` itself for arrays.
+
+    """
+    backend = execution.backend
+    if backend is not None and backend.accepts(data, other) and \
+       data.dtype.kind in "fc":
+        backend.run("add", data, [data, other], -factor if subtract else factor)
+        return data
+
+    if factor == 1.0:
+        if subtract:
+            data -= other
+        else:
+            data += other
+        return data
+
+    if not can_use_blocks(data, other):
+        if subtract:
+            data -= other * factor
+        else:
+            data += other * factor
+        return data
+
+    import numpy as np
+
+    flat_data = data.reshape(-1)
+    flat_other = other.reshape(-1)
+    scratch = np.empty(block_size, dtype=np.result_type(other, factor))
+    combine = np.subtract if subtract else np.add
+
+    for start in range(0, flat_data.size, block_size):
+        stop = min(start + block_size, flat_data.size)
+        block = scratch[:stop - start]
+        np.multiply(flat_other[start:stop], factor, out=block)
+        combine(flat_data[start:stop], block, out=flat_data[start:stop])
+
+    return data
+
+
+def record_conversion(start, data, result):
+    """ Record a conversion that began at `start`, and any array it made. """
+    nbytes = result.nbytes if is_ndarray(result) and result is not data else 0
+    recorder.add("conversion", clock() - start, nbytes)
+
+
+def scale(data, factor):
+    """ Return ``data * factor``, as a new array for arrays. """
+    start = clock() if recorder.enabled else None
+    backend = execution.backend
+    if backend is not None and backend.accepts(data):
+        result = backend.compute("scale", [data], factor)
+    else:
+        result = data * factor
+    if start is not None:
+        record_conversion(start, data, result)
+    return result
+
+
+def scale_in_place(data, factor):
+    """ Compute ``data *= factor``, and return the result. """
+    start = clock() if recorder.enabled else None
+    backend = execution.backend
+    if backend is not None and backend.accepts(data) and \
+       data.dtype.kind in "fc":
+        backend.run("scale", data, [data], factor)
+        result = data
+    else:
+        data *= factor
+        result = data
+    if start is not None:
+        record_conversion(start, data, result)
+    return result
+
+
+def add(left, right, factor=1.0, subtract=False):
+    """
+    Return ``left + right * factor`` (or ``-`` with `subtract`), without a
+    temporary for ``right * factor`` when a backend is in use.
+
+    """
+    backend = execution.backend
+    if backend is not None and backend.accepts(left, right):
+        return backend.compute("add", [left, right],
+                               -factor if subtract else factor)
+    if factor != 1.0:
+        right = right * factor
+    return left - right if subtract else left + right
+
+
+def multiply(left, right):
+    """ Return ``left * right``. """
+    backend = execution.backend
+    if backend is not None and backend.accepts(left, right):
+        return backend.compute("multiply", [left, right], 1.0)
+    return left * right
+
+
+def divide(left, right):
+    """
+    Return ``left / right``. This module doesn't import true division, so
+    on Python 2 this is the classic division of the caller's ``/``.
+
+    """
+    backend = execution.backend
+    if backend is not None and backend.accepts(left, right):
+        return backend.compute("divide", [left, right], 1.0)
+    return left / right
+
+
+def true_divide(left, right):
+    """ Return ``left / right`` with true division, for ``__truediv__``. """
+    backend = execution.backend
+    if backend is not None and backend.accepts(left, right):
+        return backend.compute("true_divide", [left, right], 1.0)
+    return operator.truediv(left, right)
@@ -0,0 +1,322 @@
+"""
+
+Lazy Quantity arithmetic.
+
+Operators on a LazyQuantity don't compute any data. They build an expression
+graph, working out the units of each node right away and folding the unit
+conversion factors and numeric constants into one scale factor per node. The
+data is computed when it is first needed, in one pass over blocks of the
+arrays, so a long formula does not make a full-size temporary array for every
+operator.
+
+    >>> from dimensionful.lazy import lazy
+    >>> m1, m2, r = lazy(m1, m2, r)
+    >>> force = G * m1 * m2 / r**2          # units known, no data computed
+    >>> force.data                          # computed here, in blocks
+
+Copyright 2012, Casey W. Stark. See LICENSE.txt for more information.
+
+"""
+
+from __future__ import division
+
+from numbers import Number
+
+from dimensionful.kernels import block_size, is_ndarray
+from dimensionful.quantity import Quantity
+from dimensionful.units import Unit, get_conversion_factor
+
+dimensionless_unit = Unit()
+
+
+def lazy(*quantities):
+    """
+    Wrap quantities so that arithmetic on them is done lazily. Returns a
+    LazyQuantity for one argument, or a tuple of them for several.
+
+    """
+    nodes = tuple(as_node(q) for q in quantities)
+    if len(nodes) == 1:
+        return nodes[0]
+    return nodes
+
+
+def as_node(value):
+    """ Return a LazyQuantity for a LazyQuantity, Quantity, or pure number. """
+    if isinstance(value, LazyQuantity):
+        return value
+    if isinstance(value, Quantity):
+        return LazyQuantity(value.units, "leaf", (value.data,))
+    return LazyQuantity(dimensionless_unit, "leaf", (value,))
+
+
+def get_structure(node):
+    """
+    Return the (op, args, scale) of a node. Nodes that have already been
+    computed are treated as leaves, so their data is not computed again.
+
+    """
+    if node._value is not None:
+        return "leaf", (node._value,), 1.0
+    return node._op, node._args, node._scale
+
+
+def is_number(data):
+    return isinstance(data, Number) and not is_ndarray(data)
+
+
+class LazyQuantity(Quantity):
+    """
+    A Quantity whose data is computed on demand from an expression graph. Use
+    `lazy` to make these.
+
+    Each node is one of:
+
+    * "leaf": `args` is a 1-tuple of the data.
+    * "sum": `args` is a list of (coefficient, node) terms. The raw value is
+      the sum of coefficient * raw value of node.
+    * "product": `args` is a list of (node, power) factors. The raw value is
+      the product of the raw value of node ** power.
+
+    The data of a node is its `scale` times its raw value. Sums and products
+    are flattened as they are built, so each node is as wide as possible, and
+    the nodes in `args` always have a scale of 1 (their scales are folded into
+    the coefficients and the parent's scale).
+
+    """
+
+    def __init__(self, units, op, args, scale=1.0):
+        self.units = units
+        self._op = op
+        self._args = args
+        self._scale = scale
+        self._value = args[0] if op == "leaf" else None
+
+    @property
+    def data(self):
+        """ The data, computed the first time it is asked for. """
+        if self._value is None:
+            self._value = self._evaluate()
+        return self._value
+
+    @data.setter
+    def data(self, value):
+        # setting the data (like convert_to does) makes this a leaf
+        self._op = "leaf"
+        self._args = (value,)
+        self._scale = 1.0
+        self._value = value
+
+    def __reduce__(self):
+        # pickle the computed data, not the graph
+        return (Quantity, (self.data, self.units))
+
+    def evaluate(self):
+        """ Compute the data, and return it in a new (eager) Quantity. """
+        return Quantity(self.data, self.units)
+
+    ### graph building
+    def _add(self, right_object, sign):
+        right_node = as_node(right_object)
+        if not self.units.same_dimensions_as(right_node.units):
+            raise Exception("You cannot add these quantities because their dimensions do not match. `%s %s %s` is ill-defined" % (self.units, "+" if sign > 0 else "-", right_node.units))
+
+        conversion_factor = get_conversion_factor(right_node.units,
+                                                  self.units)
+        terms = sum_terms(self, 1.0) + \
+            sum_terms(right_node, sign * conversion_factor)
+        return LazyQuantity(self.units, "sum", terms)
+
+    def __add__(self, right_object):
+        return self._add(right_object, 1)
+
+    def __radd__(self, left_object):
+        return as_node(left_object)._add(self, 1)
+
+    def __sub__(self, right_object):
+        return self._add(right_object, -1)
+
+    def __rsub__(self, left_object):
+        return as_node(left_object)._add(self, -1)
+
+    def __neg__(self):
+        return self._multiply(-1, 1)
+
+    def _multiply(self, right_object, sign):
+        right_node = as_node(right_object)
+        if sign > 0:
+            units = self.units * right_node.units
+        else:
+            units = self.units / right_node.units
+
+        factors, scale = product_factors(self, 1)
+        right_factors, right_scale = product_factors(right_node, sign)
+        return LazyQuantity(units, "product",
+                            merge_factors(factors + right_factors),
+                            scale * right_scale)
+
+    def __mul__(self, right_object):
+        return self._multiply(right_object, 1)
+
+    def __rmul__(self, left_object):
+        return as_node(left_object)._multiply(self, 1)
+
+    def __div__(self, right_object):
+        return self._multiply(right_object, -1)
+
+    def __rdiv__(self, left_object):
+        return as_node(left_object)._multiply(self, -1)
+
+    __truediv__ = __div__
+    __rtruediv__ = __rdiv__
+
+    def __pow__(self, power):
+        if isinstance(power, Quantity):
+            if not power.units.is_dimensionless:
+                raise Exception("The power argument must be dimensionless. (%s)**(%s) is ill-defined." % (self, power))
+            power = power.data * power.units.cgs_value
+        if not is_number(power):
+            raise Exception("A lazy quantity can only be raised to a single number, got %s." % power)
+
+        factors, scale = product_factors(self, power)
+        return LazyQuantity(self.units**power, "product", factors, scale)
+
+    def __abs__(self):
+        return Quantity(abs(self.data), self.units)
+
+    ### evaluation
+    def _evaluate(self):
+        """ Compute the data of this node, in blocks if it is big enough. """
+        leaves = []
+        collect_array_leaves(self, leaves, set())
+        op, args, scale = get_structure(self)
+
+        if not leaves:
+            return scale_value(raw_value(self, lambda data: data), scale)
+
+        # blocks only line up if the arrays all have the same shape,
+        # otherwise let numpy broadcast them in one go
+        shape = leaves[0].shape
+        size = leaves[0].size
+        if size <= block_size or any(leaf.shape != shape for leaf in leaves):
+            return scale_value(raw_value(self, lambda data: data), scale)
+
+        import numpy as np
+
+        dtype = np.result_type(float, *[leaf.dtype for leaf in leaves])
+        flat_leaves = dict((id(leaf), leaf.reshape(-1)) for leaf in leaves)
+        result = np.empty(size, dtype=dtype)
+
+        for start in range(0, size, block_size):
+            block = slice(start, min(start + block_size, size))
+
+            def get_block(data):
+                flat = flat_leaves.get(id(data))
+                return data if flat is None else flat[block]
+
+            result[block] = scale_value(raw_value(self, get_block), scale)
+
+        return result.reshape(shape)
+
+
+def sum_terms(node, coefficient):
+    """ Return the (coefficient, node) terms of `node` times `coefficient`. """
+    op, args, scale = get_structure(node)
+    if op == "sum":
+        return [(coefficient * scale * c, n) for c, n in args]
+    if op == "product":
+        # keep the product's scale in the coefficient
+        return [(coefficient * scale,
+                 LazyQuantity(node.units, "product", args))]
+    return [(coefficient, node)]
+
+
+def product_factors(node, power):
+    """
+    Return the (node, power) factors of `node` raised to `power`, and the
+    scale factor. Pure numbers fold into the scale.
+
+    """
+    op, args, scale = get_structure(node)
+    scale = scale**power
+    if op == "product":
+        return [(n, p * power) for n, p in args], scale
+    if op == "leaf" and is_number(args[0]):
+        return [], scale * args[0]**power
+    return [(node, power)], scale
+
+
+def merge_factors(factors):
+    """ Combine the powers of repeated nodes, like x * x -> x**2. """
+    merged = []
+    index = {}
+    for node, power in factors:
+        if id(node) in index:
+            i = index[id(node)]
+            merged[i] = (node, merged[i][1] + power)
+        else:
+            index[id(node)] = len(merged)
+            merged.append((node, power))
+    return [(node, power) for node, power in merged if power != 0]
+
+
+def collect_array_leaves(node, leaves, seen):
+    """ Add the array data of the leaves under `node` to `leaves`. """
+    if id(node) in seen:
+        return
+    seen.add(id(node))
+
+    op, args, scale = get_structure(node)
+    if op == "leaf":
+        if is_ndarray(args[0]) and args[0].ndim > 0:
+            leaves.append(args[0])
+    elif op == "sum":
+        for c, n in args:
+            collect_array_leaves(n, leaves, seen)
+    else:
+        for n, p in args:
+            collect_array_leaves(n, leaves, seen)
+
+
+def scale_value(value, scale):
+    return value if scale == 1.0 else value * scale
+
+
+def raw_value(node, get_data):
+    """
+    Compute the raw value (the value without the scale) of `node`.
+    `get_data` takes the data of a leaf and returns the part of it to use, so
+    this can work on one block at a time.
+
+    """
+    op, args, scale = get_structure(node)
+
+    if op == "leaf":
+        return get_data(args[0])
+
+    result = None
+    if op == "sum":
+        for coefficient, term in args:
+            value = raw_value(term, get_data)
+            if result is None:
+                result = scale_value(value, coefficient)
+            elif coefficient == 1.0:
+                result = result + value
+            elif coefficient == -1.0:
+                result = result - value
+            else:
+                result = result + value * coefficient
+        return result
+
+    for factor, power in args:
+        value = raw_value(factor, get_data)
+        if result is not None and power == -1:
+            result = result / value
+            continue
+        if power != 1:
+            if power < 0 or power != int(power):
+                power = float(power)
+            value = value**power
+        result = value if result is None else result * value
+    return 1.0 if result is None else result
+
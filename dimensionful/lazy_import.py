@@ -0,0 +1,67 @@
+"""
+
+Module attributes that are built the first time they are looked up.
+
+The package, `common_units`, and `constants` use this so importing them does
+not build every Unit and Quantity (and does not load sympy) up front.
+
+Copyright 2012, Casey W. Stark. See LICENSE.txt for more information.
+
+"""
+
+import sys
+from types import ModuleType
+
+
+class LazyModule(ModuleType):
+    """
+    A module that builds missing attributes with the functions in its
+    `_lazy_factories` dict, and then keeps the result as a normal attribute.
+
+    """
+
+    def __getattr__(self, name):
+        factories = self.__dict__.get("_lazy_factories", {})
+        if name not in factories:
+            raise AttributeError("module '%s' has no attribute '%s'" %
+                                 (self.__name__, name))
+
+        value = factories[name]()
+        setattr(self, name, value)
+        return value
+
+    def __dir__(self):
+        names = set(self.__dict__)
+        names.update(self.__dict__.get("_lazy_factories", {}))
+        return sorted(names)
+
+
+def install_lazy_attributes(module_name, factories):
+    """
+    Make the module `module_name` build the attributes named in `factories`
+    on first access. Each value of `factories` is a function with no
+    arguments that returns the attribute.
+
+    The module should list the lazy names in `__all__` if `from module import
+    *` needs to find them.
+
+    Call this at the end of the module. Returns the module object to use,
+    which is a replacement object on Python 2.
+
+    """
+    module = sys.modules[module_name]
+
+    try:
+        # Python 3.5+ can change the class of a module in place.
+        module.__class__ = LazyModule
+    except TypeError:
+        # Python 2 can't, so put a copy in sys.modules. The copy holds on to
+        # the original, which would otherwise clear its globals when it is
+        # garbage collected.
+        lazy_module = LazyModule(module_name, module.__doc__)
+        lazy_module.__dict__.update(module.__dict__)
+        lazy_module._original_module = module
+        sys.modules[module_name] = module = lazy_module
+
+    module._lazy_factories = factories
+    return module
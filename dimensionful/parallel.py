@@ -0,0 +1,568 @@
+"""
+
+Parallel conversion and arithmetic for big array quantities.
+
+A backend splits the data of array quantities into chunks and runs numpy on
+the chunks across a pool of workers. The units are worked out in the calling
+process, the same way the Quantity operators do it, so the workers only get
+raw conversion factors and the chunk bounds.
+
+`ThreadBackend` runs the chunks in a pool of threads, which works because
+numpy lets go of the GIL in its kernels. It needs no copies, so it is the
+cheaper choice for data in memory. Inside a `threads` block, the Quantity
+operators and conversions use one for big arrays too.
+
+    >>> from dimensionful.parallel import threads
+    >>> with threads(16):
+    ...     rho.convert_to("g / cm**3")
+    ...     mass = rho * volume
+
+`ProcessBackend` runs the chunks in worker processes. The data has to be in
+``multiprocessing.shared_memory`` for the workers to see it, so arrays that
+aren't are copied there first. Use `share` to move a quantity's data there
+once, and results are made there, so a chain of operations does not copy
+anything.
+
+    >>> from dimensionful.parallel import ProcessBackend
+    >>> with ProcessBackend(workers=8) as backend:
+    ...     rho = backend.share(Quantity(data, "Msun / pc**3"))
+    ...     backend.convert_to(rho, "g / cm**3")
+    ...     total = backend.sum(backend.multiply(rho, volume))
+
+Arrays of one chunk or less are computed in the calling process.
+
+Copyright 2012, Casey W. Stark. See LICENSE.txt for more information.
+
+"""
+
+from __future__ import division
+
+import weakref
+from contextlib import contextmanager
+from multiprocessing import cpu_count
+
+try:
+    from multiprocessing import shared_memory
+except ImportError:
+    shared_memory = None
+
+import numpy as np
+
+from dimensionful.cache import LRUCache
+from dimensionful.kernels import add_scaled, block_size, execution, is_ndarray
+from dimensionful.quantity import Quantity
+from dimensionful.quantity_array import (QuantityArray, get_factor_to,
+                                         split_quantity)
+from dimensionful.units import Unit, get_conversion_factor
+
+dimensionless_unit = Unit()
+
+# Elements per chunk. Big enough that the per-chunk overhead is small, small
+# enough that there are many chunks to share out.
+default_chunk_size = 2**20
+
+# Elements per chunk for threads, which can take smaller chunks than
+# processes. Each one is still a few kernel blocks.
+thread_chunk_size = 4 * block_size
+
+# Reductions, and how to combine the results of the chunks.
+reductions = {"sum": sum, "min": min, "max": max}
+
+
+def run_chunk(op, out, operands, params):
+    """
+    Run one operation on one chunk. `out` and the array operands are flat
+    arrays of the chunk's elements; other operands are single numbers.
+    Returns the partial result of reductions, and None otherwise.
+
+    """
+    if op in reductions:
+        return getattr(np, op)(operands[0]).item()
+
+    if op == "scale":
+        np.multiply(operands[0], params, out=out)
+    elif op == "add":
+        # out = a + factor * b, with a negative factor to subtract
+        a, b = operands
+        if params == 1.0:
+            np.add(a, b, out=out)
+        elif params == -1.0:
+            np.subtract(a, b, out=out)
+        elif not is_ndarray(b):
+            np.add(a, b * params, out=out)
+        elif is_ndarray(a) and np.may_share_memory(out, a):
+            add_scaled(out, b, params)
+        else:
+            np.multiply(b, params, out=out)
+            np.add(a, out, out=out)
+    elif op in ("multiply", "divide", "true_divide"):
+        getattr(np, op)(operands[0], operands[1], out=out)
+        if params != 1.0:
+            np.multiply(out, params, out=out)
+    elif op == "power":
+        np.power(operands[0], params, out=out)
+    else:
+        raise Exception("Unknown parallel operation %s." % op)
+
+
+class ParallelBackend(object):
+    """
+    The unit handling shared by the backends. Subclasses implement `run`,
+    which runs an operation over the chunks of the data, and `empty`, which
+    makes result arrays.
+
+    Operands can be quantities with array or single number data, or pure
+    numbers (for dimensionless results). The arrays must all have the same
+    shape.
+
+    """
+
+    def __init__(self, workers=None, chunk_size=default_chunk_size):
+        """
+        Parameters
+        ----------
+        workers : int, optional
+            The number of workers. Defaults to the number of cores.
+        chunk_size : int
+            The number of elements each worker handles at a time.
+
+        """
+        self.workers = workers or cpu_count()
+        self.chunk_size = chunk_size
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    def close(self):
+        """ Stop the workers. """
+
+    def get_chunks(self, size):
+        """ Return the (start, stop) of each chunk of `size` elements. """
+        return [(start, min(start + self.chunk_size, size))
+                for start in range(0, size, self.chunk_size)]
+
+    def is_parallel(self, size):
+        """ Check if `size` elements are worth splitting across workers. """
+        return self.workers > 1 and size > self.chunk_size
+
+    def empty(self, shape, dtype):
+        return np.empty(shape, dtype)
+
+    def share(self, quantity):
+        """
+        Get a quantity's data where the workers can use it. Returns the
+        quantity. Threads can use any array, so this does nothing here.
+
+        """
+        return quantity
+
+    def run(self, op, out, operands, params):
+        raise NotImplementedError
+
+    def accepts(self, *operands):
+        """
+        Check if an element-wise operation on `operands` is worth running on
+        this backend: the arrays have the same shape, are contiguous, and are
+        bigger than a chunk.
+
+        """
+        arrays = [o for o in operands if is_ndarray(o)]
+        if not arrays or not self.is_parallel(arrays[0].size):
+            return False
+        shape = arrays[0].shape
+        return all(a.shape == shape and a.flags.c_contiguous
+                   and a.dtype.kind in "biufc" for a in arrays)
+
+    def compute(self, op, operands, params, dtype=None):
+        """ Run an element-wise operation into a new array, and return it. """
+        shape = get_shape(operands)
+        if dtype is None:
+            types = [o.dtype if is_ndarray(o) else o for o in operands]
+            if op == "power":
+                types.append(params)
+            elif op == "true_divide" or params not in (1.0, -1.0) or \
+                    op == "divide" and np.divide is np.true_divide:
+                types.append(float)
+            dtype = np.result_type(*types)
+        out = self.empty(shape, dtype)
+        self.run(op, out, operands, params)
+        return out
+
+    def _apply(self, op, operands, params, units, cls=Quantity, dtype=None):
+        """
+        Run an element-wise operation into a new array, and return it as a
+        `cls` object in `units`.
+
+        """
+        return cls(self.compute(op, operands, params, dtype), units)
+
+    ### conversion
+    def convert_to(self, quantity, units):
+        """
+        Convert a quantity to `units` in place, like `Quantity.convert_to`.
+        Integer data is converted to floats first.
+
+        """
+        if not is_ndarray(quantity.data):
+            return quantity.convert_to(units)
+        if not isinstance(units, Unit):
+            units = Unit(units)
+        factor = get_conversion_factor(quantity.units, units)
+        if factor != 1.0:
+            data = self.prepare_output(quantity)
+            self.run("scale", data, [data], factor)
+        quantity.units = units
+        return quantity
+
+    def get_in(self, quantity, units):
+        """ Return a new quantity in `units`, like `Quantity.get_in`. """
+        if not is_ndarray(quantity.data):
+            return quantity.get_in(units)
+        if not isinstance(units, Unit):
+            units = Unit(units)
+        factor = get_conversion_factor(quantity.units, units)
+        return self._apply("scale", [quantity.data], factor, units,
+                           get_class(quantity),
+                           np.result_type(quantity.data, float))
+
+    def prepare_output(self, quantity):
+        """
+        Get a quantity's data ready to be written in place: floating point
+        and contiguous, copying it if it isn't.
+
+        """
+        data = quantity.data
+        if data.dtype.kind not in "fc":
+            quantity.data = data.astype(float)
+        elif not data.flags.c_contiguous:
+            quantity.data = np.ascontiguousarray(data)
+        return quantity.data
+
+    ### arithmetic
+    def add(self, left, right):
+        """ Add two quantities, in the units of the left. """
+        return self._add(left, right, 1.0)
+
+    def subtract(self, left, right):
+        """ Subtract two quantities, in the units of the left. """
+        return self._add(left, right, -1.0)
+
+    def _add(self, left, right, sign):
+        left_data, left_units = split_quantity(left)
+        right_data, right_units = split_quantity(right)
+        units = left_units if left_units is not None else dimensionless_unit
+        factor = get_factor_to(right_units, units) * sign
+        return self._apply("add", [left_data, right_data], factor, units,
+                           get_class(left, right))
+
+    def multiply(self, left, right):
+        """ Multiply two quantities. """
+        left_data, left_units = split_quantity(left)
+        right_data, right_units = split_quantity(right)
+        units = (left_units or dimensionless_unit) * \
+            (right_units or dimensionless_unit)
+        return self._apply("multiply", [left_data, right_data], 1.0, units,
+                           get_class(left, right))
+
+    def divide(self, left, right):
+        """ Divide two quantities. """
+        left_data, left_units = split_quantity(left)
+        right_data, right_units = split_quantity(right)
+        units = (left_units or dimensionless_unit) / \
+            (right_units or dimensionless_unit)
+        return self._apply("true_divide", [left_data, right_data], 1.0, units,
+                           get_class(left, right))
+
+    def power(self, quantity, power):
+        """ Raise a quantity to a single number power. """
+        return self._apply("power", [quantity.data], power,
+                           quantity.units**power, get_class(quantity))
+
+    ### reductions
+    def _reduce(self, op, quantity):
+        partials = self.run(op, None, [quantity.data], None)
+        return reductions[op](partials)
+
+    def sum(self, quantity):
+        """ The sum of the data, as a quantity. """
+        return Quantity(self._reduce("sum", quantity), quantity.units)
+
+    def min(self, quantity):
+        return Quantity(self._reduce("min", quantity), quantity.units)
+
+    def max(self, quantity):
+        return Quantity(self._reduce("max", quantity), quantity.units)
+
+    def mean(self, quantity):
+        return Quantity(self._reduce("sum", quantity) / quantity.data.size,
+                        quantity.units)
+
+
+def get_class(*operands):
+    """ Results are QuantityArrays if an operand is, and Quantities if not. """
+    for operand in operands:
+        if isinstance(operand, QuantityArray):
+            return QuantityArray
+    return Quantity
+
+
+def get_shape(operands):
+    """ The shape of the array operands, which must all be the same. """
+    shapes = set(o.shape for o in operands if is_ndarray(o))
+    if len(shapes) > 1:
+        raise Exception("Parallel operations need arrays of the same shape, got %s." % ", ".join(str(s) for s in sorted(shapes)))
+    if not shapes:
+        raise Exception("Parallel operations need at least one array.")
+    return shapes.pop()
+
+
+class SharedBlock(object):
+    """
+    A block of shared memory and the address of its data, so arrays can be
+    matched to the block they are in.
+
+    """
+    __slots__ = ["memory", "address", "size"]
+
+    def __init__(self, memory):
+        self.memory = memory
+        self.address = np.frombuffer(memory.buf, np.uint8).ctypes.data
+        self.size = memory.size
+
+
+def free_block(blocks, name):
+    """ Drop a shared memory block once no array uses it. """
+    block = blocks.pop(name, None)
+    if block is None:
+        return
+    try:
+        block.memory.close()
+    except BufferError:
+        # something still maps it; the memory goes when that does
+        pass
+    block.memory.unlink()
+
+
+# Shared memory blocks attached in this worker process, keyed on name.
+attached_blocks = LRUCache(maxsize=32)
+
+def attach_array(spec):
+    """ Return a flat array in a worker, from an operand spec. """
+    kind, value = spec
+    if kind == "value":
+        return value
+
+    name, offset, dtype, count = value
+    memory = attached_blocks.get(name)
+    if memory is None:
+        try:
+            memory = shared_memory.SharedMemory(name=name, track=False)
+        except TypeError:
+            memory = shared_memory.SharedMemory(name=name)
+        memory = attached_blocks.setdefault(name, memory)
+    return np.ndarray((count,), dtype, buffer=memory.buf, offset=offset)
+
+def run_task(task):
+    """ Run one chunk of an operation in a worker process. """
+    op, out_spec, operand_specs, params, start, stop = task
+    out = None if out_spec is None else attach_array(out_spec)[start:stop]
+    operands = []
+    for spec in operand_specs:
+        operand = attach_array(spec)
+        operands.append(operand[start:stop] if is_ndarray(operand)
+                        else operand)
+    return run_chunk(op, out, operands, params)
+
+
+class ProcessBackend(ParallelBackend):
+    """
+    Runs operations across a pool of worker processes, on data in shared
+    memory. Close the backend (or use it in a ``with`` block) to stop the
+    workers. Shared memory is freed when the arrays using it are.
+
+    """
+
+    def __init__(self, workers=None, chunk_size=default_chunk_size):
+        if shared_memory is None:
+            raise Exception("ProcessBackend needs multiprocessing.shared_memory, from Python 3.8.")
+        ParallelBackend.__init__(self, workers, chunk_size)
+        self.pool = None
+        self.blocks = {}
+
+    def close(self):
+        if self.pool is not None:
+            self.pool.close()
+            self.pool.join()
+            self.pool = None
+
+    def get_pool(self):
+        if self.pool is None:
+            from multiprocessing import Pool
+            self.pool = Pool(self.workers)
+        return self.pool
+
+    def empty(self, shape, dtype):
+        """
+        Make an array, in shared memory if it is big enough to be worked on
+        in parallel.
+
+        """
+        dtype = np.dtype(dtype)
+        size = int(np.prod(shape))
+        if not self.is_parallel(size):
+            return np.empty(shape, dtype)
+
+        memory = shared_memory.SharedMemory(create=True,
+                                            size=size * dtype.itemsize)
+        block = SharedBlock(memory)
+        self.blocks[memory.name] = block
+
+        array = np.ndarray(shape, dtype, buffer=memory.buf)
+        weakref.finalize(array, free_block, self.blocks, memory.name)
+        return array
+
+    def share(self, quantity):
+        """
+        Move a quantity's data into shared memory, if it isn't already, so
+        later operations on it don't copy it. Returns the quantity.
+
+        """
+        data = quantity.data
+        if is_ndarray(data) and self.find_block(data) is None:
+            shared = self.empty(data.shape, data.dtype)
+            shared[...] = data
+            quantity.data = shared
+        return quantity
+
+    def find_block(self, data):
+        """ Return the shared block holding a contiguous array, or None. """
+        if not data.flags.c_contiguous:
+            return None
+        address = data.ctypes.data
+        for block in self.blocks.values():
+            if block.address <= address < block.address + block.size:
+                return block
+        return None
+
+    def get_spec(self, data):
+        """
+        Describe an operand for the workers, copying arrays into shared
+        memory if they are not there. Returns the spec and any copy, which
+        must be kept until the workers are done.
+
+        """
+        if not is_ndarray(data):
+            return ("value", data), None
+        copy = None
+        block = self.find_block(data)
+        if block is None:
+            copy = self.empty(data.shape, data.dtype)
+            copy[...] = data
+            data = copy
+            block = self.find_block(data)
+        offset = data.ctypes.data - block.address
+        return ("shared", (block.memory.name, offset, data.dtype.str,
+                           data.size)), copy
+
+    def prepare_output(self, quantity):
+        data = ParallelBackend.prepare_output(self, quantity)
+        if self.is_parallel(data.size):
+            self.share(quantity)
+        return quantity.data
+
+    def run(self, op, out, operands, params):
+        shape = get_shape(operands + ([] if out is None else [out]))
+        size = int(np.prod(shape))
+        if not self.is_parallel(size):
+            flat = [o.reshape(-1) if is_ndarray(o) else o for o in operands]
+            result = run_chunk(op, None if out is None else out.reshape(-1),
+                               flat, params)
+            return None if result is None else [result]
+
+        copies = []
+        specs = []
+        for operand in operands:
+            spec, copy = self.get_spec(operand)
+            specs.append(spec)
+            copies.append(copy)
+        out_spec = None
+        if out is not None:
+            out_spec, copy = self.get_spec(out)
+            if copy is not None:
+                raise Exception("Parallel results must be written to shared memory.")
+
+        tasks = [(op, out_spec, specs, params, start, stop)
+                 for start, stop in self.get_chunks(size)]
+        return self.get_pool().map(run_task, tasks, chunksize=1)
+
+
+class ThreadBackend(ParallelBackend):
+    """
+    Runs operations across a pool of threads, on the arrays in place. Close
+    the backend (or use it in a ``with`` block) to stop the threads.
+
+    """
+
+    def __init__(self, workers=None, chunk_size=thread_chunk_size):
+        ParallelBackend.__init__(self, workers, chunk_size)
+        self.pool = None
+
+    def close(self):
+        if self.pool is not None:
+            self.pool.close()
+            self.pool.join()
+            self.pool = None
+
+    def get_pool(self):
+        if self.pool is None:
+            from multiprocessing.pool import ThreadPool
+            self.pool = ThreadPool(self.workers)
+        return self.pool
+
+    def run(self, op, out, operands, params):
+        shape = get_shape(operands + ([] if out is None else [out]))
+        size = int(np.prod(shape))
+        flat = [o.reshape(-1) if is_ndarray(o) else o for o in operands]
+        flat_out = None if out is None else out.reshape(-1)
+
+        if not self.is_parallel(size):
+            result = run_chunk(op, flat_out, flat, params)
+            return None if result is None else [result]
+
+        def run_part(bounds):
+            start, stop = bounds
+            return run_chunk(
+                op, None if flat_out is None else flat_out[start:stop],
+                [o[start:stop] if is_ndarray(o) else o for o in flat],
+                params)
+
+        return self.get_pool().map(run_part, self.get_chunks(size),
+                                   chunksize=1)
+
+
+@contextmanager
+def threads(workers=None, chunk_size=thread_chunk_size):
+    """
+    Run the conversions and arithmetic of array quantities on a pool of
+    threads, inside a ``with`` block. This applies to the whole process. Only
+    arrays bigger than a chunk are split up. Yields the ThreadBackend.
+
+    Parameters
+    ----------
+    workers : int, optional
+        The number of threads. Defaults to the number of cores.
+    chunk_size : int
+        The number of elements each thread handles at a time.
+
+    """
+    backend = ThreadBackend(workers, chunk_size)
+    previous = execution.backend
+    execution.backend = backend
+    try:
+        yield backend
+    finally:
+        execution.backend = previous
+        backend.close()
@@ -0,0 +1,251 @@
+"""
+
+A small parser for unit strings, like "Msun * Mpc**-3" or "erg / (cm**2 * s)".
+
+The grammar is just unit symbols (with optional prefixes), `*`, `/`, `**` with
+integer or rational powers, `sqrt(...)`, and parentheses, so the strings units
+print as parse back to the same unit. Parsing goes straight from the
+string to the cgs value, dimensions, and symbol powers of the unit, without
+going through sympy. The cgs value is an exact Fraction, so the order the
+symbols are written in doesn't change it.
+
+Copyright 2012, Casey W. Stark. See LICENSE.txt for more information.
+
+"""
+
+from __future__ import division
+
+import re
+from fractions import Fraction
+
+from dimensionful.dimensions import dimensionless, exact_value, \
+    exact_value_power, rational_power
+from dimensionful.instrument import timed
+
+# Token regex. Each token kind is a named group.
+token_regex = re.compile(r"""
+    (?P<space>\s+)
+  | (?P<name>[A-Za-z_][A-Za-z_0-9]*)
+  | (?P<number>(\d+\.?\d*|\.\d+)([eE][-+]?\d+)?)
+  | (?P<pow>\*\*)
+  | (?P<op>[*/()+-])
+""", re.VERBOSE)
+
+
+class UnitParseError(Exception):
+    """
+    Raised when a unit string cannot be parsed. The `position` attribute is the
+    index in the string where things went wrong.
+
+    """
+    def __init__(self, message, unit_string, position):
+        self.unit_string = unit_string
+        self.position = position
+        Exception.__init__(self, "%s at position %d:\n    %s\n    %s^" %
+                           (message, position, unit_string, " " * position))
+
+
+def tokenize(unit_string):
+    """
+    Split a unit string into a list of (kind, text, position) tuples. The
+    kinds are "name", "number", "pow", and "op". The list ends with an
+    ("end", "", len(unit_string)) token.
+
+    """
+    tokens = []
+    position = 0
+    while position < len(unit_string):
+        match = token_regex.match(unit_string, position)
+        if match is None:
+            raise UnitParseError("Unexpected character '%s'" %
+                                 unit_string[position], unit_string, position)
+        kind = match.lastgroup
+        if kind != "space":
+            tokens.append((kind, match.group(kind), position))
+        position = match.end()
+
+    tokens.append(("end", "", position))
+    return tokens
+
+
+class _Parser(object):
+    """
+    Recursive descent parser over the token list. Each rule returns a tuple of
+    (cgs_value, dimensions, symbols), where `symbols` maps unit symbol strings
+    to their Fraction powers.
+
+    """
+
+    def __init__(self, unit_string, lookup_symbol):
+        self.unit_string = unit_string
+        self.lookup_symbol = lookup_symbol
+        self.tokens = tokenize(unit_string)
+        self.index = 0
+
+    def error(self, message, token=None):
+        if token is None:
+            token = self.tokens[self.index]
+        raise UnitParseError(message, self.unit_string, token[2])
+
+    def peek(self):
+        return self.tokens[self.index]
+
+    def next(self):
+        token = self.tokens[self.index]
+        self.index += 1
+        return token
+
+    def expect(self, text):
+        token = self.next()
+        if token[1] != text:
+            self.error("Expected '%s' but found '%s'" % (text, token[1] or
+                                                         "end of string"),
+                       token)
+        return token
+
+    def parse(self):
+        result = self.expr()
+        token = self.peek()
+        if token[0] != "end":
+            self.error("Unexpected '%s'" % token[1])
+        return result
+
+    def expr(self):
+        """ expr := term (('*' | '/') term)* """
+        cgs_value, dimensions, symbols = self.term()
+        symbols = dict(symbols)
+
+        while self.peek()[1] in ("*", "/"):
+            op = self.next()[1]
+            right_cgs_value, right_dimensions, right_symbols = self.term()
+            if op == "*":
+                cgs_value *= right_cgs_value
+                dimensions *= right_dimensions
+                sign = 1
+            else:
+                cgs_value /= right_cgs_value
+                dimensions /= right_dimensions
+                sign = -1
+            for symbol, power in right_symbols.items():
+                symbols[symbol] = symbols.get(symbol, 0) + sign * power
+
+        return (cgs_value, dimensions,
+                dict((s, p) for s, p in symbols.items() if p != 0))
+
+    def term(self):
+        """ term := atom ('**' power)? """
+        cgs_value, dimensions, symbols = self.atom()
+
+        if self.peek()[0] == "pow":
+            self.next()
+            power = self.power()
+            cgs_value = exact_value_power(cgs_value, power)
+            dimensions = dimensions**power
+            symbols = dict((s, p * power) for s, p in symbols.items())
+
+        return cgs_value, dimensions, symbols
+
+    def atom(self):
+        """ atom := name | '1' | '(' expr ')' | 'sqrt' '(' expr ')' """
+        token = self.next()
+        kind, text, position = token
+
+        # units print half powers like sympy does, as sqrt(cm)
+        if kind == "name" and text == "sqrt" and self.peek()[1] == "(":
+            self.next()
+            cgs_value, dimensions, symbols = self.expr()
+            self.expect(")")
+            half = Fraction(1, 2)
+            return (exact_value_power(cgs_value, half), dimensions**half,
+                    dict((s, p * half) for s, p in symbols.items()))
+
+        if kind == "name":
+            try:
+                cgs_value, dimensions = self.lookup_symbol(text)
+            except Exception as error:
+                self.error(str(error), token)
+            return (exact_value(cgs_value), dimensions,
+                    {text: rational_power(1)})
+
+        if kind == "number":
+            if float(text) != 1:
+                self.error("Numeric factors are not allowed in units, found "
+                           "'%s'" % text, token)
+            return exact_value(1), dimensionless, {}
+
+        if text == "(":
+            result = self.expr()
+            self.expect(")")
+            return result
+
+        self.error("Expected a unit symbol but found '%s'" %
+                   (text or "end of string"), token)
+
+    def power(self):
+        """
+        power := signed_number
+               | '(' signed_number ('/' signed_number)? ')'
+
+        """
+        if self.peek()[1] != "(":
+            return self.signed_number()
+
+        self.next()
+        power = self.signed_number()
+        if self.peek()[1] == "/":
+            self.next()
+            denominator = self.signed_number()
+            if denominator == 0:
+                self.error("Division by zero in power",
+                           self.tokens[self.index - 1])
+            power = power / denominator
+        self.expect(")")
+        return power
+
+    def signed_number(self):
+        sign = 1
+        while self.peek()[1] in ("+", "-"):
+            if self.next()[1] == "-":
+                sign = -sign
+
+        token = self.next()
+        if token[0] != "number":
+            self.error("Expected a number for the power but found '%s'" %
+                       (token[1] or "end of string"), token)
+        if "." in token[1] or "e" in token[1].lower():
+            return sign * rational_power(float(token[1]))
+        return sign * rational_power(int(token[1]))
+
+
+@timed("parse")
+def parse_unit_string(unit_string, lookup_symbol=None):
+    """
+    Parse a unit string into its cgs value, dimensions, and symbol powers.
+
+    Parameters
+    ----------
+    unit_string : string
+        Something like "Msun * Mpc**-3" or "g / (cm * s**2)".
+    lookup_symbol : function, optional
+        Takes a symbol string and returns a (cgs_value, dimensions) tuple.
+        Defaults to `dimensionful.units.lookup_unit_symbol`.
+
+    Returns
+    -------
+    (cgs_value, dimensions, symbols) : tuple
+        The unit's value in cgs as a Fraction, its Dimensions, and a dict
+        mapping each unit symbol in the string to its total Fraction power.
+        Symbols whose powers cancel are left out.
+
+    Raises
+    ------
+    UnitParseError if the string is malformed or has an unknown symbol.
+
+    """
+    if lookup_symbol is None:
+        from dimensionful.units import lookup_unit_symbol as lookup_symbol
+
+    if not unit_string.strip():
+        return exact_value(1), dimensionless, {}
+
+    return _Parser(unit_string, lookup_symbol).parse()
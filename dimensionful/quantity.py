@@ -6,18 +6,89 @@ Copyright 2012, Casey W. Stark. See LICENSE.txt for more information.
 
 """
 
+import operator
+import os
+from contextlib import contextmanager
+from threading import Lock
+
+from dimensionful.kernels import (add, add_scaled, divide, is_ndarray,
+                                  multiply, scale, scale_in_place,
+                                  true_divide)
 from dimensionful.units import Unit, get_conversion_factor
 
+class Checking(object):
+    """
+    Whether the Quantity operators check that dimensions match before adding,
+    subtracting, and comparing. Set with `trusted` and `set_debug`. Like the
+    kernel backend, this is for the whole process.
+
+    Conversion factors are only cached for pairs of units whose dimensions
+    were checked, so skipping the operators' own check still catches a bad
+    pair the first time it is seen, just with a less specific message.
+
+    """
+    # how many `trusted` blocks are open, in any thread
+    depth = 0
+    # check everything anyway, for test runs
+    debug = bool(os.environ.get("DIMENSIONFUL_DEBUG"))
+    # what the operators look at: in a trusted block and not debug
+    skip = False
+    lock = Lock()
+
+checking = Checking()
+
+
+@contextmanager
+def trusted():
+    """
+    Skip the dimension checks in the Quantity operators inside a with block,
+    for inner loops over units that were already checked on the way in. The
+    units of the results are still worked out as usual. Does nothing when
+    debug checking is on.
+
+        >>> total = first_step(a, b)  # checked
+        >>> with trusted():
+        ...     for i in range(n):
+        ...         total = total + step(a, b)
+
+    """
+    # count the open blocks, so blocks in different threads can overlap and
+    # the checks come back when the last one ends
+    with Checking.lock:
+        Checking.depth += 1
+        Checking.skip = not Checking.debug
+    try:
+        yield
+    finally:
+        with Checking.lock:
+            Checking.depth -= 1
+            Checking.skip = Checking.depth > 0 and not Checking.debug
+
+
+def set_debug(debug=True):
+    """
+    Turn debug checking on or off. With it on, `trusted` blocks check
+    dimensions like everywhere else. Setting the DIMENSIONFUL_DEBUG
+    environment variable turns it on at import.
+
+    """
+    with Checking.lock:
+        Checking.debug = debug
+        Checking.skip = Checking.depth > 0 and not debug
+
 # @todo: Verify that we need type checks in all of the left and right operator
 # methods (ex: __add__ and __radd__). I think they are only needed in the left
 # case. If something hits the right operator method of a Quantity object, the
 # left_object must not be a Quantity object. Leaving them until I can test more.
 
-class Quantity:
+class Quantity(object):
     """
     A physical quantity. Attaches units to data.
 
     """
+    # no per-instance __dict__, so millions of scalar quantities stay small
+    __slots__ = ("data", "units")
+
     def __init__(self, data, unit_repr):
         """
         Create a quantity. Combine units with the data.
@@ -38,6 +109,10 @@ class Quantity:
         else:
             self.units = Unit(unit_repr)
 
+    def __reduce__(self):
+        # needed with __slots__ for pickling and copying
+        return (self.__class__, (self.data, self.units))
+
     def __repr__(self):
         return "%s %s" % (self.data, self.units)
 
@@ -60,20 +135,52 @@ class Quantity:
         self.data = array(self.data)
         return self
 
+    def save(self, path):
+        """
+        Write the data and units to a file, which `Quantity.load` reads. The
+        data is stored in the ``.npy`` format after a small units header.
+
+        Parameters
+        ----------
+        path : string
+            Where to write the file.
+
+        """
+        from dimensionful.storage import save
+
+        save(self, path)
+
+    @classmethod
+    def load(cls, path, mmap_mode=None):
+        """
+        Read a quantity written by `save`, as an object of this class.
+
+        Parameters
+        ----------
+        path : string
+            The file to read.
+        mmap_mode : None, "r", "r+", or "c", optional
+            If given, map the array data from the file with ``numpy.memmap``
+            instead of reading it, so only the slices that are used are read.
+
+        """
+        from dimensionful.storage import load
+
+        return load(path, mmap_mode, cls)
+
     ### begin unit conversion methods
-    def _unit_repr_check_same(self, units):
+    def _get_conversion(self, units):
         """
-        Takes a Unit object, or string of known unit symbol, and check that it
-        is compatible with this quantity. Returns Unit object.
+        Takes a Unit object, or string of known unit symbols, and returns the
+        Unit object and the factor that converts this quantity's data to it.
+        The dimensions are checked by `get_conversion_factor`, once per pair of
+        units.
 
         """
         if not isinstance(units, Unit):
             units = Unit(units)
 
-        if not self.units.same_dimensions_as(units):
-            raise Exception("Cannot convert to units with different dimensionality. Current unit is %s, argument is %s" % (self.units.dimensions, units))
-
-        return units
+        return units, get_conversion_factor(self.units, units)
 
     def convert_to(self, units):
         """
@@ -86,9 +193,8 @@ class Quantity:
             The units you want the data in.
 
         """
-        new_units = self._unit_repr_check_same(units)
-        conversion_factor = get_conversion_factor(self.units, new_units)
-        self.data *= conversion_factor
+        new_units, conversion_factor = self._get_conversion(units)
+        self.data = scale_in_place(self.data, conversion_factor)
         self.units = new_units
 
         return self
@@ -102,6 +208,20 @@ class Quantity:
         """
         return self.convert_to(self.units.get_cgs_equivalent())
 
+    def to_system(self, system):
+        """
+        Convert the data and units to the equivalent units in a unit system.
+        This overwrites the ``data`` and ``units`` attributes, making no copies,
+        and returns None.
+
+        Parameters
+        ----------
+        system : UnitSystem object or string
+            The system, or its name, like "cgs", "si", or "astro".
+
+        """
+        return self.convert_to(self.units.get_system_equivalent(system))
+
     def get_in(self, units):
         """
         Creates a new Quantity with the data in the supplied units, and returns
@@ -117,10 +237,9 @@ class Quantity:
         Quantity object with converted data and supplied units.
 
         """
-        new_units = self._unit_repr_check_same(units)
-        conversion_factor = get_conversion_factor(self.units, new_units)
+        new_units, conversion_factor = self._get_conversion(units)
 
-        return Quantity(self.data * conversion_factor, new_units)
+        return self.__class__(scale(self.data, conversion_factor), new_units)
 
     def get_in_cgs(self):
         """
@@ -134,6 +253,23 @@ class Quantity:
         """
         return self.get_in(self.units.get_cgs_equivalent())
 
+    def in_system(self, system):
+        """
+        Creates a new Quantity with the data in the equivalent units of a unit
+        system, and returns it. Does not modify this object.
+
+        Parameters
+        ----------
+        system : UnitSystem object or string
+            The system, or its name, like "cgs", "si", or "astro".
+
+        Returns
+        -------
+        Quantity object with converted data and the system's units.
+
+        """
+        return self.get_in(self.units.get_system_equivalent(system))
+
     def get_data_in(self, units):
         """
         Returns the data, converted to the supplied units.
@@ -149,15 +285,13 @@ class Quantity:
         units.
 
         """
-        new_units = self._unit_repr_check_same(units)
+        new_units, conversion_factor = self._get_conversion(units)
 
-        # don't operate on data if given the same units
-        if self.units == new_units:
+        # don't operate on data if there is nothing to convert
+        if conversion_factor == 1.0:
             return self.data
 
-        conversion_factor = get_conversion_factor(self.units, new_units)
-
-        return self.data * conversion_factor
+        return scale(self.data, conversion_factor)
 
     def get_data_in_cgs(self):
         """
@@ -176,7 +310,8 @@ class Quantity:
 
         """
         if isinstance(right_object, Quantity):  # make sure it's a quantity before we check units attribute
-            if not self.units.same_dimensions_as(right_object.units):
+            if not (checking.skip or
+                    self.units.same_dimensions_as(right_object.units)):
                 raise Exception("You cannot add these quantities because their dimensions do not match. `%s + %s` is ill-defined" % (self.units, right_object.units))
         else:  # the only way this works is with a float so...
             if not self.units.is_dimensionless:
@@ -185,9 +320,10 @@ class Quantity:
             # case of dimensionless self + float
             return Quantity(self.data + right_object, self.units)
 
-        # `get_data_in` will not apply the conversion if the units are the same
-        return Quantity(self.data + right_object.get_data_in(self.units),
-                        self.units)
+        # the conversion is folded into the addition, and skipped if the
+        # units are the same
+        factor = right_object._get_conversion(self.units)[1]
+        return Quantity(add(self.data, right_object.data, factor), self.units)
 
     def __radd__(self, left_object):
         """
@@ -197,7 +333,8 @@ class Quantity:
 
         """
         if isinstance(left_object, Quantity):  # make sure it's a quantity before we check units attribute
-            if not self.units.same_dimensions_as(left_object.units):
+            if not (checking.skip or
+                    self.units.same_dimensions_as(left_object.units)):
                 raise Exception("You cannot add these quantities because their dimensions do not match. `%s + %s` is ill-defined" % (left_object.units, self.units))
         else:  # the only way this works is with a float so...
             if not self.units.is_dimensionless:
@@ -206,9 +343,8 @@ class Quantity:
             # case of dimensionless float + self
             return Quantity(left_object + self.data, self.units)
 
-        # `get_data_in` will not apply the conversion if the units are the same
-        return Quantity((left_object.data
-                         + self.get_data_in(left_object.units)),
+        factor = self._get_conversion(left_object.units)[1]
+        return Quantity(add(left_object.data, self.data, factor),
                         left_object.units)
 
     def __sub__(self, right_object):
@@ -219,7 +355,8 @@ class Quantity:
 
         """
         if isinstance(right_object, Quantity):  # make sure it's a quantity before we check units attribute
-            if not self.units.same_dimensions_as(right_object.units):
+            if not (checking.skip or
+                    self.units.same_dimensions_as(right_object.units)):
                 raise Exception("You cannot add these quantities because their dimensions do not match. `%s - %s` is ill-defined" % (self.units, right_object.units))
         else:  # the only way this works is with a float so...
             if not self.units.is_dimensionless:
@@ -228,8 +365,8 @@ class Quantity:
             # case of dimensionless self + float
             return Quantity(self.data - right_object, self.units)
 
-        # `get_data_in` will not apply the conversion if the units are the same
-        return Quantity(self.data - right_object.get_data_in(self.units),
+        factor = right_object._get_conversion(self.units)[1]
+        return Quantity(add(self.data, right_object.data, factor, True),
                         self.units)
 
     def __rsub__(self, left_object):
@@ -240,7 +377,8 @@ class Quantity:
 
         """
         if isinstance(left_object, Quantity):  # make sure it's a quantity before we check units attribute
-            if not self.units.same_dimensions_as(left_object.units):
+            if not (checking.skip or
+                    self.units.same_dimensions_as(left_object.units)):
                 raise Exception("You cannot add these quantities because their dimensions do not match. `%s - %s` is ill-defined" % (left_object.units, self.units))
         else:  # the only way this works is with a float so...
             if not self.units.is_dimensionless:
@@ -249,9 +387,8 @@ class Quantity:
             # case of dimensionless float + self
             return Quantity(left_object - self.data, self.units)
 
-        # `get_data_in` will not apply the conversion if the units are the same
-        return Quantity((left_object.data
-                         - self.get_data_in(left_object.units)),
+        factor = self._get_conversion(left_object.units)[1]
+        return Quantity(add(left_object.data, self.data, factor, True),
                         left_object.units)
 
     def __neg__(self):
@@ -265,12 +402,12 @@ class Quantity:
 
         """
         if isinstance(right_object, Quantity):
-            return Quantity(self.data * right_object.data,
+            return Quantity(multiply(self.data, right_object.data),
                             self.units * right_object.units)
 
         # `right_object` is not a Quantity object, so try to use it as
         # dimensionless data.
-        return Quantity(self.data * right_object, self.units)
+        return Quantity(multiply(self.data, right_object), self.units)
 
     def __rmul__(self, left_object):
         """
@@ -279,12 +416,12 @@ class Quantity:
 
         """
         if isinstance(left_object, Quantity):
-            return Quantity(left_object.data * self.data,
+            return Quantity(multiply(left_object.data, self.data),
                             left_object.units * self.units)
 
         # `left_object` is not a Quantity object, so try to use it as
         # dimensionless data.
-        return Quantity(left_object * self.data, self.units)
+        return Quantity(multiply(left_object, self.data), self.units)
 
     def __div__(self, right_object):
         """
@@ -293,12 +430,19 @@ class Quantity:
 
         """
         if isinstance(right_object, Quantity):
-            return Quantity(self.data / right_object.data,
+            return Quantity(divide(self.data, right_object.data),
                             self.units / right_object.units)
 
         # `right_object` is not a Quantity object, so try to use it as
         # dimensionless data.
-        return Quantity(self.data / right_object, self.units)
+        return Quantity(divide(self.data, right_object), self.units)
+
+    def __truediv__(self, right_object):
+        """ Like `__div__`, with true division of the data. """
+        if isinstance(right_object, Quantity):
+            return Quantity(true_divide(self.data, right_object.data),
+                            self.units / right_object.units)
+        return Quantity(true_divide(self.data, right_object), self.units)
 
     def __rdiv__(self, left_object):
         """
@@ -307,12 +451,20 @@ class Quantity:
 
         """
         if isinstance(left_object, Quantity):
-            return Quantity(left_object.data / self.data,
+            return Quantity(divide(left_object.data, self.data),
                             left_object.units / self.units)
 
         # `left_object` is not a Quantity object, so try to use it as
         # dimensionless data.
-        return Quantity(left_object / self.data, self.units**(-1))
+        return Quantity(divide(left_object, self.data), self.units**(-1))
+
+    def __rtruediv__(self, left_object):
+        """ Like `__rdiv__`, with true division of the data. """
+        if isinstance(left_object, Quantity):
+            return Quantity(true_divide(left_object.data, self.data),
+                            left_object.units / self.units)
+        return Quantity(true_divide(left_object, self.data),
+                        self.units**(-1))
 
     def __pow__(self, power):
         """
@@ -336,6 +488,127 @@ class Quantity:
         """ Return a Quantity with the abs of the data. """
         return Quantity(abs(self.data), self.units)
 
+    ### in-place operation methods
+    # These write into ``data`` when it is a numpy array, so loops like
+    # ``q += dq`` do not allocate a new array every step. Other data, like a
+    # float, can't be changed in place, so those fall back to the normal
+    # operators and return a new Quantity.
+    def _add_in_place(self, right_object, subtract):
+        """ Shared by __iadd__ and __isub__. """
+        if not is_ndarray(self.data):
+            if subtract:
+                return self - right_object
+            return self + right_object
+
+        if isinstance(right_object, Quantity):
+            if not (checking.skip or
+                    self.units.same_dimensions_as(right_object.units)):
+                raise Exception("You cannot add these quantities because their dimensions do not match. `%s %s= %s` is ill-defined" % (self.units, "-" if subtract else "+", right_object.units))
+            data = right_object.data
+            conversion_factor = get_conversion_factor(right_object.units,
+                                                      self.units)
+        else:
+            if not self.units.is_dimensionless:
+                raise Exception("You cannot add a pure number to a dimensional quantity. `%s %s= %s` is ill-defined." % (self, "-" if subtract else "+", right_object))
+            data = right_object
+            conversion_factor = 1.0
+
+        # like `_operate_in_place`, int data that can't hold the result is
+        # upcast to a new array
+        try:
+            self.data = add_scaled(self.data, data, conversion_factor,
+                                   subtract)
+        except TypeError:
+            self.data = add_scaled(self.data.astype(float), data,
+                                   conversion_factor, subtract)
+        return self
+
+    def __iadd__(self, right_object):
+        """
+        Add the object on the right of `+=` to this quantity, in place. The
+        right side is converted to these units on the fly, without a
+        temporary copy.
+
+        """
+        return self._add_in_place(right_object, False)
+
+    def __isub__(self, right_object):
+        """
+        Subtract the object on the right of `-=` from this quantity, in place.
+        The right side is converted to these units on the fly, without a
+        temporary copy.
+
+        """
+        return self._add_in_place(right_object, True)
+
+    def _operate_in_place(self, operator, data):
+        """
+        Apply the in-place `operator` to the data. Falls back to a new array if
+        numpy can't cast the result into the existing one (int data times a
+        float, for example).
+
+        """
+        try:
+            self.data = operator(self.data, data)
+        except TypeError:
+            self.data = operator(self.data.astype(float), data)
+
+    def __imul__(self, right_object):
+        """
+        Multiply this quantity by the object on the right of `*=`, in place.
+        The units become the product of the units.
+
+        """
+        if not is_ndarray(self.data):
+            return self * right_object
+
+        if isinstance(right_object, Quantity):
+            self._operate_in_place(operator.imul, right_object.data)
+            self.units = self.units * right_object.units
+        else:
+            self._operate_in_place(operator.imul, right_object)
+        return self
+
+    def __itruediv__(self, right_object):
+        """
+        Divide this quantity by the object on the right of `/=`, in place.
+        The units become the quotient of the units.
+
+        """
+        if not is_ndarray(self.data):
+            return self / right_object
+
+        if isinstance(right_object, Quantity):
+            self._operate_in_place(operator.itruediv, right_object.data)
+            self.units = self.units / right_object.units
+        else:
+            self._operate_in_place(operator.itruediv, right_object)
+        return self
+
+    __idiv__ = __itruediv__
+
+    def __ipow__(self, power):
+        """
+        Raise this quantity to some power, in place.
+
+        Parameters
+        ----------
+        power : float or dimensionless Quantity object
+            The pow value.
+
+        """
+        if not is_ndarray(self.data):
+            return self**power
+
+        if isinstance(power, Quantity):
+            if not power.units.is_dimensionless:
+                raise Exception("The power argument must be dimensionless. (%s)**(%s) is ill-defined." % (self, power))
+            power = power.data
+
+        self._operate_in_place(operator.ipow, power)
+        self.units = self.units**power
+        return self
+
     def sqrt(self):
         """
         Return sqrt of this Quantity. This is just a wrapper of Quantity.__pow__
@@ -361,84 +634,185 @@ class Quantity:
         return exp(self.data)
 
     ### comparison operators
-    # @todo: outsource to a single method with an op argument.
+    # These work element-wise, so array data gives an array of bools.
+    def _get_comparison_data(self, right_object, symbol):
+        """
+        Return the data of this quantity and of `right_object` in common units,
+        and those units (None when comparing a dimensionless quantity to a pure
+        number). Only the smaller of the two is converted, so comparing a big
+        array to a single threshold does not scale the array.
+
+        """
+        if isinstance(right_object, Quantity):
+            if not (checking.skip or
+                    self.units.same_dimensions_as(right_object.units)):
+                raise Exception("You cannot compare quantities of units %s and %s." % (self.units, right_object.units))
+            right_data = right_object.data
+            right_units = right_object.units
+        elif self.units.is_dimensionless:
+            right_data = right_object
+            right_units = None
+        else:
+            raise Exception("You cannot compare a dimensional Quantity to a non-Quantity object. %s %s %s is ill-defined." % (self, symbol, right_object))
+
+        if right_units is self.units:
+            return self.data, right_data, self.units
+
+        if getattr(right_data, "size", 1) <= getattr(self.data, "size", 1):
+            # convert the right side to these units
+            if right_units is None:
+                conversion_factor = 1.0 / self.units.cgs_value
+            else:
+                conversion_factor = get_conversion_factor(right_units,
+                                                          self.units)
+            if conversion_factor != 1.0:
+                right_data = right_data * conversion_factor
+            return self.data, right_data, self.units
+
+        # convert this side to the right units
+        if right_units is None:
+            conversion_factor = self.units.cgs_value
+        else:
+            conversion_factor = get_conversion_factor(self.units, right_units)
+        left_data = self.data
+        if conversion_factor != 1.0:
+            left_data = left_data * conversion_factor
+        return left_data, right_data, right_units
+
     def __lt__(self, right_object):
         """ Test if this is less than the object on the right. """
-        # Check that the other is a Quantity.
-        if not isinstance(right_object, Quantity):
-            raise Exception("You cannot compare a Quantity to a non-Quantity object. %s < %s is ill-defined." % (self, right_object))
-        # Check that the dimensions are the same.
-        if not self.units.same_dimensions_as(right_object.units):
-            raise Exception("You cannot compare quantities of units %s and %s." % (self.units, right_object.units))
-
-        if self.data < right_object.get_data_in(self.units):
-            return True
-        return False
+        left_data, right_data, units = \
+            self._get_comparison_data(right_object, "<")
+        return left_data < right_data
 
     def __le__(self, right_object):
         """ Test if this is less than or equal to the object on the right. """
-        # Check that the other is a Quantity.
-        if not isinstance(right_object, Quantity):
-            raise Exception("You cannot compare a Quantity to a non-Quantity object. %s <= %s is ill-defined." % (self, right_object))
-        # Check that the dimensions are the same.
-        if not self.units.same_dimensions_as(right_object.units):
-            raise Exception("You cannot compare quantities of units %s and %s." % (self.units, right_object.units))
-
-        if self.data <= right_object.get_data_in(self.units):
-            return True
-        return False
+        left_data, right_data, units = \
+            self._get_comparison_data(right_object, "<=")
+        return left_data <= right_data
 
     def __eq__(self, right_object):
         """ Test if this is equal to the object on the right. """
-        # Check that the other is a Quantity.
-        if not isinstance(right_object, Quantity):
-            raise Exception("You cannot compare a Quantity to a non-Quantity object. %s == %s is ill-defined." % (self, right_object))
-        # Check that the dimensions are the same.
-        if not self.units.same_dimensions_as(right_object.units):
-            raise Exception("You cannot compare quantities of units %s and %s." % (self.units, right_object.units))
-
-        if self.data == right_object.get_data_in(self.units):
-            return True
-        return False
+        left_data, right_data, units = \
+            self._get_comparison_data(right_object, "==")
+        return left_data == right_data
 
     def __ne__(self, right_object):
         """ Test if this is not equal to the object on the right. """
-        # Check that the other is a Quantity.
-        if not isinstance(right_object, Quantity):
-            raise Exception("You cannot compare a Quantity to a non-Quantity object. %s != %s is ill-defined." % (self, right_object))
-        # Check that the dimensions are the same.
-        if not self.units.same_dimensions_as(right_object.units):
-            raise Exception("You cannot compare quantities of units %s and %s." % (self.units, right_object.units))
-
-        if self.data != right_object.get_data_in(self.units):
-            return True
-        return False
+        left_data, right_data, units = \
+            self._get_comparison_data(right_object, "!=")
+        return left_data != right_data
 
     def __ge__(self, right_object):
         """
         Test if this is greater than or equal to the object on the right.
 
         """
-        # Check that the other is a Quantity.
-        if not isinstance(right_object, Quantity):
-            raise Exception("You cannot compare a Quantity to a non-Quantity object. %s >= %s is ill-defined." % (self, right_object))
-        # Check that the dimensions are the same.
-        if not self.units.same_dimensions_as(right_object.units):
-            raise Exception("You cannot compare quantities of units %s and %s." % (self.units, right_object.units))
-
-        if self.data >= right_object.get_data_in(self.units):
-            return True
-        return False
+        left_data, right_data, units = \
+            self._get_comparison_data(right_object, ">=")
+        return left_data >= right_data
 
     def __gt__(self, right_object):
         """ Test if this is greater than the object on the right. """
-        # Check that the other is a Quantity.
-        if not isinstance(right_object, Quantity):
-            raise Exception("You cannot compare a Quantity to a non-Quantity object. %s > %s is ill-defined." % (self, right_object))
-        # Check that the dimensions are the same.
-        if not self.units.same_dimensions_as(right_object.units):
-            raise Exception("You cannot compare quantities of units %s and %s." % (self.units, right_object.units))
-
-        if self.data > right_object.get_data_in(self.units):
-            return True
-        return False
+        left_data, right_data, units = \
+            self._get_comparison_data(right_object, ">")
+        return left_data > right_data
+
+    def isclose(self, other, rtol=1e-05, atol=None, equal_nan=False):
+        """
+        Test element-wise if this is close to `other`, like ``numpy.isclose``
+        but with units. The test is ``abs(self - other) <= atol + rtol *
+        abs(other)``.
+
+        Parameters
+        ----------
+        other : Quantity object
+            The quantity to compare to. May be a pure number if this quantity
+            is dimensionless.
+        rtol : float or dimensionless Quantity object
+            The relative tolerance.
+        atol : Quantity object, optional
+            The absolute tolerance, with the same dimensions as this quantity.
+            Defaults to zero. May be a pure number if this quantity is
+            dimensionless.
+        equal_nan : bool
+            Count NaNs in the same place as equal.
+
+        Returns
+        -------
+        bool, or array of bools for array data.
+
+        """
+        try:
+            from numpy import isclose
+        except ImportError:
+            raise Exception("This method requires the numpy package. Please install it before calling Quantity.isclose()")
+
+        left_data, right_data, units = \
+            self._get_comparison_data(other, "isclose")
+
+        if isinstance(rtol, Quantity):
+            if not rtol.units.is_dimensionless:
+                raise Exception("The relative tolerance must be dimensionless, got %s." % rtol)
+            rtol = rtol.data * rtol.units.cgs_value
+
+        if atol is None:
+            atol = 0.0
+        elif isinstance(atol, Quantity):
+            if units is None:
+                if not atol.units.is_dimensionless:
+                    raise Exception("The absolute tolerance %s does not have the dimensions of %s." % (atol, self))
+                atol = atol.data * atol.units.cgs_value
+            else:
+                atol = atol.get_data_in(units)
+        elif units is not None:
+            if not units.is_dimensionless:
+                raise Exception("The absolute tolerance must be a Quantity with the dimensions of %s, got %s." % (self, atol))
+            atol = atol / units.cgs_value
+
+        return isclose(left_data, right_data, rtol=rtol, atol=atol,
+                       equal_nan=equal_nan)
+
+    def allclose(self, other, rtol=1e-05, atol=None, equal_nan=False):
+        """
+        Test if all of this is close to `other`. Takes the same arguments as
+        `Quantity.isclose`, and returns a single bool.
+
+        """
+        from numpy import all
+
+        return bool(all(self.isclose(other, rtol, atol, equal_nan)))
+
+
+class ScalarQuantity(Quantity):
+    """
+    An immutable Quantity with a single number for data. Operations return new
+    quantities, and methods that would change it in place (like
+    `convert_to`) raise AttributeError, so it is safe to share.
+
+    """
+    __slots__ = ()
+
+    def __init__(self, data, unit_repr):
+        """
+        Create a scalar quantity.
+
+        Parameters
+        ----------
+        data : number
+            The value of this quantity.
+        unit_repr : Unit object or string
+            The units the value is in.
+
+        """
+        if is_ndarray(data) or hasattr(data, "__len__"):
+            raise Exception("ScalarQuantity data must be a single number, got %s." % (data,))
+
+        if not isinstance(unit_repr, Unit):
+            unit_repr = Unit(unit_repr)
+
+        object.__setattr__(self, "data", data)
+        object.__setattr__(self, "units", unit_repr)
+
+    def __setattr__(self, name, value):
+        raise AttributeError("ScalarQuantity objects are immutable.")
@@ -0,0 +1,458 @@
+"""
+
+Define quantities backed by numpy arrays, which numpy functions understand.
+
+Copyright 2012, Casey W. Stark. See LICENSE.txt for more information.
+
+"""
+
+from __future__ import division
+
+try:
+    import numpy as np
+    from numpy.lib.mixins import NDArrayOperatorsMixin
+except ImportError:
+    raise Exception("QuantityArray requires the numpy package (1.13 or newer). Please install it first.")
+
+from dimensionful.quantity import Quantity
+from dimensionful.units import Unit, get_conversion_factor
+
+# Ufuncs whose inputs must all have the same dimensions. The data of the later
+# inputs is converted to the units of the first Quantity input.
+same_units_ufuncs = set([np.add, np.subtract, np.maximum, np.minimum,
+                         np.fmax, np.fmin, np.hypot, np.remainder, np.fmod,
+                         np.copysign, np.nextafter])
+# Like the above, but the result is a plain boolean array.
+comparison_ufuncs = set([np.less, np.less_equal, np.equal, np.not_equal,
+                         np.greater, np.greater_equal])
+# Ufuncs that keep the units of their single input.
+unit_preserving_ufuncs = set([np.negative, np.positive, np.absolute, np.fabs,
+                              np.rint, np.floor, np.ceil, np.trunc,
+                              np.conjugate, np.spacing])
+# Ufuncs that raise the units of their single input to a fixed power.
+power_ufuncs = {np.sqrt: (1, 2), np.cbrt: (1, 3), np.square: (2, 1),
+                np.reciprocal: (-1, 1)}
+# Ufuncs that only make sense for dimensionless input, and return plain
+# arrays.
+dimensionless_ufuncs = set([np.exp, np.exp2, np.expm1, np.log, np.log2,
+                            np.log10, np.log1p, np.sin, np.cos, np.tan,
+                            np.arcsin, np.arccos, np.arctan, np.sinh,
+                            np.cosh, np.tanh, np.arcsinh, np.arccosh,
+                            np.arctanh, np.deg2rad, np.rad2deg])
+# Ufuncs that return plain arrays for any units.
+predicate_ufuncs = set([np.isnan, np.isinf, np.isfinite, np.signbit,
+                        np.sign])
+
+dimensionless_unit = Unit()
+
+
+def split_quantity(value):
+    """
+    Return the (data, units) of a Quantity, or (value, None) for anything else.
+    `None` units mean a pure number.
+
+    """
+    if isinstance(value, Quantity):
+        return value.data, value.units
+    return value, None
+
+
+def get_factor_to(units, target_units):
+    """
+    Factor to convert data in `units` (None for pure numbers) to
+    `target_units`. Raises if the dimensions differ.
+
+    """
+    if units is None:
+        if not target_units.is_dimensionless:
+            raise Exception("You cannot combine a pure number with a quantity in %s." % target_units)
+        units = dimensionless_unit
+    if units is target_units:
+        return 1.0
+    return get_conversion_factor(units, target_units)
+
+
+def scalar_power(power):
+    """
+    Turn a power argument into a Python number for unit algebra, or raise if
+    it is not a single value.
+
+    """
+    data, units = split_quantity(power)
+    if units is not None and not units.is_dimensionless:
+        raise Exception("The power argument must be dimensionless, got %s." % units)
+    if units is not None:
+        data = data * units.cgs_value
+
+    data = np.asarray(data)
+    if data.size != 1 or not np.all(data == data.flat[0]):
+        raise Exception("A quantity can only be raised to a single power.")
+    power = data.flat[0].item()
+    if float(power).is_integer():
+        power = int(power)
+    return power
+
+
+class QuantityArray(NDArrayOperatorsMixin, Quantity):
+    """
+    A physical quantity with a numpy array for data. Numpy ufuncs and many
+    numpy functions work on it directly and keep track of the units. The unit
+    algebra is done once per call, and the numpy kernel runs on the raw data.
+
+    """
+
+    def __init__(self, data, unit_repr, dtype=None, copy=False):
+        """
+        Create a quantity array.
+
+        Parameters
+        ----------
+        data : array_like
+            The data making up this quantity. Not copied unless `copy` is True
+            or `data` has to be converted.
+        unit_repr : Unit object or string
+            The units the data are in.
+        dtype : numpy dtype, optional
+            The dtype to use for the data.
+        copy : bool
+            Copy the data.
+
+        """
+        data = np.array(data, dtype=dtype, copy=True) if copy \
+            else np.asarray(data, dtype=dtype)
+        Quantity.__init__(self, data, unit_repr)
+
+    ### array attributes
+    @property
+    def shape(self):
+        return self.data.shape
+
+    @property
+    def ndim(self):
+        return self.data.ndim
+
+    @property
+    def size(self):
+        return self.data.size
+
+    @property
+    def dtype(self):
+        return self.data.dtype
+
+    def __len__(self):
+        return len(self.data)
+
+    def __iter__(self):
+        for item in self.data:
+            yield QuantityArray(item, self.units)
+
+    def __getitem__(self, key):
+        """ Index the data. Slices are views, like in numpy. """
+        return QuantityArray(self.data[key], self.units)
+
+    def __setitem__(self, key, value):
+        """ Set some of the data, converting `value` to these units. """
+        data, units = split_quantity(value)
+        factor = get_factor_to(units, self.units)
+        self.data[key] = data if factor == 1.0 else np.multiply(data, factor)
+
+    def copy(self):
+        return QuantityArray(self.data, self.units, copy=True)
+
+    # Use the Quantity in-place operators rather than the mixin's ufunc based
+    # ones, so conversions are folded into the update without a temporary.
+    __iadd__ = Quantity.__iadd__
+    __isub__ = Quantity.__isub__
+    __imul__ = Quantity.__imul__
+    __itruediv__ = Quantity.__itruediv__
+    __idiv__ = Quantity.__idiv__
+    __ipow__ = Quantity.__ipow__
+
+    ### numpy protocols
+    def __array_ufunc__(self, ufunc, method, *inputs, **kwargs):
+        """
+        Work out the result units of `ufunc` and run it on the raw data. See
+        the numpy docs on ``__array_ufunc__``.
+
+        """
+        out = kwargs.pop("out", ())
+
+        if method == "__call__":
+            data, units = self._ufunc_call(ufunc, inputs)
+        elif method in ("reduce", "accumulate", "reduceat"):
+            data, units = self._ufunc_reduce(ufunc, inputs)
+        else:
+            return NotImplemented
+
+        # outputs can be quantity arrays, plain arrays, or missing
+        if units is not None:
+            for o in out:
+                if not isinstance(o, Quantity):
+                    raise Exception("Cannot write a result in %s to a plain array." % units)
+                # with `where`, some elements keep their old values, so they
+                # have to be in the result units too
+                if "where" in kwargs and o.units is not units:
+                    if not o.units.same_dimensions_as(units):
+                        raise Exception("Cannot write a result in %s with `where` to an array in %s, since the elements left alone would change meaning." % (units, o.units))
+                    o.convert_to(units)
+        if out:
+            kwargs["out"] = tuple(split_quantity(o)[0] for o in out)
+
+        result = getattr(ufunc, method)(*data, **kwargs)
+
+        if out:
+            if units is not None:
+                for o in out:
+                    o.units = units
+            return out[0] if len(out) == 1 else out
+
+        if units is None:
+            return result
+        return QuantityArray(result, units)
+
+    def _ufunc_call(self, ufunc, inputs):
+        """
+        Return the raw input data and the result units (None for plain
+        results) of calling `ufunc` on `inputs`.
+
+        """
+        data, units = zip(*[split_quantity(i) for i in inputs])
+        data = list(data)
+
+        if ufunc in same_units_ufuncs or ufunc in comparison_ufuncs \
+           or ufunc is np.arctan2:
+            target_units = [u for u in units if u is not None][0]
+            if ufunc in comparison_ufuncs:
+                # compare in the units of the biggest input, so only the
+                # smaller one is converted
+                target_units = units[int(np.size(data[1]) > np.size(data[0]))]
+                if target_units is None:
+                    target_units = dimensionless_unit
+            for i, u in enumerate(units):
+                factor = get_factor_to(u, target_units)
+                if factor != 1.0:
+                    data[i] = np.multiply(data[i], factor)
+            if ufunc in comparison_ufuncs or ufunc is np.arctan2:
+                return data, None
+            return data, target_units
+
+        if ufunc in (np.multiply, np.divide, np.true_divide,
+                     np.floor_divide):
+            left = units[0] if units[0] is not None else dimensionless_unit
+            right = units[1] if units[1] is not None else dimensionless_unit
+            if ufunc is np.multiply:
+                return data, left * right
+            return data, left / right
+
+        if ufunc in (np.power, np.float_power):
+            if units[0] is None or units[0].is_dimensionless:
+                if units[0] is not None:
+                    data[0] = np.multiply(data[0], units[0].cgs_value)
+                if units[1] is not None:
+                    data[1] = np.multiply(data[1], get_factor_to(
+                        units[1], dimensionless_unit))
+                return data, None if units[0] is None else dimensionless_unit
+            power = scalar_power(inputs[1])
+            data[1] = power
+            return data, units[0]**power
+
+        if ufunc in unit_preserving_ufuncs:
+            return data, units[0]
+
+        if ufunc in power_ufuncs:
+            numerator, denominator = power_ufuncs[ufunc]
+            if denominator == 1:
+                return data, units[0]**numerator
+            return data, units[0]**(numerator / denominator)
+
+        if ufunc in dimensionless_ufuncs:
+            data[0] = np.multiply(data[0], get_factor_to(units[0],
+                                                         dimensionless_unit))
+            return data, None
+
+        if ufunc in predicate_ufuncs:
+            return data, None
+
+        raise Exception("The ufunc %s is not supported for quantities." % ufunc.__name__)
+
+    def _ufunc_reduce(self, ufunc, inputs):
+        """ Reductions and accumulations keep units for add and max/min. """
+        data, units = split_quantity(inputs[0])
+        if ufunc in same_units_ufuncs:
+            return (data,) + tuple(inputs[1:]), units
+        if ufunc in comparison_ufuncs or ufunc in (np.logical_and,
+                                                   np.logical_or):
+            return (data,) + tuple(inputs[1:]), None
+        raise Exception("Reducing quantities with %s is not supported." % ufunc.__name__)
+
+    def __array_function__(self, func, types, args, kwargs):
+        """
+        Dispatch numpy functions to the implementations in
+        `array_functions`. See the numpy docs on ``__array_function__``.
+
+        """
+        if func not in array_functions:
+            return NotImplemented
+        if not all(issubclass(t, (QuantityArray, np.ndarray)) for t in types):
+            return NotImplemented
+        return array_functions[func](*args, **kwargs)
+
+    ### reductions as methods, which numpy also falls back to
+    def sum(self, *args, **kwargs):
+        return array_sum(self, *args, **kwargs)
+
+    def mean(self, *args, **kwargs):
+        return array_mean(self, *args, **kwargs)
+
+    def std(self, *args, **kwargs):
+        return array_std(self, *args, **kwargs)
+
+    def var(self, *args, **kwargs):
+        return array_var(self, *args, **kwargs)
+
+    def min(self, *args, **kwargs):
+        return array_min(self, *args, **kwargs)
+
+    def max(self, *args, **kwargs):
+        return array_max(self, *args, **kwargs)
+
+    def cumsum(self, *args, **kwargs):
+        return array_cumsum(self, *args, **kwargs)
+
+    def reshape(self, *shape, **kwargs):
+        return QuantityArray(self.data.reshape(*shape, **kwargs), self.units)
+
+    def ravel(self, *args, **kwargs):
+        return QuantityArray(self.data.ravel(*args, **kwargs), self.units)
+
+    @property
+    def T(self):
+        return QuantityArray(self.data.T, self.units)
+
+
+# Implementations of numpy functions for quantity arrays, keyed on the numpy
+# function.
+array_functions = {}
+
+def implements(numpy_function):
+    """ Register an implementation of `numpy_function` for QuantityArray. """
+    def decorator(function):
+        array_functions[numpy_function] = function
+        return function
+    return decorator
+
+
+def same_units_data(arrays):
+    """
+    Return the data of each of `arrays`, converted to the units of the first,
+    and those units.
+
+    """
+    units = [split_quantity(a)[1] for a in arrays]
+    target_units = [u for u in units if u is not None][0]
+    data = []
+    for array, u in zip(arrays, units):
+        factor = get_factor_to(u, target_units)
+        array_data = split_quantity(array)[0]
+        data.append(array_data if factor == 1.0
+                    else np.multiply(array_data, factor))
+    return data, target_units
+
+
+def wrap_same_units(numpy_function):
+    """
+    Register a numpy function whose result has the units of its first
+    argument.
+
+    """
+    @implements(numpy_function)
+    def function(a, *args, **kwargs):
+        data, units = split_quantity(a)
+        return QuantityArray(numpy_function(data, *args, **kwargs), units)
+    return function
+
+def wrap_plain(numpy_function):
+    """ Register a numpy function whose result has no units, like argmax. """
+    @implements(numpy_function)
+    def function(a, *args, **kwargs):
+        return numpy_function(split_quantity(a)[0], *args, **kwargs)
+    return function
+
+array_sum = wrap_same_units(np.sum)
+array_mean = wrap_same_units(np.mean)
+array_std = wrap_same_units(np.std)
+array_min = wrap_same_units(np.amin)
+array_max = wrap_same_units(np.amax)
+array_cumsum = wrap_same_units(np.cumsum)
+
+for numpy_function in (np.median, np.ptp, np.sort, np.reshape, np.ravel,
+                       np.transpose, np.squeeze, np.copy, np.diff,
+                       np.atleast_1d, np.round, np.around, np.nansum,
+                       np.nanmean, np.nanmin, np.nanmax, np.swapaxes,
+                       np.moveaxis, np.expand_dims, np.broadcast_to,
+                       np.flip, np.roll, np.repeat, np.tile, np.take):
+    wrap_same_units(numpy_function)
+
+for numpy_function in (np.argmax, np.argmin, np.argsort, np.nonzero,
+                       np.shape, np.ndim, np.size, np.count_nonzero,
+                       np.isreal, np.iscomplex):
+    wrap_plain(numpy_function)
+
+array_functions[np.min] = array_min
+array_functions[np.max] = array_max
+
+@implements(np.var)
+def array_var(a, *args, **kwargs):
+    data, units = split_quantity(a)
+    return QuantityArray(np.var(data, *args, **kwargs), units**2)
+
+@implements(np.prod)
+def array_prod(a, axis=None, *args, **kwargs):
+    data, units = split_quantity(a)
+    data = np.asarray(data)
+    count = data.size if axis is None else data.shape[axis]
+    return QuantityArray(np.prod(data, axis, *args, **kwargs), units**count)
+
+@implements(np.concatenate)
+def array_concatenate(arrays, *args, **kwargs):
+    data, units = same_units_data(arrays)
+    return QuantityArray(np.concatenate(data, *args, **kwargs), units)
+
+@implements(np.stack)
+def array_stack(arrays, *args, **kwargs):
+    data, units = same_units_data(arrays)
+    return QuantityArray(np.stack(data, *args, **kwargs), units)
+
+@implements(np.clip)
+def array_clip(a, a_min, a_max, *args, **kwargs):
+    (data, a_min, a_max), units = same_units_data([a, a_min, a_max])
+    return QuantityArray(np.clip(data, a_min, a_max, *args, **kwargs), units)
+
+@implements(np.isclose)
+def array_isclose(a, b, rtol=1e-05, atol=None, equal_nan=False):
+    if not isinstance(a, Quantity):
+        a = QuantityArray(a, dimensionless_unit)
+    return a.isclose(b, rtol, atol, equal_nan)
+
+@implements(np.allclose)
+def array_allclose(a, b, rtol=1e-05, atol=None, equal_nan=False):
+    if not isinstance(a, Quantity):
+        a = QuantityArray(a, dimensionless_unit)
+    return a.allclose(b, rtol, atol, equal_nan)
+
+@implements(np.where)
+def array_where(condition, x, y):
+    (x, y), units = same_units_data([x, y])
+    return QuantityArray(np.where(condition, x, y), units)
+
+@implements(np.dot)
+def array_dot(a, b, *args, **kwargs):
+    a_data, a_units = split_quantity(a)
+    b_data, b_units = split_quantity(b)
+    units = (a_units or dimensionless_unit) * (b_units or dimensionless_unit)
+    return QuantityArray(np.dot(a_data, b_data, *args, **kwargs), units)
+
+@implements(np.linalg.norm)
+def array_norm(x, *args, **kwargs):
+    data, units = split_quantity(x)
+    return QuantityArray(np.linalg.norm(data, *args, **kwargs), units)
@@ -0,0 +1,156 @@
+"""
+
+Save quantities to disk, and load them back without copying.
+
+A saved quantity is one file: a line with the magic string, a line of JSON
+with the units, and then the data in the ``.npy`` format. The units header
+holds the unit string (for people), and the symbol powers, exact cgs value,
+and dimension powers (for loading). Loading builds the Unit straight from those
+parts, so it is the same interned object as a Unit made any other way, and no
+string is parsed. The header is padded so the array data is 64-byte aligned,
+and loading with `mmap_mode` maps the data with ``numpy.memmap``, so a huge
+array opens instantly and only the parts that are used are read.
+
+    >>> q = Quantity(np.random.random(10**6), "Msun / yr")
+    >>> q.save("rates.dfq")
+    >>> QuantityArray.load("rates.dfq", mmap_mode="r")[:10]
+
+Copyright 2012, Casey W. Stark. See LICENSE.txt for more information.
+
+"""
+
+import json
+from fractions import Fraction
+
+from dimensionful.dimensions import Dimensions
+from dimensionful.units import Unit
+
+magic = b"DIMENSIONFUL\n"
+format_version = 1
+# the array data starts at a multiple of this, like in .npy files
+alignment = 64
+
+
+def get_units_header(units):
+    """ Return the JSON-able description of `units` for a file header. """
+    return {
+        "units": str(units),
+        "symbols": dict((symbol, str(power))
+                        for symbol, power in units.symbols),
+        "cgs_value": repr(units.cgs_value),
+        "exact_cgs_value": str(units.exact_cgs_value),
+        "dimensions": [str(power) for power in units.dimensions.powers],
+    }
+
+
+def get_units_from_header(header):
+    """
+    Return the Unit described by a file header. It is looked up with its
+    parts, so it is the interned Unit if one already exists.
+
+    """
+    symbols = dict((str(symbol), Fraction(power))
+                   for symbol, power in header["symbols"].items())
+    dimensions = Dimensions([Fraction(power)
+                             for power in header["dimensions"]])
+    # files from before units had exact values only have the float
+    cgs_value = Fraction(header.get("exact_cgs_value", header["cgs_value"]))
+    return Unit._from_parts(symbols, cgs_value, dimensions)
+
+
+def save(quantity, path):
+    """
+    Write a quantity's data and units to the file at `path`.
+
+    Parameters
+    ----------
+    quantity : Quantity
+        The quantity to save. Its data must be a number, or an array, list,
+        or tuple of numbers.
+    path : string
+        Where to write the file.
+
+    """
+    import numpy as np
+
+    data = quantity.data
+    header = get_units_header(quantity.units)
+    header["version"] = format_version
+    # lists and tuples are saved as arrays, and load as arrays
+    header["scalar"] = not isinstance(data, np.ndarray) and np.ndim(data) == 0
+
+    # pad the header line so the .npy part starts on an aligned offset
+    header_line = json.dumps(header, sort_keys=True).encode("ascii")
+    padding = -(len(magic) + len(header_line) + 1) % alignment
+
+    with open(path, "wb") as f:
+        f.write(magic)
+        f.write(header_line + b" " * padding + b"\n")
+        np.lib.format.write_array(f, np.asanyarray(data), allow_pickle=False)
+
+
+def read_header(f):
+    """ Read the magic string and units header from an open file. """
+    if f.readline() != magic:
+        raise Exception("%s is not a saved quantity file." % f.name)
+    header = json.loads(f.readline().decode("ascii"))
+    if header.get("version") != format_version:
+        raise Exception("%s was saved with format version %s, but only version %d can be read." % (f.name, header.get("version"), format_version))
+    return header
+
+
+def load(path, mmap_mode=None, cls=None):
+    """
+    Read a quantity saved with `save`.
+
+    Parameters
+    ----------
+    path : string
+        The file to read.
+    mmap_mode : None, "r", "r+", or "c", optional
+        If given, map the array data from the file with ``numpy.memmap`` in
+        this mode instead of reading it, like ``numpy.load``. Slicing the
+        result reads only the parts that are used.
+    cls : Quantity subclass, optional
+        The class of the result. Defaults to Quantity.
+
+    Returns
+    -------
+    A quantity with the saved data and units.
+
+    """
+    import numpy as np
+
+    if cls is None:
+        from dimensionful.quantity import Quantity as cls
+
+    with open(path, "rb") as f:
+        header = read_header(f)
+        units = get_units_from_header(header)
+
+        data = None
+        if mmap_mode is not None and not header["scalar"]:
+            array_offset = f.tell()
+            version = np.lib.format.read_magic(f)
+            if version == (1, 0):
+                shape, fortran_order, dtype = \
+                    np.lib.format.read_array_header_1_0(f)
+            else:
+                shape, fortran_order, dtype = \
+                    np.lib.format.read_array_header_2_0(f)
+
+            # numpy can't map an empty array, so read those
+            if np.prod(shape) > 0:
+                data = np.memmap(path, dtype=dtype, mode=mmap_mode,
+                                 shape=shape,
+                                 order="F" if fortran_order else "C",
+                                 offset=f.tell())
+            else:
+                f.seek(array_offset)
+
+        if data is None:
+            data = np.lib.format.read_array(f, allow_pickle=False)
+
+    if header["scalar"]:
+        data = data.item()
+    return cls(data, units)
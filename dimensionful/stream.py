@@ -0,0 +1,166 @@
+"""
+
+Unit conversion for data that doesn't fit in memory.
+
+`convert_to` and `get_in` work on the whole array at once. These functions
+work on a stream of chunks instead, from any iterable of arrays or straight
+from a binary file, so the memory used is bounded by the chunk size. The
+dimensions are checked and the conversion factor found once, before the first
+chunk is read.
+
+    >>> from dimensionful.stream import convert_file
+    >>> with open("masses.f8", "rb") as source, open("grams.f8", "wb") as out:
+    ...     convert_file(source, out, "Msun", "g", dtype="f8")
+
+Copyright 2012, Casey W. Stark. See LICENSE.txt for more information.
+
+"""
+
+try:
+    import numpy as np
+except ImportError:
+    raise Exception("Streaming conversion requires the numpy package. Please install it first.")
+
+from dimensionful.kernels import block_size
+from dimensionful.units import Unit, get_conversion_factor
+
+
+def read_chunks(f, dtype, chunk_size=block_size):
+    """
+    Read a binary file in chunks. Yields arrays of `chunk_size` elements
+    (fewer for the last one), each read into its own buffer, so the chunks
+    can be kept or changed.
+
+    Parameters
+    ----------
+    f : file object
+        An open binary file, socket file, or anything with ``readinto``.
+    dtype : numpy dtype
+        The type of the elements in the file.
+    chunk_size : int
+        The number of elements per chunk.
+
+    """
+    dtype = np.dtype(dtype)
+    chunk_bytes = chunk_size * dtype.itemsize
+
+    while True:
+        buffer = bytearray(chunk_bytes)
+        view = memoryview(buffer)
+        filled = 0
+        # files may return less than asked for, like sockets and pipes
+        while filled < chunk_bytes:
+            count = f.readinto(view[filled:])
+            if not count:
+                break
+            filled += count
+
+        if filled % dtype.itemsize:
+            raise Exception("The stream ended partway through an element. Read %d bytes, but elements are %d bytes." % (filled, dtype.itemsize))
+        if filled:
+            yield np.frombuffer(buffer, dtype, filled // dtype.itemsize)
+        if filled < chunk_bytes:
+            return
+
+
+def convert_chunks(source, units, target_units, dtype=None,
+                   chunk_size=block_size, out_dtype=None):
+    """
+    Convert a stream of data from `units` to `target_units`, one chunk at a
+    time. Yields the converted data of each chunk.
+
+    Parameters
+    ----------
+    source : iterable of arrays, or a file object
+        The data. If `dtype` is given, `source` is a binary file and is read
+        with `read_chunks`.
+    units : Unit object or string
+        The units of the data.
+    target_units : Unit object or string
+        The units to convert to. Must have the same dimensions.
+    dtype : numpy dtype, optional
+        The type of the elements in the file, if `source` is a file.
+    chunk_size : int
+        The number of elements per chunk when reading a file.
+    out_dtype : numpy dtype, optional
+        The type of the converted data. By default it is what numpy gives, so
+        integer data comes out as float64 unless the factor is 1. Give the
+        dtype of the data to keep it; integers are rounded to the nearest.
+
+    """
+    if not isinstance(units, Unit):
+        units = Unit(units)
+    if not isinstance(target_units, Unit):
+        target_units = Unit(target_units)
+
+    # check the dimensions now, not when the first chunk is asked for
+    factor = get_conversion_factor(units, target_units)
+    if out_dtype is not None:
+        out_dtype = np.dtype(out_dtype)
+    return generate_converted(source, factor, dtype, chunk_size, out_dtype)
+
+
+def generate_converted(source, factor, dtype, chunk_size, out_dtype):
+    """ The generator behind `convert_chunks`. """
+    if dtype is not None:
+        chunks = read_chunks(source, dtype, chunk_size)
+        # the chunks are ours, so convert them in place if we can
+        in_place = True
+    else:
+        chunks = source
+        in_place = False
+
+    for chunk in chunks:
+        chunk = np.asanyarray(chunk)
+        if factor == 1.0:
+            converted = chunk
+        elif in_place and chunk.dtype.kind in "fc" and chunk.flags.writeable:
+            converted = np.multiply(chunk, factor, out=chunk)
+        else:
+            converted = np.multiply(chunk, factor)
+
+        if out_dtype is not None and converted.dtype != out_dtype:
+            if out_dtype.kind in "iu" and converted.dtype.kind in "fc":
+                # round, rather than cut toward zero like astype
+                converted = np.rint(converted)
+            converted = converted.astype(out_dtype)
+        yield converted
+
+
+def convert_file(source, output, units, target_units, dtype=None,
+                 chunk_size=block_size, out_dtype=None):
+    """
+    Convert a stream of data from `units` to `target_units` and write the
+    results to a binary file, one chunk at a time.
+
+    Parameters
+    ----------
+    source : iterable of arrays, or a file object
+        The data, like for `convert_chunks`.
+    output : file object or string
+        An open binary file, or the path of a file to write.
+    units, target_units, dtype, chunk_size, out_dtype :
+        Like for `convert_chunks`. Integer data is written as float64 unless
+        `out_dtype` is given.
+
+    Returns
+    -------
+    The number of elements written.
+
+    """
+    chunks = convert_chunks(source, units, target_units, dtype, chunk_size,
+                            out_dtype)
+
+    if not hasattr(output, "write"):
+        with open(output, "wb") as f:
+            return write_chunks(chunks, f)
+    return write_chunks(chunks, output)
+
+
+def write_chunks(chunks, f):
+    """ Write the raw data of each chunk to `f`, and return the count. """
+    count = 0
+    for chunk in chunks:
+        f.write(np.ascontiguousarray(chunk).data)
+        count += chunk.size
+    return count
@@ -0,0 +1,136 @@
+"""
+
+Unit systems, like cgs and SI.
+
+A UnitSystem picks one unit for each base dimension (mass, length, time, and
+temperature). The equivalent of any unit in a system is the product of those
+base units raised to the powers of its dimensions. Each system keeps the cgs
+values of its base units, so the cgs value of the equivalent unit comes
+straight from the dimension powers, and the equivalent Unit is cached for each
+dimension vector. Both are looked up again after a unit is registered, in case
+a base unit changed.
+
+    >>> from dimensionful.systems import get_unit_system
+    >>> get_unit_system("si").get_unit(Unit("erg").dimensions)
+    kg*m**2/s**2
+
+Copyright 2012, Casey W. Stark. See LICENSE.txt for more information.
+
+"""
+
+from dimensionful.cache import LRUCache
+from dimensionful.dimensions import base_dimensions, base_names, exact_value, \
+    exact_value_power
+from dimensionful.units import Unit, default_registry, lookup_unit_symbol
+
+
+class UnitSystem(object):
+    """
+    A choice of one unit for each base dimension.
+
+    """
+
+    def __init__(self, name, base_units, maxsize=256):
+        """
+        Parameters
+        ----------
+        name : string
+            The name of the system, like "cgs".
+        base_units : sequence of strings
+            The unit symbols for mass, length, time, and temperature, in that
+            order. Prefixes are allowed, like "kg".
+        maxsize : int
+            The number of dimension vectors to cache equivalent units for.
+
+        """
+        if len(base_units) != len(base_dimensions):
+            raise Exception("A unit system needs one unit for each of %s." % ", ".join(base_names))
+
+        self.name = name
+        self.base_units = tuple(base_units)
+        self.unit_cache = LRUCache(maxsize)
+        self._look_up_base_units()
+
+    def _look_up_base_units(self):
+        """
+        Look up the cgs values of the base units in the default registry, and
+        drop the units built from the old ones. `version` is the registry
+        version they are from.
+
+        """
+        base_values = []
+        for symbol, dimensions, name in zip(self.base_units, base_dimensions,
+                                            base_names):
+            cgs_value, symbol_dimensions = lookup_unit_symbol(symbol)
+            if symbol_dimensions != dimensions:
+                raise Exception("The %s unit of a system must have dimensions of %s, but %s does not." % (name, name, symbol))
+            base_values.append(cgs_value)
+
+        self.base_values = tuple(base_values)
+        self.version = default_registry.version
+        self.unit_cache.clear()
+
+    def __repr__(self):
+        return "UnitSystem(%r, %r)" % (self.name, self.base_units)
+
+    def get_cgs_value(self, dimensions):
+        """
+        Return the cgs value of the unit in this system with `dimensions`, as
+        a Fraction.
+
+        """
+        if self.version != default_registry.version:
+            self._look_up_base_units()
+        cgs_value = exact_value(1)
+        for value, power in zip(self.base_values, dimensions.powers):
+            # integer powers keep the value exact, like the unit parser
+            cgs_value *= exact_value_power(value, power)
+        return cgs_value
+
+    def get_unit(self, dimensions):
+        """
+        Return the Unit in this system with the given Dimensions, like
+        ``kg * m**2 / s**2`` for energy in SI. Cached for each dimension
+        vector.
+
+        """
+        if self.version != default_registry.version:
+            self._look_up_base_units()
+        unit = self.unit_cache.get(dimensions)
+        if unit is None:
+            unit = self.unit_cache.setdefault(dimensions,
+                                              self._build_unit(dimensions))
+        return unit
+
+    def _build_unit(self, dimensions):
+        """ Build the Unit with `dimensions` from the base units. """
+        symbols = dict((symbol, power) for symbol, power
+                       in zip(self.base_units, dimensions.powers)
+                       if power != 0)
+
+        # the symbols and data are known, so skip parsing
+        return Unit._from_parts(symbols, self.get_cgs_value(dimensions),
+                                dimensions)
+
+
+# The built in systems, keyed on lower case name.
+unit_systems = {
+    "cgs": UnitSystem("cgs", ["g", "cm", "s", "K"]),
+    "si": UnitSystem("si", ["kg", "m", "s", "K"]),
+    "astro": UnitSystem("astro", ["Msun", "pc", "yr", "K"]),
+}
+unit_systems["mks"] = unit_systems["si"]
+
+
+def get_unit_system(system):
+    """
+    Return the UnitSystem for a name (like "cgs", "si", or "astro"), or the
+    system itself if it already is one.
+
+    """
+    if isinstance(system, UnitSystem):
+        return system
+    try:
+        return unit_systems[system.lower()]
+    except (KeyError, AttributeError):
+        raise Exception("Unknown unit system %s. The known systems are %s." % (system, ", ".join(sorted(unit_systems))))
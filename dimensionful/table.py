@@ -0,0 +1,331 @@
+"""
+
+Columnar tables of quantities, like catalogs with a unit for each column.
+
+A QuantityTable keeps one numpy array and one Unit per column, with the same
+number of rows in each. Columns come out as QuantityArray views of the data,
+so getting a column does not copy it. Rows are appended in batches into arrays
+with spare room that grows geometrically, so many appends cost amortized
+linear time and make no Python object per row.
+
+    >>> from dimensionful.table import QuantityTable
+    >>> stars = QuantityTable([("mass", QuantityArray(m, "Msun")),
+    ...                        ("distance", QuantityArray(d, "pc"))])
+    >>> near = stars.select(stars["distance"] < Quantity(10.0, "ly"))
+    >>> near.to_system("cgs")
+
+Copyright 2012, Casey W. Stark. See LICENSE.txt for more information.
+
+"""
+
+from __future__ import division
+
+from numbers import Integral
+
+try:
+    import numpy as np
+except ImportError:
+    raise Exception("QuantityTable requires the numpy package. Please install it first.")
+
+from dimensionful.quantity import Quantity
+from dimensionful.quantity_array import (QuantityArray, get_factor_to,
+                                         split_quantity)
+from dimensionful.systems import get_unit_system
+from dimensionful.units import Unit, get_conversion_factor
+
+dimensionless_unit = Unit()
+
+# The fewest rows to make room for when a table grows.
+min_capacity = 16
+
+
+class QuantityTable(object):
+    """
+    A table of quantity columns, each with its own units and all with the
+    same number of rows.
+
+    Index with a column name to get the column as a QuantityArray view, with a
+    list of names to get a table of those columns (also views), or with a
+    slice, index array, or boolean mask to get a table of those rows (views
+    for slices, copies otherwise, like numpy). Like numpy views, converting a
+    view in place changes the data it came from.
+
+    """
+
+    def __init__(self, columns=(), capacity=None):
+        """
+        Create a table.
+
+        Parameters
+        ----------
+        columns : mapping or sequence of (name, quantity) pairs
+            The columns, in order. Each is a Quantity with array data, or a
+            plain array for a dimensionless column. The data is not copied
+            unless it has to be converted to an array.
+        capacity : int, optional
+            The number of rows to make room for up front, so appends up to
+            that size don't reallocate.
+
+        """
+        self.names = []
+        self.units = {}
+        self._buffers = {}
+        self._length = 0
+
+        if hasattr(columns, "items"):
+            columns = columns.items()
+        for name, column in columns:
+            self[name] = column
+
+        if capacity is not None:
+            self.reserve(capacity)
+
+    ### columns
+    def __len__(self):
+        return self._length
+
+    def __contains__(self, name):
+        return name in self.units
+
+    def __iter__(self):
+        return iter(self.names)
+
+    @property
+    def capacity(self):
+        """ The number of rows the table has room for without reallocating. """
+        if not self.names:
+            return 0
+        return min(len(self._buffers[name]) for name in self.names)
+
+    def items(self):
+        """ Return the (name, column) pairs, with the columns as views. """
+        return [(name, self.get_column(name)) for name in self.names]
+
+    def get_column(self, name):
+        """ Return a column as a QuantityArray view of the table's data. """
+        try:
+            buffer = self._buffers[name]
+        except KeyError:
+            raise Exception("The table has no column %s. The columns are %s." % (name, ", ".join(self.names)))
+        return QuantityArray(buffer[:self._length], self.units[name])
+
+    def __setitem__(self, name, column):
+        """ Add a column, or replace the column with the same name. """
+        data, units = split_quantity(column)
+        data = np.asarray(data)
+        if data.ndim == 0:
+            raise Exception("Table columns must be arrays, got %s for %s." % (column, name))
+        others = [n for n in self.names if n != name]
+        if others and len(data) != self._length:
+            raise Exception("Column %s has %d rows, but the table has %d." % (name, len(data), self._length))
+
+        if name not in self.units:
+            self.names.append(name)
+        self._buffers[name] = data
+        self.units[name] = units if units is not None else dimensionless_unit
+        self._length = len(data)
+
+    def __delitem__(self, name):
+        self.get_column(name)
+        self.names.remove(name)
+        del self._buffers[name]
+        del self.units[name]
+
+    def __getitem__(self, key):
+        if isinstance(key, str):
+            return self.get_column(key)
+        if isinstance(key, list) and key and \
+           all(isinstance(name, str) for name in key):
+            return QuantityTable([(name, self.get_column(name))
+                                  for name in key])
+        if isinstance(key, Integral):
+            # a single row, as a mapping of scalar quantities
+            return dict((name, Quantity(self._buffers[name][:self._length][key],
+                                        self.units[name]))
+                        for name in self.names)
+        if isinstance(key, slice):
+            return QuantityTable([(name, QuantityArray(
+                                      self._buffers[name][:self._length][key],
+                                      self.units[name]))
+                                  for name in self.names])
+
+        # find the rows of a mask once, then take them from every column,
+        # which is much faster than masking each column
+        key = np.asarray(split_quantity(key)[0])
+        if key.dtype == bool:
+            if key.shape != (self._length,):
+                raise Exception("Row masks must be boolean arrays of %d rows, got shape %s." % (self._length, key.shape))
+            key = np.flatnonzero(key)
+        return QuantityTable([(name, QuantityArray(
+                                  self._buffers[name][:self._length].take(
+                                      key, axis=0),
+                                  self.units[name]))
+                              for name in self.names])
+
+    def __repr__(self):
+        columns = ", ".join("%s in %s" % (name, self.units[name])
+                            for name in self.names)
+        return "<QuantityTable of %d rows: %s>" % (self._length, columns)
+
+    def copy(self):
+        """ Return a table with copies of the data. """
+        return QuantityTable([(name, QuantityArray(
+                                  self._buffers[name][:self._length],
+                                  self.units[name], copy=True))
+                              for name in self.names])
+
+    ### rows
+    def select(self, *conditions):
+        """
+        Return a table of the rows where all of `conditions` are true. The
+        conditions are boolean arrays, like comparisons of columns with
+        quantities. Those only convert the smaller side, so
+        ``table["mass"] > Quantity(1.0, "Msun")`` does not convert the column.
+
+        """
+        if not conditions:
+            return self[:]
+        mask = np.asarray(conditions[0], dtype=bool)
+        for condition in conditions[1:]:
+            mask = np.logical_and(mask, condition)
+        return self[mask]
+
+    def reserve(self, capacity):
+        """ Make room for at least `capacity` rows in every column. """
+        for name in self.names:
+            buffer = self._buffers[name]
+            if len(buffer) < capacity:
+                new_buffer = np.empty((capacity,) + buffer.shape[1:],
+                                      dtype=buffer.dtype)
+                new_buffer[:self._length] = buffer[:self._length]
+                self._buffers[name] = new_buffer
+
+    def append(self, rows):
+        """
+        Append a batch of rows.
+
+        Parameters
+        ----------
+        rows : mapping of name to quantity, or a QuantityTable
+            The new data for every column. Each is converted to the units of
+            its column as it is copied in. Plain arrays are allowed for
+            dimensionless columns.
+
+        """
+        if hasattr(rows, "items"):
+            rows = dict(rows.items())
+        if sorted(rows) != sorted(self.names):
+            raise Exception("Appended rows must have the columns %s, got %s." % (", ".join(self.names), ", ".join(sorted(rows))))
+
+        # check everything before writing, so a bad batch changes nothing
+        batch = []
+        count = None
+        for name in self.names:
+            data, units = split_quantity(rows[name])
+            data = np.asarray(data)
+            if count is None:
+                count = len(data)
+            elif len(data) != count:
+                raise Exception("Appended columns must have the same number of rows. %s has %d, expected %d." % (name, len(data), count))
+            factor = get_factor_to(units, self.units[name])
+            batch.append((name, data, factor))
+
+        if not batch or not count:
+            return self
+
+        length = self._length + count
+        if length > self.capacity:
+            self.reserve(max(length, 2 * self.capacity, min_capacity))
+
+        for name, data, factor in batch:
+            buffer = self._buffers[name]
+            dtype = np.result_type(buffer.dtype, data.dtype) if factor == 1.0 \
+                else np.result_type(buffer.dtype, data.dtype, float)
+            if dtype != buffer.dtype:
+                buffer = self._buffers[name] = buffer.astype(dtype)
+
+            if factor == 1.0:
+                buffer[self._length:length] = data
+            else:
+                np.multiply(data, factor, out=buffer[self._length:length])
+
+        self._length = length
+        return self
+
+    ### conversion
+    def get_units_in_system(self, system):
+        """ Return the equivalent units of each column in a unit system. """
+        system = get_unit_system(system)
+        return dict((name, system.get_unit(self.units[name].dimensions))
+                    for name in self.names)
+
+    def convert_to(self, units):
+        """
+        Convert columns to new units, in place. This overwrites the data of
+        the converted columns, making no copies, and returns the table.
+
+        All the names and units are checked before any column is converted,
+        so if one is bad the table is left as it was.
+
+        Parameters
+        ----------
+        units : mapping of name to Unit object or string
+            The units to convert each column to. Columns that are not given
+            are left alone.
+
+        """
+        conversions = []
+        for name, new_units in units.items():
+            if not isinstance(new_units, Unit):
+                new_units = Unit(new_units)
+            self.get_column(name)
+            factor = get_conversion_factor(self.units[name], new_units)
+            conversions.append((name, new_units, factor))
+
+        for name, new_units, factor in conversions:
+            if factor != 1.0:
+                buffer = self._buffers[name]
+                if buffer.dtype.kind not in "fc":
+                    buffer = self._buffers[name] = buffer.astype(float)
+                column = buffer[:self._length]
+                np.multiply(column, factor, out=column)
+            self.units[name] = new_units
+        return self
+
+    def to_system(self, system):
+        """
+        Convert every column to its equivalent units in a unit system, in
+        place. Each unit's equivalent and conversion factor are cached, so
+        this is one multiply per column that needs it.
+
+        Parameters
+        ----------
+        system : UnitSystem object or string
+            The system, or its name, like "cgs", "si", or "astro".
+
+        """
+        return self.convert_to(self.get_units_in_system(system))
+
+    def get_in(self, units):
+        """
+        Return a new table with columns in the given units. Does not modify
+        this table. Columns that are not given are copied as they are.
+
+        """
+        columns = []
+        for name in self.names:
+            column = self.get_column(name)
+            if name in units:
+                column = column.get_in(units[name])
+            else:
+                column = column.copy()
+            columns.append((name, column))
+        return QuantityTable(columns)
+
+    def in_system(self, system):
+        """
+        Return a new table with every column in its equivalent units in a
+        unit system. Does not modify this table.
+
+        """
+        return self.get_in(self.get_units_in_system(system))
@@ -6,14 +6,21 @@ Copyright 2012, Casey W. Stark. See LICENSE.txt for more information.
 
 """
 
-from sympy import Expr, Mul, nsimplify, Number, posify, Pow, Symbol, sympify
-from sympy.parsing.sympy_parser import parse_expr
+import atexit
+from fractions import Fraction
+from string import ascii_letters, digits
+from threading import Lock
+from weakref import WeakValueDictionary
 
+from dimensionful.cache import LRUCache
 from dimensionful.dimensions import *
+from dimensionful.instrument import clock, recorder, timed
+from dimensionful.parser import parse_unit_string, tokenize
 
 # Dictionary holding information of known unit symbols. The key is the symbol,
 # the value is a tuple with the conversion factor to cgs, and the
-# dimensionality.
+# dimensionality. These are the symbols a new UnitRegistry starts with. Use
+# `register_unit` to add more.
 unit_symbols_dict = {
     # base
     "g":  (1, mass),
@@ -81,21 +88,249 @@ unit_prefixes = {
 }
 
 
-class Unit(Expr):
+class UnitRegistry(object):
     """
-    Using sympy to represent units as symbols. We just supply extra methods
-    so sympy understands how units are related.
+    A table of known unit symbols, used to parse unit strings. Each symbol has
+    an exact cgs value and dimensions, and can take the SI prefixes. Every
+    symbol with every prefix is put in one index, built on the first lookup
+    after a change, so looking a symbol up is one dict lookup.
+
+    Units built from strings are interned in the registry's `unit_cache`.
+    Registering a unit bumps `version` and clears the cache, so strings are
+    parsed again with the new symbols. Conversion factors are looked up by
+    Unit object, and each Unit has its own value, so they stay valid.
+
+    The default registry, `default_registry`, has the built in symbols and is
+    used by ``Unit("...")``. Make a separate registry to keep one set of
+    custom units (one per customer, say) away from the others.
+
+        >>> registry = UnitRegistry()
+        >>> registry.register_unit("furlong", 20116.8, length)
+        >>> registry.get_unit("furlong / s")
 
     """
 
-    is_positive = True    # make sqrt(m**2) --> m
-    is_commutative = True
-    is_number = False
+    def __init__(self, symbols=None, prefixes=None, maxsize=1024):
+        """
+        Parameters
+        ----------
+        symbols : dict, optional
+            Maps unit symbols to (cgs value, dimensions) tuples. Defaults to
+            the built in `unit_symbols_dict`.
+        prefixes : dict, optional
+            Maps prefixes to their values. Defaults to `unit_prefixes`.
+        maxsize : int
+            The most unit strings to keep in `unit_cache`.
+
+        """
+        if symbols is None:
+            symbols = unit_symbols_dict
+        if prefixes is None:
+            prefixes = unit_prefixes
+
+        self.prefixes = dict((prefix, exact_value(value))
+                             for prefix, value in prefixes.items())
+        # symbol -> (exact cgs value, dimensions, prefixable)
+        self.symbols = dict(
+            (symbol, (exact_value(value), verify_dimensions(dimensions), True))
+            for symbol, (value, dimensions) in symbols.items())
+        self.unit_cache = LRUCache(maxsize)
+        self.version = 0
+        self._index = None
+        self._lock = Lock()
+
+    def __repr__(self):
+        return "<UnitRegistry with %d symbols>" % len(self.symbols)
+
+    def __contains__(self, symbol):
+        """ Test if `symbol`, maybe with a prefix, is known. """
+        try:
+            self.lookup(symbol)
+        except Exception:
+            return False
+        return True
+
+    def register_unit(self, symbol, cgs_value, dimensions, prefixable=True):
+        """
+        Add a unit symbol, or change an existing one. Unit strings are parsed
+        again after this, so the symbol can be used in them right away.
+
+        Parameters
+        ----------
+        symbol : string
+            The symbol, like "furlong". It must be a name, like a Python
+            identifier.
+        cgs_value : float or Fraction
+            The unit's value in cgs.
+        dimensions : Dimensions
+            The unit's dimensions.
+        prefixable : bool
+            Whether the symbol can take the prefixes, like "kfurlong".
+
+        """
+        tokens = tokenize(symbol)
+        if len(tokens) != 2 or tokens[0][0] != "name":
+            raise Exception("Unit symbols must be names, like 'furlong', got '%s'." % symbol)
+        cgs_value = exact_value(cgs_value)
+        if cgs_value <= 0:
+            raise Exception("The cgs value of a unit must be positive, got %s for '%s'." % (cgs_value, symbol))
+        dimensions = verify_dimensions(dimensions)
+
+        with self._lock:
+            self.symbols[symbol] = (cgs_value, dimensions, prefixable)
+            self._changed()
+
+    def _changed(self):
+        """ Drop everything built from the old symbols. Hold `_lock`. """
+        self.version += 1
+        self._index = None
+        self.unit_cache.clear()
+
+    def _build_index(self):
+        """ Build the table of every symbol, with and without prefixes. """
+        with self._lock:
+            if self._index is not None:
+                return self._index
+
+            index = {}
+            for symbol, (value, dimensions, prefixable) in self.symbols.items():
+                if not prefixable:
+                    continue
+                for prefix, prefix_value in self.prefixes.items():
+                    index[prefix + symbol] = (prefix_value * value, dimensions)
+            # plain symbols win over prefixed ones that spell the same thing
+            for symbol, (value, dimensions, prefixable) in self.symbols.items():
+                index[symbol] = (value, dimensions)
+
+            self._index = index
+            return index
+
+    def lookup(self, symbol):
+        """
+        Find the unit data of a symbol, which may have a prefix, as a
+        (Fraction cgs value, dimensions) tuple. Raise an exception if it is
+        not known.
+
+        """
+        index = self._index
+        if index is None:
+            index = self._build_index()
+        try:
+            return index[symbol]
+        except KeyError:
+            raise Exception("Lookup failed. Unknown unit symbol '%s'. Please supply the dimensions and cgs value when creating this object." % symbol)
+
+    def get_unit(self, unit_string):
+        """
+        Return the Unit for a string of this registry's symbols, interned in
+        `unit_cache`.
+
+        """
+        key = normalize_unit_string(unit_string)
+        unit = self.unit_cache.get(key)
+        if unit is None:
+            unit = self._parse_unit(key, unit_string)
+        return unit
 
-    __slots__ = ["expr", "cgs_value", "dimensions", "is_atomic"]
+    def _parse_unit(self, key, unit_string, cls=None):
+        """
+        Parse a unit string and cache the Unit under `key`. If the registry
+        changed while parsing, the Unit is returned but not cached.
 
-    def __new__(cls, unit_expr=None, cgs_value=None, dimensions=None,
-                **assumptions):
+        """
+        version = self.version
+        cgs_value, dimensions, symbols = parse_unit_string(unit_string,
+                                                           self.lookup)
+        unit = (cls or Unit)._from_parts(symbols, cgs_value, dimensions)
+        with self._lock:
+            if version == self.version:
+                unit = self.unit_cache.setdefault(key, unit)
+        return unit
+
+# Characters that run together into one name or number token.
+word_characters = frozenset(ascii_letters + digits + "_.")
+
+# Results of Unit multiplication, division, and powers, keyed on the operator
+# and the identity of the operands (or the type and value of the power).
+# Entries hold on to their operands, so ids are not reused while they are
+# cached.
+algebra_cache = LRUCache(maxsize=1024)
+
+# The one Unit object for each (class, symbols, cgs_value, dimensions). Units
+# are dropped from here when nothing else uses them.
+unit_instances = WeakValueDictionary()
+unit_instances_lock = Lock()
+# Units still alive at exit can die after the weakref module is torn down,
+# and Python 2 prints an error for each one. Dropping the references first
+# keeps exit quiet.
+atexit.register(unit_instances.clear)
+
+# Units loaded from pickles, keyed on the pickled (string, cgs_value, powers),
+# so loading a unit that was seen before is one lookup.
+pickled_units = WeakValueDictionary()
+
+def memoize_unit_algebra(operator):
+    """
+    Decorator for the Unit operator methods. Looks the result up in
+    `algebra_cache` before doing the unit algebra.
+
+    """
+    def decorator(method):
+        # only the unit algebra itself is recorded, not cache hits
+        method = timed("algebra")(method)
+
+        def wrapper(self, other):
+            is_unit = isinstance(other, Unit)
+            if is_unit:
+                key = (operator, id(self), id(other))
+            else:
+                # equal powers are often different objects, so they are
+                # matched by value, and by type so 2 and 2.0 stay apart
+                key = (operator, id(self), other.__class__, other)
+
+            try:
+                entry = algebra_cache.get(key)
+            except TypeError:  # unhashable power, like an array
+                return method(self, other)
+
+            if entry is not None and entry[0] is self and \
+               (entry[1] is other if is_unit else entry[1] == other):
+                return entry[2]
+
+            result = method(self, other)
+            algebra_cache.setdefault(key, (self, other, result))
+            return result
+
+        wrapper.__name__ = method.__name__
+        wrapper.__doc__ = method.__doc__
+        return wrapper
+    return decorator
+
+
+class Unit(object):
+    """
+    A physical unit, like g or km / s. A unit is a product of unit symbols to
+    rational powers, with its value in cgs and its dimensions.
+
+    Units are flyweights: there is one Unit object for each distinct set of
+    symbols, cgs value, and dimensions, and they can't be changed. The hash is
+    computed once, and comparing a unit to itself is an identity check.
+
+    `exact_cgs_value` is the cgs value as an exact Fraction. Multiplying,
+    dividing, and raising units to integer powers is done on it, so the value
+    of a unit doesn't depend on how it was built, and conversion factors are
+    worked out without rounding. `cgs_value` is the float of it, made once,
+    for the hot paths.
+
+    Units are not sympy objects, but `expr` gives the sympy expression and
+    sympy functions accept Units (through `_sympy_`).
+
+    """
+
+    __slots__ = ["symbols", "cgs_value", "exact_cgs_value", "dimensions",
+                 "is_atomic", "_hash", "_expr", "_reduced", "__weakref__"]
+
+    def __new__(cls, unit_expr=None, cgs_value=None, dimensions=None):
         """
         Build a new unit. May be an atomic unit (like a gram) or a combination
         of other units (like g / cm**3). Either way, you can make the unit
@@ -104,199 +339,461 @@ class Unit(Expr):
         Parameters
         ----------
         unit_expr : string or sympy.core.expr.Expr
-            The symbolic expression. Symbol("g") for gram.
-        cgs_value : float
-            This unit's value in cgs. 1.0 for gram.
-        dimensions : sympy.core.expr.Expr
-            A sympy expression representing the dimensionality of this unit.
-            Should just be a sympy.core.mul.Mul object of mass, length, time,
-            and temperature objects to various powers. mass for gram.
+            The symbolic expression. "g" or Symbol("g") for gram.
+        cgs_value : float or Fraction
+            This unit's value in cgs. 1.0 for gram. Floats are taken at their
+            decimal value, so 1e-3 is exactly 1/1000.
+        dimensions : Dimensions
+            The dimensionality of this unit, as a vector of powers of mass,
+            length, time, and temperature. `mass` for gram. A sympy expression
+            of the base dimension symbols is also accepted.
 
         """
+        # strings of known symbols are interned
+        if (isinstance(unit_expr, str) and cgs_value is None
+            and dimensions is None):
+            key = normalize_unit_string(unit_expr)
+            unit = unit_cache.get(key)
+            if unit is None:
+                unit = default_registry._parse_unit(key, unit_expr, cls)
+            return unit
+
+        return cls._build(unit_expr, cgs_value, dimensions)
+
+    @classmethod
+    def _build(cls, unit_expr, cgs_value, dimensions):
+        """ Construct a Unit object, without looking in `unit_cache`. """
         # Check for no args
         if not unit_expr:
-            unit_expr = sympify(1)
-
-        # if we have a string, parse into an expression
-        if isinstance(unit_expr, str):
-            unit_expr = parse_expr(unit_expr)
-
-        if not isinstance(unit_expr, Expr):
-            raise Exception("Unit representation must be a string or sympy Expr. %s is a %s" % (unit_expr, type(unit_expr)))
-        # done with argument checking...
-
-        # sympify, posify, and nsimplify the expr
-        unit_expr = sympify(unit_expr)
-        p, r = posify(unit_expr)
-        unit_expr = p.subs(r)
-        unit_expr = nsimplify(unit_expr)
-
-        # see if the unit is atomic.
-        is_atomic = False
-        if isinstance(unit_expr, Symbol):
-            is_atomic = True
+            return cls._from_parts({}, 1, dimensionless)
 
         # did they supply cgs_value and dimensions?
         if cgs_value and not dimensions or dimensions and not cgs_value:
             raise Exception("If you provide cgs_vale or dimensions, you must provide both! cgs_value is %s, dimensions is %s." % (cgs_value, dimensions))
 
         if cgs_value and dimensions:
-            # check that cgs_vale is a float or can be converted to one
+            # check that cgs_vale is a number we can make exact
             try:
-                cgs_value = float(cgs_value)
-            except ValueError:
+                cgs_value = exact_value(cgs_value)
+            except (TypeError, ValueError):
                 raise ValueError("Please provide a float for the cgs_value kwarg. I got a '%s'." % cgs_value)
             # check that dimensions is valid
-            dimensions = verify_dimensions(sympify(dimensions))
-            # save the values
-            this_cgs_value, this_dimensions = cgs_value, dimensions
+            dimensions = verify_dimensions(dimensions)
 
-        else:  # lookup the unit symbols
-            this_cgs_value, this_dimensions = \
-                get_unit_data_from_expr(unit_expr)
+        # if we have a string, parse it ourselves. Unless this is a custom
+        # unit, we get the unit data from the parser and default registry.
+        if isinstance(unit_expr, str):
+            if cgs_value:
+                # custom unit, we only need the symbols
+                symbols = parse_unit_string(unit_expr, lookup_any_symbol)[2]
+                return cls._from_parts(symbols, cgs_value, dimensions)
 
-        # cool trick to get dimensions powers as Rationals
-        this_dimensions = nsimplify(this_dimensions)
+            this_cgs_value, this_dimensions, symbols = \
+                parse_unit_string(unit_expr, lookup_unit_symbol)
+            return cls._from_parts(symbols, this_cgs_value, this_dimensions)
 
-        # init obj with superclass construct
-        obj = Expr.__new__(cls, **assumptions)
+        # otherwise, it should be a sympy expression
+        return cls._build_from_expr(unit_expr, cgs_value, dimensions)
 
-        # attach attributes to obj
-        obj.expr = unit_expr
-        obj.is_atomic = is_atomic
-        obj.cgs_value = this_cgs_value
-        obj.dimensions = this_dimensions
+    @classmethod
+    @timed("sympy")
+    def _build_from_expr(cls, unit_expr, cgs_value, dimensions):
+        """ Construct a Unit object from a sympy expression. """
+        from sympy import Expr, nsimplify, posify, sympify
 
-        # return `obj` so __init__ can handle it.
-        return obj
+        if not isinstance(unit_expr, Expr):
+            raise Exception("Unit representation must be a string or sympy Expr. %s is a %s" % (unit_expr, type(unit_expr)))
 
-    ### some sympy conventions I guess
-    def __getnewargs__(self):
-        return (self.expr, self.is_atomic, self.cgs_value, self.dimensions)
+        # sympify, posify, and nsimplify the expr
+        unit_expr = sympify(unit_expr)
+        p, r = posify(unit_expr)
+        unit_expr = nsimplify(p.subs(r))
 
-    def __hash__(self):
-        return super(Unit, self).__hash__()
+        if not cgs_value:
+            # lookup the unit symbols
+            cgs_value, dimensions = get_unit_data_from_expr(unit_expr)
 
-    def _hashable_content(self):
-        return (self.expr, self.is_atomic, self.cgs_value, self.dimensions)
-    ### end sympy conventions
+        return cls._from_parts(get_symbols_from_expr(unit_expr), cgs_value,
+                               dimensions)
 
-    def __repr__(self):
-        if self.expr == 1:
-            return "(dimensionless)"
-        return str(self.expr)
+    @classmethod
+    def _from_parts(cls, symbols, cgs_value, dimensions):
+        """
+        Return the Unit object for already checked parts. `symbols` maps unit
+        symbol strings to Fraction powers, and `cgs_value` is made exact with
+        `exact_value`. If this unit already exists, the existing object is
+        returned.
+
+        """
+        symbols = tuple(sorted((symbol, power) for symbol, power
+                               in symbols.items() if power != 0))
+        exact_cgs_value = exact_value(cgs_value)
+        key = (cls, symbols, exact_cgs_value, dimensions)
+
+        unit = unit_instances.get(key)
+        if unit is not None:
+            return unit
+
+        unit = object.__new__(cls)
+        cgs_value = float(exact_cgs_value)
+        set_attribute = object.__setattr__
+        set_attribute(unit, "symbols", symbols)
+        set_attribute(unit, "cgs_value", cgs_value)
+        set_attribute(unit, "exact_cgs_value", exact_cgs_value)
+        set_attribute(unit, "dimensions", dimensions)
+        set_attribute(unit, "is_atomic",
+                      len(symbols) == 1 and symbols[0][1] == 1)
+        # equal units have the same cgs value and dimensions
+        set_attribute(unit, "_hash", hash((cgs_value, dimensions)))
+        set_attribute(unit, "_expr", None)
+        set_attribute(unit, "_reduced", None)
+
+        with unit_instances_lock:
+            return unit_instances.setdefault(key, unit)
+
+    def __setattr__(self, name, value):
+        raise AttributeError("Unit objects are immutable.")
+
+    ### pickling and copying give back the existing instance
+    def __reduce__(self):
+        # the unit string, cgs value, and dimension powers are enough to find
+        # or rebuild the unit, and pickle much smaller than the symbol dict.
+        # The float is enough when the string gives back this unit, or when it
+        # has the exact value. Otherwise the value goes as a "p/q" string.
+        # The string only uses `*`, `/`, and `**`, not sqrt.
+        if self._reduced is None:
+            string = format_unit_symbols(self.symbols, use_sqrt=False) \
+                if self.symbols else ""
+            cgs_value = self.cgs_value
+            if exact_value(cgs_value) != self.exact_cgs_value and \
+               get_known_unit(string) is not self:
+                cgs_value = str(self.exact_cgs_value)
+            object.__setattr__(self, "_reduced", (unit_from_string, (
+                string, cgs_value, pickle_powers(self.dimensions.powers))))
+        return self._reduced
+
+    def __copy__(self):
+        return self
+
+    def __deepcopy__(self, memo):
+        return self
+
+    ### sympy adapter
+    @property
+    def expr(self):
+        """ The sympy expression of the unit symbols, built on first use. """
+        if self._expr is None:
+            object.__setattr__(self, "_expr",
+                               get_expr_from_symbols(dict(self.symbols)))
+        return self._expr
 
-    def __str__(self):
-        if self.expr == 1:
+    # lets sympify and sympy functions accept Units
+    def _sympy_(self):
+        return self.expr
+
+    def __hash__(self):
+        return self._hash
+
+    def __repr__(self):
+        if not self.symbols:
             return "(dimensionless)"
-        return str(self.expr)
+        return format_unit_symbols(self.symbols)
 
-    # for sympy.printing
-    def _sympystr(self, *args):
-        return str(self.expr)
+    __str__ = __repr__
 
-    ### override sympy operations
+    ### unit algebra
+    @memoize_unit_algebra("*")
     def __mul__(self, right_object):
         """ Multiply Unit with right_object (Unit). """
-        return Unit(self.expr * right_object.expr,
-                    self.cgs_value * right_object.cgs_value,
-                    self.dimensions * right_object.dimensions)
-
+        if not isinstance(right_object, Unit):
+            return NotImplemented
+        return Unit._from_parts(combine_symbols(self.symbols,
+                                                right_object.symbols, 1),
+                                self.exact_cgs_value
+                                * right_object.exact_cgs_value,
+                                self.dimensions * right_object.dimensions)
+
+    @memoize_unit_algebra("/")
     def __div__(self, right_object):
         """ Divide Unit by right_object (Unit). """
-        return Unit(self.expr / right_object.expr,
-                    self.cgs_value / right_object.cgs_value,
-                    self.dimensions / right_object.dimensions)
+        if not isinstance(right_object, Unit):
+            return NotImplemented
+        return Unit._from_parts(combine_symbols(self.symbols,
+                                                right_object.symbols, -1),
+                                self.exact_cgs_value
+                                / right_object.exact_cgs_value,
+                                self.dimensions / right_object.dimensions)
+
+    __truediv__ = __div__
 
+    @memoize_unit_algebra("**")
     def __pow__(self, power):
         """ Take Unit to a power. """
-        return Unit(self.expr**power, self.cgs_value**power,
-                    self.dimensions**power)
+        exact_power = rational_power(power)
+        return Unit._from_parts(dict((symbol, p * exact_power)
+                                     for symbol, p in self.symbols),
+                                exact_value_power(self.exact_cgs_value,
+                                                  exact_power),
+                                self.dimensions**exact_power)
 
     ### Comparison operators
     def same_dimensions_as(self, other_unit):
         """ Test if dimensions are the same. """
-        return (self.dimensions / other_unit.dimensions) == 1
+        if recorder.enabled:
+            start = clock()
+            result = self.dimensions == other_unit.dimensions
+            recorder.add("dimension_check", clock() - start)
+            return result
+        return self.dimensions == other_unit.dimensions
 
     def __eq__(self, right_object):
         """
-        Test equality. If another Unit, check dimensions and cgs_value. If a
-        sympy object, all bets are off.
+        Test equality. Units are equal if they have the same exact cgs value
+        and dimensions, like km * s and ks * m. Anything else is not equal.
 
         """
+        if self is right_object:
+            return True
         if isinstance(right_object, Unit):
-            return ( self.cgs_value == right_object.cgs_value
-                     and self.dimensions == right_object.dimensions )
+            return (self._hash == right_object._hash
+                    and self.exact_cgs_value == right_object.exact_cgs_value
+                    and self.dimensions == right_object.dimensions)
         return False
 
+    def __ne__(self, right_object):
+        return not self == right_object
+
     @property
     def is_dimensionless(self):
-        return self.dimensions == 1
+        return self.dimensions.is_dimensionless
 
     def get_cgs_equivalent(self):
         """ Create and return dimensionally-equivalent cgs units. """
-        cgs_units_string = "g**(%s) * cm**(%s) * s**(%s) * K**(%s)" % \
-            (self.dimensions.as_coeff_exponent(mass)[1],
-             self.dimensions.as_coeff_exponent(length)[1],
-             self.dimensions.as_coeff_exponent(time)[1],
-             self.dimensions.as_coeff_exponent(temperature)[1])
-        return Unit(cgs_units_string, 1, self.dimensions)
-
-# @todo: simpler method that doesn't use recursion would be better...
+        return self.get_system_equivalent("cgs")
+
+    def get_system_equivalent(self, system):
+        """
+        Return the dimensionally-equivalent units in a unit system.
+
+        Parameters
+        ----------
+        system : UnitSystem object or string
+            The system, or its name, like "cgs", "si", or "astro".
+
+        """
+        from dimensionful.systems import get_unit_system
+
+        return get_unit_system(system).get_unit(self.dimensions)
+
 def verify_dimensions(dimensions):
     """
-    Make sure that dimensions is a valid dimension expression. It has to be made
-    of only the base dimension symbols, to powers, multiplied together. If
-    valid, return the simplified expression. If not, raise an Exception.
+    Make sure that dimensions is a valid dimensionality. It has to be a
+    Dimensions object, or a sympy expression made of only the base dimension
+    symbols, to powers, multiplied together. If valid, return the Dimensions
+    object. If not, raise an Exception.
 
     """
-    # in the case of a Number of Symbol, we can just return
-    if isinstance(dimensions, Number):
+    if isinstance(dimensions, Dimensions):
         return dimensions
-    elif isinstance(dimensions, Symbol):
-        if dimensions in base_dimensions:
-            return dimensions
-        else:
-            raise Exception("Dimensions expression contains a non-base dimension symbol '%s'" % str(dimensions))
 
-    # validate args of a Pow or Mul separately
-    elif isinstance(dimensions, Pow):
-        return verify_dimensions(dimensions.args[0])**verify_dimensions(dimensions.args[1])
+    # a plain 1 means dimensionless
+    if dimensions == 1:
+        return dimensionless
+
+    if hasattr(dimensions, "as_powers_dict"):
+        return Dimensions.from_expr(dimensions)
+
+    raise Exception("Bad dimensions expression. Please use a Dimensions object, got a %s." % type(dimensions))
+
+# The cache keys of unit strings seen before, so repeated strings skip
+# normalizing. Cleared when it gets big, since any string can end up here.
+normalized_strings = {}
 
-    elif isinstance(dimensions, Mul):
-        total_mul = 1
-        for arg in dimensions.args:
-            total_mul *= verify_dimensions(arg)
-        return total_mul
+def normalize_unit_string(unit_string):
+    """
+    Strip the whitespace from a unit string that doesn't change how it
+    parses, for use as a cache key. Spaces between names or numbers, like in
+    "m s", are kept as one space, so the key is not the one for "ms".
+
+    """
+    key = normalized_strings.get(unit_string)
+    if key is not None:
+        return key
+
+    parts = unit_string.split()
+    key = parts[:1]
+    for part in parts[1:]:
+        left = key[-1][-1]
+        if left in word_characters:
+            # names and numbers, and exponents like "1e -5"
+            if part[0] in word_characters or part[0] in "+-":
+                key.append(" ")
+        elif left == "*" and part[0] == "*":
+            key.append(" ")
+        key.append(part)
+    key = "".join(key)
+
+    if len(normalized_strings) >= 4096:
+        normalized_strings.clear()
+    normalized_strings[unit_string] = key
+    return key
+
+def unit_from_parts(symbols, cgs_value, dimensions):
+    """ Get the Unit for a symbols dict, cgs value, and dimensions. """
+    return Unit._from_parts(symbols, cgs_value, dimensions)
+
+def pickle_powers(powers):
+    """ Dimension powers as ints, or "p/q" strings for fractions. """
+    return tuple(int(p) if p.denominator == 1 else str(p) for p in powers)
+
+def unit_from_string(unit_string, cgs_value, powers):
+    """
+    Get the Unit for a pickled unit string, cgs value (a float, or a "p/q"
+    string if the float is not exact), and dimension powers.
+    Known units come from the unit string cache. Custom units, and units whose
+    definitions have changed since they were pickled, are rebuilt from the
+    pickled values. Either way, sympy is not used.
 
-    print dimensions
+    """
+    key = (unit_string, cgs_value, powers)
+    unit = pickled_units.get(key)
+    if unit is not None:
+        return unit
+
+    dimensions = Dimensions(powers)
+    exact_cgs_value = exact_value(cgs_value)
+    unit = get_known_unit(unit_string)
+    if isinstance(cgs_value, float):
+        same_value = unit is not None and unit.cgs_value == cgs_value
+    else:
+        same_value = unit is not None and \
+            unit.exact_cgs_value == exact_cgs_value
+    if not same_value or unit.dimensions != dimensions:
+        symbols = parse_unit_string(unit_string, lookup_any_symbol)[2] \
+            if unit_string else {}
+        unit = Unit._from_parts(symbols, exact_cgs_value, dimensions)
+
+    return pickled_units.setdefault(key, unit)
+
+def get_known_unit(unit_string):
+    """ The Unit for a string of known symbols, or None. """
+    try:
+        return Unit(unit_string)
+    except Exception:
+        return None
+
+def combine_symbols(symbols, other_symbols, sign):
+    """
+    Add up the powers of two (symbol, power) sequences, with the powers of
+    the second times `sign`, and return them as a dict.
 
-    # should never get here
-    raise Exception("Bad dimensions expression.")
+    """
+    combined = dict(symbols)
+    for symbol, power in other_symbols:
+        combined[symbol] = combined.get(symbol, 0) + sign * power
+    return combined
+
+def format_power(power):
+    """ Format a Fraction power like sympy prints exponents. """
+    if power.denominator == 1:
+        if power < 0:
+            return "(%d)" % power.numerator
+        return "%d" % power.numerator
+    return "(%d/%d)" % (power.numerator, power.denominator)
+
+def format_factor(symbol, power, use_sqrt=True):
+    """ Format one positive power of a symbol, like sympy does. """
+    if power == 1:
+        return symbol
+    if use_sqrt and power == Fraction(1, 2):
+        return "sqrt(%s)" % symbol
+    return "%s**%s" % (symbol, format_power(power))
+
+def format_unit_symbols(symbols, use_sqrt=True):
+    """
+    Format sorted (symbol, power) pairs the same way sympy prints the unit
+    expression, like "cm**2*g/s**2". Without `use_sqrt`, half powers are
+    written as "cm**(1/2)" instead of "sqrt(cm)".
+
+    """
+    if len(symbols) == 1:
+        symbol, power = symbols[0]
+        if power == -1:
+            return "1/%s" % symbol
+        if use_sqrt and power == Fraction(-1, 2):
+            return "1/sqrt(%s)" % symbol
+        return format_factor(symbol, power, use_sqrt)
+
+    numerator = [format_factor(s, p, use_sqrt) for s, p in symbols if p > 0]
+    denominator = [format_factor(s, -p, use_sqrt)
+                   for s, p in symbols if p < 0]
+
+    numerator_string = "*".join(numerator) or "1"
+    if not denominator:
+        return numerator_string
+    if len(denominator) == 1:
+        return "%s/%s" % (numerator_string, denominator[0])
+    return "%s/(%s)" % (numerator_string, "*".join(denominator))
+
+@timed("sympy")
+def get_expr_from_symbols(symbols):
+    """
+    Build the sympy expression for a dict of unit symbol strings and their
+    powers, like the one `parse_unit_string` returns.
+
+    """
+    from sympy import Rational, Symbol, sympify
+
+    unit_expr = sympify(1)
+    for symbol, power in symbols.items():
+        if power.denominator == 1:
+            unit_expr *= Symbol(symbol)**int(power)
+        else:
+            unit_expr *= Symbol(symbol)**Rational(power.numerator,
+                                                  power.denominator)
+    return unit_expr
+
+def get_symbols_from_expr(unit_expr):
+    """
+    Get the dict of unit symbol strings and Fraction powers in a sympy
+    expression. Numeric factors are dropped.
+
+    """
+    symbols = {}
+    for base, power in unit_expr.as_powers_dict().items():
+        if base.is_number:
+            continue
+        if not base.is_Symbol:
+            raise Exception("Cannot parse for unit data from '%s'. Please supply an expression of only Unit/Symbol, Pow, and Mul." % str(unit_expr))
+        symbols[str(base)] = rational_power(power)
+    return symbols
 
 def get_unit_data_from_expr(unit_expr):
     """
-    Gets total cgs_value and dimensions from a unit expression.
+    Gets total cgs_value (as a Fraction) and dimensions from a unit
+    expression.
 
     """
+    from sympy import Mul, Number, Pow, Symbol
+
     # sometimes a unit object slips in
     if isinstance(unit_expr, Unit):
-        return (unit_expr.cgs_value, unit_expr.dimensions)
+        return (unit_expr.exact_cgs_value, unit_expr.dimensions)
     # now for the sympy possibilities
     elif isinstance(unit_expr, Symbol):
         return lookup_unit_symbol(str(unit_expr))
 
     elif isinstance(unit_expr, Number):
-        return (1, 1)
+        return (exact_value(1), dimensionless)
 
     elif isinstance(unit_expr, Pow):
         unit_data = get_unit_data_from_expr(unit_expr.args[0])
-        power = unit_expr.args[1]
-        return (unit_data[0]**power, unit_data[1]**power)
+        power = rational_power(unit_expr.args[1])
+        return (exact_value_power(unit_data[0], power), unit_data[1]**power)
 
     elif isinstance(unit_expr, Mul):
-        cgs_value = 1
-        dimensions = 1
+        cgs_value = exact_value(1)
+        dimensions = dimensionless
         for i, expr in enumerate(unit_expr.args):
             unit_data = get_unit_data_from_expr(expr)
             cgs_value *= unit_data[0]
@@ -306,39 +803,44 @@ def get_unit_data_from_expr(unit_expr):
 
     raise Exception("Cannot parse for unit data from '%s'. Please supply an expression of only Unit/Symbol, Pow, and Mul." % str(unit_expr))
 
+# The registry used by ``Unit("...")``. Units built from strings of its
+# symbols are interned in `unit_cache`, keyed on the string without the
+# whitespace between tokens, so repeating a string returns the same Unit
+# object. Use `unit_cache.resize`, `unit_cache.info`, and `unit_cache.clear` to
+# manage it.
+default_registry = UnitRegistry(maxsize=1024)
+unit_cache = default_registry.unit_cache
+
 def lookup_unit_symbol(symbol_string):
     """
-    Find the unit data of this symbol. Raise an exception if not found.
+    Find the unit data of this symbol in the default registry, as a
+    (Fraction cgs value, dimensions) tuple. Raise an exception if not found.
 
     """
+    return default_registry.lookup(symbol_string)
 
-    if symbol_string in unit_symbols_dict:
-        # lookup successful, return the tuple directly
-        return unit_symbols_dict[symbol_string]
-
-    # could still be a known symbol with a prefix
-    possible_prefix = symbol_string[0]
-    if possible_prefix in unit_prefixes:
-        # the first character could be a prefix, check the rest of
-        # the symbol
-        symbol_wo_prefix = symbol_string[1:]
+def register_unit(symbol, cgs_value, dimensions, prefixable=True):
+    """
+    Add a unit symbol to the default registry, so ``Unit("...")`` knows it.
+    See `UnitRegistry.register_unit`.
 
-        if symbol_wo_prefix in unit_symbols_dict:
-            # lookup successful, it's a symbol with a prefix
-            unit_data = unit_symbols_dict[symbol_wo_prefix]
-            prefix_value = unit_prefixes[possible_prefix]
+    """
+    default_registry.register_unit(symbol, cgs_value, dimensions, prefixable)
 
-            # don't forget to account for the prefix value!
-            return (unit_data[0] * prefix_value, unit_data[1])
+def lookup_any_symbol(symbol_string):
+    """
+    Stand-in for `lookup_unit_symbol` when parsing custom units, where the
+    symbols do not need to be known.
 
-    # no dice
-    raise Exception("Lookup failed. Unknown unit symbol '%s'. Please supply the dimensions and cgs value when creating this object." % symbol_string)
+    """
+    return (1, dimensionless)
 
 # util function
 def get_conversion_factor(old_units, new_units):
     """
     Use the conversion factors table to figure out the factor between these two
-    units.
+    units. The first time a pair of units is seen, check that the dimensions
+    match and store the factor, so later calls are a single lookup.
 
     Parameters
     ----------
@@ -352,5 +854,46 @@ def get_conversion_factor(old_units, new_units):
     conversion_factor : float
         ``old_units / new_units``
     """
-    # @todo: avoid lossy cast
-    return float(old_units.cgs_value / new_units.cgs_value)
+    return get_conversion_factors(old_units, new_units)[0]
+
+def get_exact_conversion_factor(old_units, new_units):
+    """
+    Like `get_conversion_factor`, but return the exact factor between the two
+    units as a Fraction. The float factor is this one rounded once, so
+    converting from A to B to C uses the same rounded factor as going from A
+    to C whenever the exact factors agree.
+
+    """
+    return get_conversion_factors(old_units, new_units)[1]
+
+# Validated conversion factors between pairs of units, keyed on the
+# (old_units, new_units) tuple. Values are (float, Fraction) tuples. Use
+# `conversion_cache.info` for the size and hit counts.
+conversion_cache = LRUCache(maxsize=4096)
+
+def get_conversion_factors(old_units, new_units):
+    """
+    Get the (float, Fraction) conversion factors from `old_units` to
+    `new_units` out of `conversion_cache`, computing them on a miss. Raise an
+    Exception if the dimensions do not match.
+
+    """
+    key = (old_units, new_units)
+    factors = conversion_cache.get(key)
+    if factors is not None:
+        return factors
+    return conversion_cache.setdefault(key, compute_conversion_factors(
+        old_units, new_units))
+
+@timed("conversion_factor")
+def compute_conversion_factors(old_units, new_units):
+    """
+    Check the dimensions of two units, and return the (float, Fraction)
+    conversion factors between them.
+
+    """
+    if not old_units.same_dimensions_as(new_units):
+        raise Exception("Cannot convert to units with different dimensionality. Current unit is %s, argument is %s" % (old_units, new_units))
+
+    exact_factor = old_units.exact_cgs_value / new_units.exact_cgs_value
+    return (float(exact_factor), exact_factor)
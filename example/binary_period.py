@@ -26,8 +26,8 @@ Mdot = dP * M1 * M2 / (3 * P * dt * (M1 - M2))
 Mdot.convert_to(Msun / yr)
 
 # Report
-print ""
-print "The mass transfer rate is %s." % Mdot
-print ""
+print("")
+print("The mass transfer rate is %s." % Mdot)
+print("")
 
 # prints "The mass transfer rate is 8.38745930223e-07 Msun/yr."
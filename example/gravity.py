@@ -19,8 +19,8 @@ force_gravity = G * mass_earth * mass_sun / distance**2
 force_gravity.convert_to_cgs()
 
 # Report
-print ""
-print "The force of gravity between the Earth and Sun is %s" % force_gravity
-print ""
+print("")
+print("The force of gravity between the Earth and Sun is %s" % force_gravity)
+print("")
 
 # prints "The force of gravity between the Earth and Sun is 3.54296304519e+27 cm*g/s**2"
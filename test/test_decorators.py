@@ -0,0 +1,250 @@
+"""
+
+Test the check_units decorator.
+
+Copyright 2012, Casey W. Stark. See LICENSE.txt for more information.
+
+"""
+
+import numpy as np
+
+from utils import equal_sigfigs
+
+from dimensionful.decorators import check_units
+from dimensionful.quantity import Quantity
+from dimensionful.quantity_array import QuantityArray
+from dimensionful.units import Unit
+
+# @todo: global option?
+required_precision = 4
+
+@check_units("day", "s", "yr", "Msun", "Msun", output="Msun / yr")
+def mass_transfer_rate(P, dP, dt, M1, M2):
+    return dP * M1 * M2 / (3 * P * dt * (M1 - M2))
+
+def test_mass_transfer_rate():
+    """
+    The binary period example, through the decorator.
+
+    """
+    args = (Quantity(2.49, "day"), Quantity(20, "s"), Quantity(100, "yr"),
+            Quantity(2.9, "Msun"), Quantity(1.4, "Msun"))
+    expected = 8.38745930223e-07
+
+    mass_transfer_rate.plans.clear()
+
+    # first call traces the body
+    Mdot = mass_transfer_rate(*args)
+    assert Mdot.units == Unit("Msun / yr")
+    assert equal_sigfigs(Mdot.data, expected, required_precision)
+    assert len(mass_transfer_rate.plans) == 1
+    plan = list(mass_transfer_rate.plans._data.values())[0]
+    assert plan.fast
+
+    # later calls use the plan
+    Mdot = mass_transfer_rate(*args)
+    assert Mdot.units == Unit("Msun / yr")
+    assert equal_sigfigs(Mdot.data, expected, required_precision)
+    assert mass_transfer_rate.plans.hits == 1
+
+    # other compatible units make a new plan, and give the same result
+    Mdot = mass_transfer_rate(Quantity(2.49 * 24, "hr"), *args[1:])
+    assert equal_sigfigs(Mdot.data, expected, required_precision)
+    assert len(mass_transfer_rate.plans) == 2
+
+    # arrays work too
+    M1 = QuantityArray(np.array([2.9, 2.9]), "Msun")
+    Mdot = mass_transfer_rate(args[0], args[1], args[2], M1, args[4])
+    Mdot = mass_transfer_rate(args[0], args[1], args[2], M1, args[4])
+    assert np.allclose(Mdot.data, expected)
+
+def test_check_units_failures():
+    """
+    Arguments and results with the wrong dimensions raise.
+
+    """
+    try:
+        mass_transfer_rate(Quantity(2.49, "cm"), Quantity(20, "s"),
+                           Quantity(100, "yr"), Quantity(2.9, "Msun"),
+                           Quantity(1.4, "Msun"))
+    except Exception:
+        pass
+    else:
+        assert False
+
+    try:
+        mass_transfer_rate(2.49, Quantity(20, "s"), Quantity(100, "yr"),
+                           Quantity(2.9, "Msun"), Quantity(1.4, "Msun"))
+    except Exception:
+        pass
+    else:
+        assert False
+
+    @check_units("cm", output="s")
+    def length(x):
+        return x
+
+    try:
+        length(Quantity(1.0, "m"))
+    except Exception:
+        pass
+    else:
+        assert False
+
+def test_check_units_slow_path():
+    """
+    Bodies that can't run on raw data keep using Quantity operations.
+
+    """
+    G = Quantity(6.67384e-8, "cm**3 * g**-1 * s**-2")
+
+    @check_units("g", "cm", output="cm / s**2")
+    def gravity(M, r):
+        return G * M / r**2
+
+    for i in range(2):
+        a = gravity(Quantity(5.97e27, "g"), Quantity(6.371e8, "cm"))
+        assert a.units == Unit("cm / s**2")
+        assert equal_sigfigs(a.data, 981.6, 3)
+
+    plan = list(gravity.plans._data.values())[0]
+    assert not plan.fast
+
+    # no output units, extra plain arguments
+    @check_units("km", None)
+    def scale(x, factor):
+        return x * factor
+
+    assert scale(Quantity(1.0, "m"), 2.0) == Quantity(2.0, "m")
+    assert scale(Quantity(1.0, "m"), 3.0).units == Unit("km")
+
+def test_check_units_keywords():
+    """
+    Declared arguments can be given by keyword or left to their defaults.
+
+    """
+    @check_units("cm", "s", None)
+    def speed(x, t=Quantity(2.0, "s"), factor=1.0):
+        return factor * x / t
+
+    expected = Quantity(50.0, "cm / s")
+    assert speed(Quantity(1.0, "m")) == expected
+    assert speed(Quantity(1.0, "m"), t=Quantity(2.0, "s")) == expected
+    assert speed(x=Quantity(1.0, "m"), t=Quantity(2.0, "s")) == expected
+    assert speed(Quantity(1.0, "m"), factor=2.0) == 2 * expected
+    assert speed(Quantity(1.0, "m"), Quantity(2.0, "s"), 2.0) == 2 * expected
+
+    try:
+        speed(t=Quantity(2.0, "s"))
+    except Exception:
+        pass
+    else:
+        assert False
+
+def test_check_units_single_run():
+    """
+    Each call runs the body once, the first one included.
+
+    """
+    calls = []
+
+    @check_units("cm", "s")
+    def speed(x, t):
+        calls.append(1)
+        return x / t
+
+    for i in range(3):
+        v = speed(Quantity(1.0, "m"), Quantity(2.0, "s"))
+        assert v == Quantity(50.0, "cm / s")
+        assert len(calls) == i + 1
+    assert list(speed.plans._data.values())[0].fast
+
+def test_check_units_plans():
+    """
+    The fast path is chosen from what the body does with the units, so a
+    conversion inside the body keeps it on the Quantity path.
+
+    """
+    @check_units("m", "cm")
+    def total(x, y):
+        return x + y
+
+    for i in range(2):
+        length = total(Quantity(1.0, "m"), Quantity(50.0, "cm"))
+        assert length.units == Unit("m")
+        assert length.data == 1.5
+    assert not list(total.plans._data.values())[0].fast
+
+    # the units of a power depend on the value of the plain argument
+    @check_units("m", None)
+    def power(x, n):
+        return x**n
+
+    assert power(Quantity(2.0, "m"), 2) == Quantity(4.0, "m**2")
+    assert power(Quantity(2.0, "m"), 3) == Quantity(8.0, "m**3")
+
+    # numpy functions go through the quantities too
+    @check_units("m**2")
+    def side(area):
+        return np.sqrt(area)
+
+    for i in range(2):
+        x = side(QuantityArray(np.array([4.0, 9.0]), "m**2"))
+        assert x.units == Unit("m")
+        assert np.allclose(x.data, [2.0, 3.0])
+
+    # a quantity passed to a plain argument gets no plan
+    @check_units("s", None)
+    def scale(t, factor):
+        return t * factor
+
+    assert scale(Quantity(2.0, "s"), 3.0) == Quantity(6.0, "s")
+    assert scale(Quantity(2.0, "s"), Quantity(3.0, "m")) == \
+        Quantity(6.0, "m * s")
+    assert scale(Quantity(2.0, "s"), 3.0) == Quantity(6.0, "s")
+    assert len(scale.plans) == 1
+
+def test_check_units_plain_values():
+    """
+    Plain arguments can change the result units, so each value gets its own
+    plan.
+
+    """
+    @check_units("cm", "cm")
+    def combine(x, y, square=False):
+        if square:
+            return x * y
+        return x + y
+
+    x = Quantity(2.0, "cm")
+    y = Quantity(3.0, "cm")
+    for i in range(2):
+        assert combine(x, y, square=False) == Quantity(5.0, "cm")
+        assert combine(x, y, square=True) == Quantity(6.0, "cm**2")
+        assert combine(x, y) == Quantity(5.0, "cm")
+    assert len(combine.plans) == 3
+
+    # and the output units are checked for each of them
+    @check_units("cm", "cm", None, output="cm")
+    def length(x, y, square):
+        if square:
+            return x * y
+        return x + y
+
+    assert length(x, y, False) == Quantity(5.0, "cm")
+    assert length(x, y, False) == Quantity(5.0, "cm")
+    try:
+        length(x, y, True)
+    except Exception:
+        pass
+    else:
+        assert False
+
+    # plain arguments that can't be keys always take the Quantity path
+    @check_units("cm", None)
+    def weigh(x, weights):
+        return x * weights.sum()
+
+    for weights in [np.ones(2), np.ones(3)]:
+        assert weigh(x, weights) == Quantity(2.0 * len(weights), "cm")
+    assert len(weigh.plans) == 0
@@ -0,0 +1,86 @@
+"""
+
+Test dimension vectors.
+
+Copyright 2012, Casey W. Stark. See LICENSE.txt for more information.
+
+"""
+
+import nose
+from fractions import Fraction
+
+from dimensionful.dimensions import Dimensions, mass, length, time, \
+    temperature, dimensionless, energy, charge
+
+def test_powers():
+    """
+    Check the stored powers of some named dimensions.
+
+    """
+    assert mass.powers == (1, 0, 0, 0)
+    assert energy.powers == (1, 2, -2, 0)
+    assert charge.powers == (Fraction(1, 2), Fraction(3, 2), -1, 0)
+    assert dimensionless.powers == (0, 0, 0, 0)
+
+def test_equality_and_hash():
+    """
+    Equal dimensions compare and hash the same, however they were built.
+
+    """
+    d1 = mass * length**2 / time**2
+    d2 = Dimensions([1, 2, -2, 0])
+
+    assert d1 == energy
+    assert d2 == energy
+    assert hash(d1) == hash(energy)
+    assert d1 != mass
+    assert len(set([d1, d2, energy])) == 1
+
+    # dimensionless compares equal to 1
+    assert dimensionless == 1
+    assert not mass == 1
+
+def test_float_powers():
+    """
+    Float powers are turned into exact rationals.
+
+    """
+    d1 = (energy * length)**(1.0/2)
+    d2 = temperature**(-1.0/3)
+
+    assert d1 == charge
+    assert d2.powers[3] == Fraction(-1, 3)
+
+def test_sympy_forms():
+    """
+    Convert to and from sympy expressions.
+
+    """
+    from sympy import Symbol, sympify
+
+    l = Symbol("(length)", positive=True)
+    t = Symbol("(time)", positive=True)
+
+    assert (length / time).as_expr() == l / t
+    assert Dimensions.from_expr(l / t) == length / time
+    assert sympify(energy) == energy.as_expr()
+    assert length / time == l / t
+
+    try:
+        Dimensions.from_expr(Symbol("abc"))
+    except Exception:
+        pass
+    else:
+        assert False
+
+def test_immutable():
+    """
+    Dimensions cannot be modified.
+
+    """
+    try:
+        mass.powers = (0, 0, 0, 0)
+    except AttributeError:
+        pass
+    else:
+        assert False
@@ -0,0 +1,109 @@
+"""
+
+Test the opt-in counters and timers.
+
+Copyright 2012, Casey W. Stark. See LICENSE.txt for more information.
+
+"""
+
+import io
+import json
+
+import numpy as np
+
+import dimensionful
+from dimensionful import instrument
+from dimensionful.quantity import Quantity
+from dimensionful.units import Unit, algebra_cache, conversion_cache, \
+    unit_cache
+
+def test_disabled():
+    """
+    Nothing is recorded unless recording is on.
+
+    """
+    instrument.reset()
+    assert not instrument.recorder.enabled
+
+    unit_cache.clear()
+    Quantity(np.ones(10), "km / s").get_in("cm / s")
+
+    for entry in instrument.stats().values():
+        assert entry["count"] == 0
+        assert entry["seconds"] == 0
+
+def test_profile():
+    """
+    A profile block records the work done inside it, and only that.
+
+    """
+    instrument.reset()
+    unit_cache.clear()
+    algebra_cache.clear()
+    conversion_cache.clear()
+
+    with dimensionful.profile() as profile:
+        assert instrument.recorder.enabled
+        q = Quantity(np.ones(1000), "Mpc / Myr")
+        q.get_in("km / s")
+        q.get_in("km / s")
+        q.convert_to("km / s")
+        Unit("Mpc") * Unit("s")
+    assert not instrument.recorder.enabled
+
+    stats = profile.stats
+    assert stats["parse"]["count"] == 4
+    assert stats["algebra"]["count"] == 1
+    assert stats["sympy"]["count"] == 0
+    # worked out once, then cached
+    assert stats["conversion_factor"]["count"] == 1
+    assert stats["dimension_check"]["count"] == 1
+    assert stats["conversion"]["count"] == 3
+    # convert_to works in place
+    assert stats["conversion"]["bytes"] == 2 * 8000
+    assert stats["parse"]["seconds"] > 0
+
+    assert dimensionful.stats() == stats
+
+    # an outer block sees what the inner one saw, and more
+    with instrument.profile() as outer:
+        with instrument.profile() as inner:
+            Quantity(1.0, "pc").get_in("cm")
+        Quantity(1.0, "pc").get_in("m")
+    assert inner.stats["conversion"]["count"] == 1
+    assert outer.stats["conversion"]["count"] == 2
+    assert dimensionful.stats()["conversion"]["count"] == 5
+
+def test_enable():
+    """
+    Recording can be turned on and off for the whole process.
+
+    """
+    instrument.reset()
+    instrument.enable()
+    try:
+        Quantity(1.0, "pc").get_in("cm")
+    finally:
+        instrument.disable()
+    Quantity(1.0, "pc").get_in("cm")
+
+    assert instrument.stats()["conversion"]["count"] == 1
+    instrument.reset()
+    assert instrument.stats()["conversion"]["count"] == 0
+
+def test_dump():
+    """
+    The counters dump as JSON.
+
+    """
+    with instrument.profile() as profile:
+        Quantity(1.0, "pc").get_in("cm")
+
+    text = profile.dump()
+    assert json.loads(text) == profile.stats
+
+    f = io.StringIO() if str is not bytes else io.BytesIO()
+    instrument.dump(f)
+    stats = json.loads(f.getvalue())
+    assert sorted(stats) == sorted(instrument.categories)
+    assert stats["conversion"]["bytes"] >= 0
@@ -0,0 +1,89 @@
+"""
+
+Test lazy Quantity arithmetic.
+
+Copyright 2012, Casey W. Stark. See LICENSE.txt for more information.
+
+"""
+
+import numpy as np
+
+from dimensionful import kernels
+from dimensionful.lazy import LazyQuantity, lazy
+from dimensionful.quantity import Quantity
+from dimensionful.units import Unit
+
+def make_quantities(size):
+    a = Quantity(np.random.random(size) + 1.0, "km")
+    b = Quantity(np.random.random(size) + 1.0, "m")
+    c = Quantity(np.random.random(size) + 1.0, "s")
+    return a, b, c
+
+def formula(a, b, c):
+    return (a * a + 3 * b * b - a * b) / c**2 * 2 - a / c * (b / c)
+
+def test_lazy_matches_eager():
+    """
+    Lazy results match eager results, for small and blocked arrays.
+
+    """
+    for size in (10, kernels.block_size * 2 + 7):
+        a, b, c = make_quantities(size)
+        expected = formula(a, b, c)
+
+        result = formula(*lazy(a, b, c))
+        assert isinstance(result, LazyQuantity)
+        assert result.units == expected.units
+        assert np.allclose(result.data, expected.data)
+        assert np.allclose(result.evaluate().data, expected.data)
+
+def test_lazy_graph():
+    """
+    Units are known up front, and constants fold into one scale.
+
+    """
+    a, b, c = lazy(*make_quantities(4))
+
+    x = a * 2 * b * 3 / a
+    assert x.units == Unit("m")
+    assert x._op == "product"
+    assert x._scale == 6
+    assert len(x._args) == 1
+
+    y = a + b + b
+    assert y.units == Unit("km")
+    assert y._op == "sum"
+    assert len(y._args) == 3
+    assert y._args[1][0] == 1e-3
+
+    # nothing is computed until the data is used
+    assert x._value is None
+    assert np.allclose(x.data, 6 * b.data)
+    assert x._value is not None
+
+def test_lazy_scalars_and_mixing():
+    """
+    Scalars, plain Quantities, and pure numbers mix with lazy quantities.
+
+    """
+    x = lazy(Quantity(2.0, "m"))
+
+    assert (x * 3 + Quantity(1.0, "cm")).data == 6.01
+    assert (-x).data == -2.0
+    assert (x**2).units == Unit("m**2")
+    assert (1 / x).units == Unit("m**-1")
+    assert (x / Quantity(4.0, "m") + 1).data == 1.5
+
+    # fail on different dimensions
+    try:
+        x + Quantity(1.0, "s")
+    except Exception:
+        pass
+    else:
+        assert False
+
+    # comparisons and conversions evaluate
+    assert x * 2 > Quantity(3.0, "m")
+    y = x * 2
+    y.convert_to("cm")
+    assert y.data == 400.0
@@ -0,0 +1,136 @@
+"""
+
+Test the parallel backends.
+
+Copyright 2012, Casey W. Stark. See LICENSE.txt for more information.
+
+"""
+
+import gc
+import operator
+
+import nose
+import numpy as np
+
+from dimensionful.kernels import execution
+from dimensionful.parallel import ProcessBackend, shared_memory, threads
+from dimensionful.quantity import Quantity
+from dimensionful.quantity_array import QuantityArray
+from dimensionful.units import Unit
+
+def test_process_backend():
+    """
+    Convert, combine, and reduce quantities across worker processes.
+
+    """
+    if shared_memory is None:
+        raise nose.SkipTest("multiprocessing.shared_memory is not available")
+
+    data = np.random.random(10**4 + 7) + 1.0
+
+    with ProcessBackend(workers=2, chunk_size=1000) as backend:
+        q1 = Quantity(data.copy(), "Msun")
+
+        q2 = backend.get_in(q1, "g")
+        assert q2.units == Unit("g")
+        assert np.allclose(q2.data, data * 1.98892e33)
+        assert np.all(q1.data == data)
+
+        backend.convert_to(q1, "g")
+        assert q1.units == Unit("g")
+        assert np.allclose(q1.data, data * 1.98892e33)
+        # converting moved the data into shared memory
+        assert backend.find_block(q1.data) is not None
+
+        q3 = backend.subtract(QuantityArray(data, "km"), Quantity(data, "m"))
+        assert isinstance(q3, QuantityArray)
+        assert q3.units == Unit("km")
+        assert np.allclose(q3.data, data * 0.999)
+
+        q4 = backend.divide(backend.multiply(q1, Quantity(data, "cm")),
+                            Quantity(data, "s"))
+        assert q4.units == Unit("g * cm / s")
+        assert np.allclose(q4.data, data * 1.98892e33)
+
+        q5 = backend.power(Quantity(data, "cm"), 2)
+        assert q5.units == Unit("cm**2")
+        assert np.allclose(q5.data, data**2)
+
+        assert backend.sum(Quantity(data, "g")).units == Unit("g")
+        assert np.allclose(backend.sum(Quantity(data, "g")).data, data.sum())
+        assert backend.min(Quantity(data, "g")).data == data.min()
+        assert backend.max(Quantity(data, "g")).data == data.max()
+
+        try:
+            backend.add(q1, Quantity(data, "s"))
+        except Exception:
+            pass
+        else:
+            assert False
+
+        # shared memory is freed with the arrays using it
+        assert backend.blocks
+        del q1, q2, q3, q4, q5
+        gc.collect()
+        assert not backend.blocks
+
+def test_small_arrays():
+    """
+    Arrays of one chunk are computed in this process.
+
+    """
+    if shared_memory is None:
+        raise nose.SkipTest("multiprocessing.shared_memory is not available")
+
+    backend = ProcessBackend(workers=2, chunk_size=1000)
+    q1 = backend.add(Quantity(np.ones(10), "km"), Quantity(np.ones(10), "m"))
+
+    assert np.allclose(q1.data, 1.001)
+    assert backend.pool is None
+    assert not backend.blocks
+
+def test_threads():
+    """
+    Inside `threads`, the Quantity operators split big arrays across threads.
+
+    """
+    data = np.random.random(10**4 + 7) + 1.0
+
+    with threads(3, chunk_size=1000) as backend:
+        assert execution.backend is backend
+
+        q1 = Quantity(data.copy(), "km")
+        array = q1.data
+        q1.convert_to("m")
+        assert q1.data is array
+        assert np.allclose(q1.data, data * 1000.0)
+
+        q2 = q1.get_in("km")
+        assert np.allclose(q2.data, data)
+
+        q3 = q2 + q1
+        assert q3.units == Unit("km")
+        assert np.allclose(q3.data, 2 * data)
+        assert np.allclose((q1 - q2).data, 0.0)
+        assert np.allclose((q2 * q2 / q2).data, data)
+        assert np.allclose((2.0 / q2).data, 2.0 / data)
+
+        # and keep the caller's division for integer data
+        integers = Quantity(np.arange(10**4) * 3, "km")
+        halves = operator.truediv(integers, Quantity(2, "s")).data
+        assert np.all(halves == np.arange(10**4) * 1.5)
+        if hasattr(operator, "div"):  # Python 2
+            floors = operator.div(integers, Quantity(2, "s")).data
+            assert np.all(floors == np.arange(10**4) * 3 // 2)
+
+        q3 += q1
+        assert q3.data is not array
+        assert np.allclose(q3.data, 3 * data)
+
+        # one chunk or less runs directly
+        assert np.all((Quantity(data[:10], "km") * 2.0).data == data[:10] * 2)
+
+        assert backend.pool is not None
+
+    assert execution.backend is None
+    assert backend.pool is None
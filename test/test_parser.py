@@ -0,0 +1,124 @@
+"""
+
+Test the unit string parser.
+
+Copyright 2012, Casey W. Stark. See LICENSE.txt for more information.
+
+"""
+
+import nose
+from fractions import Fraction
+
+from utils import equal_sigfigs
+
+from dimensionful.dimensions import mass, length, time, temperature, \
+    dimensionless, energy, mass_density, rate
+from dimensionful.parser import parse_unit_string, tokenize, UnitParseError
+from dimensionful.units import Unit
+
+# @todo: global option?
+required_precision = 4
+
+def test_tokenize():
+    """
+    Split a string into tokens with positions.
+
+    """
+    tokens = tokenize("Msun * pc**-3")
+
+    assert [t[0] for t in tokens] == ["name", "op", "name", "pow", "op",
+                                      "number", "end"]
+    assert tokens[2] == ("name", "pc", 7)
+    assert tokens[-1] == ("end", "", 13)
+
+def test_simple():
+    """
+    Parse single symbols, with and without prefixes.
+
+    """
+    assert parse_unit_string("g") == (1, mass, {"g": 1})
+    assert parse_unit_string("km") == (1e5, length, {"km": 1})
+    assert parse_unit_string("") == (1, dimensionless, {})
+
+def test_compound():
+    """
+    Parse products, quotients, and powers.
+
+    """
+    Msun_cgs = 1.98892e33
+    Mpc_cgs = 3.08568e24
+
+    cgs_value, dimensions, symbols = parse_unit_string("g * cm**2 * s**-2")
+    assert cgs_value == 1
+    assert dimensions == energy
+    assert symbols == {"g": 1, "cm": 2, "s": -2}
+
+    cgs_value, dimensions, symbols = parse_unit_string("Msun * Mpc**-3")
+    assert equal_sigfigs(cgs_value, Msun_cgs / Mpc_cgs**3, required_precision)
+    assert dimensions == mass_density
+    assert symbols == {"Msun": 1, "Mpc": -3}
+
+    # left to right, like python
+    cgs_value, dimensions, symbols = parse_unit_string("km / s / Mpc")
+    assert dimensions == rate
+    assert symbols == {"km": 1, "s": -1, "Mpc": -1}
+
+    # repeated and cancelling symbols are combined
+    assert parse_unit_string("cm * cm / s * s")[2] == {"cm": 2}
+    assert parse_unit_string("1 / s") == (1, time**-1, {"s": -1})
+
+def test_parentheses_and_rational_powers():
+    """
+    Parse groups and fractional powers.
+
+    """
+    cgs_value, dimensions, symbols = parse_unit_string("erg / (cm**2 * s)")
+    assert dimensions == energy / length**2 / time
+    assert symbols == {"erg": 1, "cm": -2, "s": -1}
+
+    cgs_value, dimensions, symbols = parse_unit_string("(g * cm)**(1/2)")
+    assert dimensions == (mass * length)**Fraction(1, 2)
+    assert symbols == {"g": Fraction(1, 2), "cm": Fraction(1, 2)}
+
+    cgs_value, dimensions, symbols = parse_unit_string("K**(-3) * K**0.5")
+    assert dimensions == temperature**Fraction(-5, 2)
+    assert symbols == {"K": Fraction(-5, 2)}
+
+def test_sqrt():
+    """
+    sqrt(...) is a half power, so the strings units print as parse back.
+
+    """
+    cgs_value, dimensions, symbols = parse_unit_string("1/sqrt(s)")
+    assert symbols == {"s": Fraction(-1, 2)}
+    assert dimensions == time**Fraction(-1, 2)
+
+    cgs_value, dimensions, symbols = parse_unit_string("sqrt(km * g)")
+    assert symbols == {"km": Fraction(1, 2), "g": Fraction(1, 2)}
+    assert cgs_value == Fraction(10**5)**Fraction(1, 2)
+
+    for unit in [Unit("cm**(1/2)"), Unit("s**(-1/2)"), Unit("g**(1/2)*cm"),
+                 Unit("km**(3/2) / s**(1/2)")]:
+        assert Unit(str(unit)) is unit
+
+def test_errors():
+    """
+    Bad strings raise UnitParseError with the position of the problem.
+
+    """
+    cases = [("g * metricfckton", 4),
+             ("g ** cm", 5),
+             ("(g * cm", 7),
+             ("g * cm)", 6),
+             ("g $ cm", 2),
+             ("3 * g", 0),
+             ("g**", 3),
+             ("g**(1/0)", 6)]
+
+    for unit_string, position in cases:
+        try:
+            parse_unit_string(unit_string)
+        except UnitParseError as error:
+            assert error.position == position, (unit_string, error.position)
+        else:
+            assert False, unit_string
@@ -6,6 +6,8 @@ Copyright 2012, Casey W. Stark. See LICENSE.txt for more information.
 
 """
 
+import operator
+
 import nose
 import numpy as np
 
@@ -159,6 +161,73 @@ def test_equality():
     else:
         assert False
 
+def test_comparisons():
+    """
+    Comparisons work element-wise on array data, and dimensionless
+    quantities can be compared to pure numbers.
+
+    """
+    q1 = Quantity(1.0, "km")
+    q2 = Quantity(2000.0, "m")
+
+    assert q1 < q2
+    assert q1 <= q2
+    assert q1 != q2
+    assert q2 >= q1
+    assert q2 > q1
+    assert not q1 == q2
+
+    masses = Quantity(np.array([1e11, 5e11, 2e12, 3e12]), "Msun")
+    threshold = Quantity(1e12 * 1.98892e33, "g")
+    assert np.all((masses > threshold) == [False, False, True, True])
+    assert np.all((threshold < masses) == [False, False, True, True])
+    assert np.all((masses == masses) == [True, True, True, True])
+
+    # dimensionless
+    q3 = Quantity(np.array([50.0, 150.0]), "cm / m")
+    assert np.all((q3 < 1.0) == [True, False])
+    assert Quantity(3.0, "km / m") > 2000
+
+    # fail on dimensional Quantity and pure number
+    try:
+        q1 < 1.0
+    except Exception:
+        pass
+    else:
+        assert False
+
+def test_isclose():
+    """
+    Unit-aware isclose and allclose.
+
+    """
+    q1 = Quantity(np.array([1.0, 2.0, 3.0]), "km")
+    q2 = Quantity(np.array([1000.0, 2000.5, 3010.0]), "m")
+
+    assert np.all(q1.isclose(q2, atol=Quantity(1.0, "m")) == [True, True, False])
+    assert np.all(q1.isclose(q2, rtol=0.0) == [True, False, False])
+    assert q1.allclose(q2, atol=Quantity(0.01, "km"))
+    assert not q1.allclose(q2)
+    assert Quantity(1.0, "m").isclose(Quantity(100.0, "cm"))
+
+    # dimensionless with pure numbers
+    assert Quantity(50.0, "cm / m").isclose(0.5, atol=1e-8)
+
+    # fail on a tolerance with the wrong dimensions
+    try:
+        q1.isclose(q2, atol=Quantity(1.0, "s"))
+    except Exception:
+        pass
+    else:
+        assert False
+
+    try:
+        q1.isclose(q2, atol=1.0)
+    except Exception:
+        pass
+    else:
+        assert False
+
 def test_addition():
     """
     Add two quantities.
@@ -303,3 +372,258 @@ def test_division():
     assert q8.data == 2.0 / 3.0
     assert q7.units == u1**-1
     assert q8.units == u1
+
+    # the data is divided like the caller's `/`: true division with
+    # ``from __future__ import division`` or on Python 3, classic otherwise
+    q9 = Quantity(3, "g")
+    q10 = Quantity(np.array([3, 4]), "g")
+    assert operator.truediv(q9, 2).data == 1.5
+    assert operator.truediv(6, Quantity(4, "s")).data == 1.5
+    assert list(operator.truediv(q10, Quantity(2, "s")).data) == [1.5, 2.0]
+    assert operator.truediv(q9, 2).units == Unit("g")
+    assert operator.truediv(6, Quantity(4, "s")).units == Unit("1 / s")
+    if hasattr(operator, "div"):  # Python 2
+        assert operator.div(q9, 2).data == 1
+        assert operator.div(6, Quantity(4, "s")).data == 1
+        assert list(operator.div(q10, Quantity(2, "s")).data) == [1, 2]
+
+def test_in_place_operations():
+    """
+    In-place operations on array data write into the same buffer.
+
+    """
+    from dimensionful import kernels
+
+    data = np.arange(1.0, 5.0)
+    q1 = Quantity(data, "km")
+
+    q1 += Quantity(np.ones(4) * 500.0, "m")
+    assert q1.data is data
+    assert np.allclose(data, [1.5, 2.5, 3.5, 4.5])
+    assert q1.units == Unit("km")
+
+    q1 -= Quantity(np.ones(4), "km")
+    assert q1.data is data
+    assert np.allclose(data, [0.5, 1.5, 2.5, 3.5])
+
+    q1 *= Quantity(2.0, "s")
+    assert q1.data is data
+    assert q1.units == Unit("km * s")
+    assert np.allclose(data, [1.0, 3.0, 5.0, 7.0])
+
+    q1 /= Quantity(np.ones(4) * 2.0, "s")
+    assert q1.data is data
+    assert q1.units == Unit("km")
+
+    q1 **= 2
+    assert q1.data is data
+    assert q1.units == Unit("km**2")
+
+    # int data can't hold the result, so it is replaced
+    q2 = Quantity(np.arange(4), "cm")
+    q2 *= 1.5
+    assert np.allclose(q2.data, np.arange(4) * 1.5)
+
+    # for += and -= too, with or without a conversion
+    q2 = Quantity(np.arange(4), "m")
+    q2 += Quantity(np.ones(4) * 0.5, "m")
+    assert np.allclose(q2.data, np.arange(4) + 0.5)
+    q2 = Quantity(np.arange(4), "m")
+    q2 -= Quantity(np.ones(4), "cm")
+    assert np.allclose(q2.data, np.arange(4) - 0.01)
+    assert q2.units == Unit("m")
+
+    # blocked path
+    n = kernels.block_size * 2 + 3
+    big = np.ones(n)
+    q3 = Quantity(big, "m")
+    q3 -= Quantity(np.ones(n), "cm")
+    assert q3.data is big
+    assert np.allclose(big, 0.99)
+
+    # fail on different dimensions
+    try:
+        q1 += Quantity(np.ones(4), "g")
+    except Exception:
+        pass
+    else:
+        assert False
+
+    # fail on float + dimensionful Quantity
+    try:
+        q1 += 1.0
+    except Exception:
+        pass
+    else:
+        assert False
+
+def test_in_place_scalars():
+    """
+    In-place operations on scalar data give new quantities.
+
+    """
+    q1 = Quantity(1.0, "km")
+    q2 = q1
+
+    q2 += Quantity(500.0, "m")
+    assert q2 == Quantity(1.5, "km")
+    assert q1.data == 1.0
+
+    q2 *= 2
+    assert q2.data == 3.0
+
+def test_slots():
+    """
+    Quantities have no per-instance __dict__, and still pickle and copy.
+
+    """
+    import copy
+    import pickle
+
+    q1 = Quantity(2.0, "km")
+    assert not hasattr(q1, "__dict__")
+
+    q2 = pickle.loads(pickle.dumps(q1))
+    assert q2 == q1
+    assert q2.units is q1.units
+
+    q3 = copy.copy(q1)
+    assert q3 is not q1
+    assert q3 == q1
+
+def test_scalar_quantity():
+    """
+    Scalar quantities work like quantities, but can't be changed.
+
+    """
+    from dimensionful.quantity import ScalarQuantity
+
+    q1 = ScalarQuantity(2.0, "km")
+    q2 = q1 + Quantity(500.0, "m")
+
+    assert q2 == Quantity(2.5, "km")
+    assert q1.get_in("m").data == 2000.0
+
+    q3 = q1
+    q3 += Quantity(1.0, "km")
+    assert q3.data == 3.0
+    assert q1.data == 2.0
+
+    try:
+        q1.convert_to("m")
+    except AttributeError:
+        pass
+    else:
+        assert False
+
+    try:
+        q1.data = 3.0
+    except AttributeError:
+        pass
+    else:
+        assert False
+
+    try:
+        ScalarQuantity(np.ones(3), "km")
+    except Exception:
+        pass
+    else:
+        assert False
+
+def test_trusted():
+    """
+    Inside a trusted block the operators skip their dimension checks, but a
+    bad pair of units is still caught by the conversion. Debug checking turns
+    the checks back on.
+
+    """
+    from dimensionful import instrument
+    from dimensionful.quantity import Checking, set_debug, trusted
+    from dimensionful.units import conversion_cache
+
+    q1 = Quantity(np.ones(3), "km")
+    q2 = Quantity(2.0, "m")
+    was_debug = Checking.debug
+    set_debug(False)
+
+    try:
+        with instrument.profile() as checked:
+            q1 + q2
+        with instrument.profile() as profile:
+            with trusted():
+                assert Checking.skip
+                q3 = q1 + q2
+                q3 = q3 - q2
+                q3 += q2
+                assert (q3 > q2).all()
+            assert not Checking.skip
+
+        assert checked.stats["dimension_check"]["count"] == 1
+        assert profile.stats["dimension_check"]["count"] == 0
+        assert q3.units is q1.units
+        assert np.allclose(q3.data, 1.002)
+
+        set_debug(True)
+        with instrument.profile() as profile:
+            with trusted():
+                assert not Checking.skip
+                q1 + q2
+        assert profile.stats["dimension_check"]["count"] == 1
+        set_debug(False)
+
+        # a pair of units never seen before is still checked
+        conversion_cache.clear()
+        with trusted():
+            try:
+                q1 + Quantity(1.0, "s")
+            except Exception:
+                pass
+            else:
+                assert False
+    finally:
+        set_debug(was_debug)
+
+def test_trusted_threads():
+    """
+    Trusted blocks in different threads can overlap, and the checks come
+    back when the last one ends.
+
+    """
+    import threading
+
+    from dimensionful.quantity import Checking, set_debug, trusted
+
+    was_debug = Checking.debug
+    set_debug(False)
+    a_entered = threading.Event()
+    b_entered = threading.Event()
+    a_exited = threading.Event()
+    seen = []
+
+    def thread_a():
+        with trusted():
+            a_entered.set()
+            b_entered.wait()
+        a_exited.set()
+
+    def thread_b():
+        a_entered.wait()
+        with trusted():
+            b_entered.set()
+            a_exited.wait()
+            # A's block ended, but this one is still open
+            seen.append(Checking.skip)
+
+    try:
+        threads = [threading.Thread(target=thread_a),
+                   threading.Thread(target=thread_b)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        assert seen == [True]
+        assert Checking.depth == 0
+        assert not Checking.skip
+    finally:
+        set_debug(was_debug)
@@ -0,0 +1,281 @@
+"""
+
+Test numpy-backed quantity arrays.
+
+Copyright 2012, Casey W. Stark. See LICENSE.txt for more information.
+
+"""
+
+import nose
+import numpy as np
+
+from dimensionful.units import Unit
+from dimensionful.quantity import Quantity
+from dimensionful.quantity_array import QuantityArray
+
+# @todo: global option?
+required_precision = 4
+
+def array_function_enabled():
+    """ Check if this numpy dispatches functions with __array_function__. """
+    class Probe(object):
+        def __array_function__(self, func, types, args, kwargs):
+            return True
+    try:
+        return np.sum(Probe()) is True
+    except Exception:
+        return False
+
+def test_creation():
+    """
+    Create a quantity array from a list and from an array.
+
+    """
+    data = np.arange(4.0)
+    q1 = QuantityArray(data, "cm")
+    q2 = QuantityArray([0.0, 1.0, 2.0, 3.0], Unit("cm"))
+
+    assert q1.data is data
+    assert q1.units == Unit("cm")
+    assert q1.shape == (4,)
+    assert np.all(q1.data == q2.data)
+    assert isinstance(q1, Quantity)
+
+def test_add_subtract():
+    """
+    Add and subtract, converting the right side to the left units.
+
+    """
+    q1 = QuantityArray([1.0, 2.0], "km")
+    q2 = QuantityArray([500.0, 1000.0], "m")
+
+    q3 = q1 + q2
+    q4 = np.subtract(q1, q2)
+
+    assert isinstance(q3, QuantityArray)
+    assert q3.units == Unit("km")
+    assert np.allclose(q3.data, [1.5, 3.0])
+    assert np.allclose(q4.data, [0.5, 1.0])
+
+    # wrong dimensions
+    try:
+        q1 + QuantityArray([1.0, 1.0], "s")
+    except Exception:
+        pass
+    else:
+        assert False
+
+    # pure numbers only go with dimensionless quantities
+    try:
+        q1 + 1.0
+    except Exception:
+        pass
+    else:
+        assert False
+    q5 = QuantityArray([1.0, 2.0], Unit()) + 1.0
+    assert np.all(q5.data == [2.0, 3.0])
+
+def test_multiply_divide_power():
+    """
+    Unit algebra for multiplication, division, and powers.
+
+    """
+    q1 = QuantityArray([2.0, 4.0], "cm")
+    q2 = QuantityArray([1.0, 2.0], "s")
+
+    assert (q1 / q2).units == Unit("cm / s")
+    assert (q1 * q2).units == Unit("cm * s")
+    assert (2.0 * q1).units == Unit("cm")
+    assert np.all((q1 / q2).data == [2.0, 2.0])
+    assert (q1**2).units == Unit("cm**2")
+    assert (1.0 / q2).units == Unit("s**-1")
+
+    q3 = np.sqrt(q1**2)
+    assert q3.units == Unit("cm")
+    assert np.allclose(q3.data, q1.data)
+
+    # a quantity with plain Quantity
+    q4 = q1 * Quantity(3.0, "g")
+    assert q4.units == Unit("cm * g")
+    assert np.all(q4.data == [6.0, 12.0])
+
+def test_comparisons():
+    """
+    Comparisons return boolean arrays, after converting units.
+
+    """
+    q1 = QuantityArray([1.0, 2.0, 3.0], "km")
+    q2 = QuantityArray([2000.0, 2000.0, 2000.0], "m")
+
+    assert np.all((q1 < q2) == [True, False, False])
+    assert np.all((q1 == q2) == [False, True, False])
+    assert np.all(np.greater_equal(q1, q2) == [False, True, True])
+
+    # a single threshold
+    assert np.all((q1 > QuantityArray(1500.0, "m")) == [False, True, True])
+
+    # pure numbers and dimensionless arrays
+    q3 = QuantityArray([50.0, 150.0], "cm / m")
+    assert np.all((q3 < 1.0) == [True, False])
+
+def test_dimensionless_functions():
+    """
+    exp and friends need dimensionless input and return plain arrays.
+
+    """
+    q1 = QuantityArray([0.0, 1.0], Unit())
+    q2 = QuantityArray([0.0, 1.0], "cm / m")
+
+    assert np.allclose(np.exp(q1), [1.0, np.e])
+    assert np.allclose(np.exp(q2), [1.0, np.exp(0.01)])
+
+    try:
+        np.exp(QuantityArray([1.0], "cm"))
+    except Exception:
+        pass
+    else:
+        assert False
+
+def test_out_and_where():
+    """
+    Ufuncs write into `out` and respect `where`.
+
+    """
+    q1 = QuantityArray([1.0, 2.0, 3.0], "km")
+    q2 = QuantityArray([1000.0, 1000.0, 1000.0], "m")
+    out = QuantityArray(np.zeros(3), "km")
+    out_data = out.data
+
+    result = np.add(q1, q2, out=out)
+
+    assert result is out
+    assert out.data is out_data
+    assert out.units == Unit("km")
+    assert np.all(out.data == [2.0, 3.0, 4.0])
+
+    # the elements `where` leaves alone are converted to the result units
+    out = QuantityArray([7.0, 10.0, 7.0], "m")
+    out_data = out.data
+    result = np.add(q1, q2, out=out, where=np.array([True, False, True]))
+    assert result is out
+    assert out.data is out_data
+    assert out.units == Unit("km")
+    assert np.allclose(out.data, [2.0, 0.01, 4.0])
+
+    # and can't be kept if their dimensions differ
+    out = QuantityArray(np.zeros(3), "s")
+    try:
+        np.add(q1, q2, out=out, where=np.array([True, False, True]))
+    except Exception:
+        pass
+    else:
+        assert False
+    assert out.units == Unit("s")
+
+    # in-place operator
+    q1 += q2
+    assert q1.units == Unit("km")
+    assert np.all(q1.data == [2.0, 3.0, 4.0])
+
+def test_reductions():
+    """
+    Reductions keep (or combine) the units.
+
+    """
+    q1 = QuantityArray([1.0, 2.0, 3.0, 4.0], "cm")
+
+    assert q1.sum().units == Unit("cm")
+    assert q1.sum().data == 10.0
+    assert q1.max().data == 4.0
+    assert q1.var().units == Unit("cm**2")
+    assert np.add.reduce(q1).data == 10.0
+    assert np.all(np.add.accumulate(q1).data == [1.0, 3.0, 6.0, 10.0])
+
+    # numpy functions go through the methods or __array_function__
+    assert np.sum(q1).units == Unit("cm")
+    assert np.mean(q1).data == 2.5
+
+def test_array_functions():
+    """
+    Numpy functions dispatched with __array_function__.
+
+    """
+    if not array_function_enabled():
+        raise nose.SkipTest("numpy does not use __array_function__")
+
+    q1 = QuantityArray([1.0, 2.0], "km")
+    q2 = QuantityArray([1000.0], "m")
+
+    q3 = np.concatenate([q1, q2])
+    assert q3.units == Unit("km")
+    assert np.all(q3.data == [1.0, 2.0, 1.0])
+
+    assert np.median(q1).units == Unit("km")
+    assert np.argmax(q1) == 1
+    assert np.dot(q1, q1).units == Unit("km**2")
+
+    assert np.all(np.isclose(q1, QuantityArray([1000.0, 2001.0], "m"),
+                             atol=QuantityArray(0.5, "m")) == [True, False])
+    assert np.allclose(q1, QuantityArray([1000.0, 2000.0], "m"))
+
+def test_indexing():
+    """
+    Index, slice, and set items.
+
+    """
+    q1 = QuantityArray([1.0, 2.0, 3.0], "km")
+
+    view = q1[1:]
+    assert view.units == Unit("km")
+    view.data[0] = 5.0
+    assert q1.data[1] == 5.0
+
+    q1[0] = Quantity(500.0, "m")
+    assert q1.data[0] == 0.5
+
+def test_conversion():
+    """
+    The Quantity conversion methods work on arrays.
+
+    """
+    q1 = QuantityArray([1.0, 2.0], "km")
+
+    q2 = q1.get_in("m")
+    assert isinstance(q2, QuantityArray)
+    assert np.all(q2.data == [1000.0, 2000.0])
+
+    q1.convert_to("cm")
+    assert np.all(q1.data == [1e5, 2e5])
+
+def test_pickle():
+    """
+    Pickle quantity arrays, with out-of-band buffers where pickle has them.
+
+    """
+    import pickle
+
+    q1 = QuantityArray(np.arange(1000.0), "Msun / yr")
+
+    q2 = pickle.loads(pickle.dumps(q1, 2))
+    assert isinstance(q2, QuantityArray)
+    assert q2.units is q1.units
+    assert np.all(q2.data == q1.data)
+
+    # the units of a square root have half powers
+    q4 = QuantityArray(np.arange(4.0), "cm / s").sqrt()
+    q5 = pickle.loads(pickle.dumps(q4, 2))
+    assert q5.units is q4.units
+    assert np.all(q5.data == q4.data)
+
+    if pickle.HIGHEST_PROTOCOL < 5:
+        return
+
+    # protocol 5 hands the array data to the caller instead of copying it
+    buffers = []
+    data = pickle.dumps(q1, protocol=5, buffer_callback=buffers.append)
+    assert len(buffers) == 1
+    assert len(data) < 500
+
+    q3 = pickle.loads(data, buffers=buffers)
+    assert q3.units is q1.units
+    assert np.shares_memory(q3.data, q1.data)
@@ -0,0 +1,115 @@
+"""
+
+Test saving and loading quantities.
+
+Copyright 2012, Casey W. Stark. See LICENSE.txt for more information.
+
+"""
+
+import os
+import shutil
+import tempfile
+
+import numpy as np
+
+from dimensionful.dimensions import Dimensions
+from dimensionful.quantity import Quantity
+from dimensionful.quantity_array import QuantityArray
+from dimensionful.storage import alignment
+from dimensionful.units import Unit
+
+def with_temp_dir(test):
+    """ Run `test` with the path of a fresh temporary directory. """
+    def run():
+        path = tempfile.mkdtemp()
+        try:
+            test(path)
+        finally:
+            shutil.rmtree(path)
+    run.__name__ = test.__name__
+    run.__doc__ = test.__doc__
+    return run
+
+@with_temp_dir
+def test_round_trip(path):
+    """
+    Saved quantities load with the same data and the same Unit objects.
+
+    """
+    path = os.path.join(path, "q.dfq")
+
+    q1 = Quantity(np.arange(12.0).reshape(3, 4), "Msun / yr")
+    q1.save(path)
+    q2 = Quantity.load(path)
+
+    assert q2.units is q1.units
+    assert np.all(q2.data == q1.data)
+    assert q2.data.shape == (3, 4)
+
+    q3 = Quantity(2.5, "km**(3/2)")
+    q3.save(path)
+    q4 = Quantity.load(path)
+    assert q4.data == 2.5
+    assert isinstance(q4.data, float)
+    assert q4.units is q3.units
+
+    # lists and tuples load as arrays
+    for data in [[1.0, 2.0, 3.0], (1.0, 2.0, 3.0), [[1, 2], [3, 4]]]:
+        Quantity(data, "km").save(path)
+        q6 = Quantity.load(path)
+        assert isinstance(q6.data, np.ndarray)
+        assert np.all(q6.data == np.array(data))
+
+    # custom units can't be parsed, but are rebuilt from their parts
+    u1 = Unit("furlong", 20116.8, Dimensions([0, 1, 0, 0]))
+    Quantity(np.ones(3), u1 / Unit("s")).save(path)
+    q5 = Quantity.load(path)
+    assert q5.units == u1 / Unit("s")
+    assert q5.units.get_cgs_equivalent() == Unit("cm / s")
+
+@with_temp_dir
+def test_memory_map(path):
+    """
+    Loading with mmap_mode maps the data instead of reading it.
+
+    """
+    path = os.path.join(path, "q.dfq")
+
+    data = np.random.random(1000)
+    QuantityArray(data, "pc").save(path)
+
+    q1 = QuantityArray.load(path, mmap_mode="r")
+    assert isinstance(q1, QuantityArray)
+    assert q1.units == Unit("pc")
+    assert np.all(q1[10:20].data == data[10:20])
+    assert np.all(q1.get_in("cm").data == data * 3.08568e18)
+
+    # the array data is aligned in the file
+    base = q1.data
+    while not isinstance(base, np.memmap):
+        base = base.base
+    assert base.offset % alignment == 0
+
+    q2 = QuantityArray.load(path, mmap_mode="r+")
+    q2.data[0] = -1.0
+    del q1, q2, base
+    assert QuantityArray.load(path).data[0] == -1.0
+
+    QuantityArray(np.array([]), "pc").save(path)
+    assert QuantityArray.load(path, mmap_mode="r").size == 0
+
+@with_temp_dir
+def test_bad_file(path):
+    """
+    Files that are not saved quantities are rejected.
+
+    """
+    path = os.path.join(path, "q.npy")
+    np.save(path, np.ones(3))
+
+    try:
+        Quantity.load(path)
+    except Exception:
+        pass
+    else:
+        assert False
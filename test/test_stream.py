@@ -0,0 +1,106 @@
+"""
+
+Test streaming unit conversion.
+
+Copyright 2012, Casey W. Stark. See LICENSE.txt for more information.
+
+"""
+
+import io
+
+import numpy as np
+
+from dimensionful.stream import convert_chunks, convert_file, read_chunks
+
+class TrickleFile(object):
+    """ A file that returns at most a few bytes per read, like a socket. """
+    def __init__(self, data, most=5):
+        self.file = io.BytesIO(data)
+        self.most = most
+
+    def readinto(self, buffer):
+        data = self.file.read(min(len(buffer), self.most))
+        buffer[:len(data)] = data
+        return len(data)
+
+def test_read_chunks():
+    """
+    Read a file in whole elements, even when reads come back short.
+
+    """
+    data = np.arange(10, dtype="f4")
+
+    chunks = list(read_chunks(TrickleFile(data.tobytes()), "f4", 4))
+    assert [len(c) for c in chunks] == [4, 4, 2]
+    assert np.all(np.concatenate(chunks) == data)
+
+    assert list(read_chunks(io.BytesIO(b""), "f8")) == []
+
+    try:
+        list(read_chunks(io.BytesIO(data.tobytes()[:-1]), "f4", 4))
+    except Exception:
+        pass
+    else:
+        assert False
+
+def test_convert_chunks():
+    """
+    Convert chunks from iterables and files.
+
+    """
+    data = np.arange(100.0)
+    chunks = [data[:30], data[30:]]
+
+    converted = list(convert_chunks(chunks, "km", "m"))
+    assert np.all(np.concatenate(converted) == data * 1000.0)
+    # chunks from iterables are not changed
+    assert chunks[0][1] == 1.0
+
+    same = list(convert_chunks(chunks, "km", "km"))
+    assert same[0] is chunks[0]
+
+    converted = list(convert_chunks(io.BytesIO(data.tobytes()), "km", "cm",
+                                    dtype="f8", chunk_size=64))
+    assert [len(c) for c in converted] == [64, 36]
+    assert np.all(np.concatenate(converted) == data * 1e5)
+
+    # integers come out as float64, unless asked to keep their dtype
+    integers = list(convert_chunks([np.arange(3)], "km", "m"))
+    assert integers[0].dtype == np.float64
+    integers = list(convert_chunks([np.array([149, 151, -251])], "cm", "m",
+                                   out_dtype=np.int64))
+    assert integers[0].dtype == np.int64
+    assert list(integers[0]) == [1, 2, -3]
+
+    # the dimensions are checked before anything is read
+    try:
+        convert_chunks(None, "km", "s")
+    except Exception:
+        pass
+    else:
+        assert False
+
+def test_convert_file():
+    """
+    Write converted chunks to a file.
+
+    """
+    data = np.arange(1000.0)
+    output = io.BytesIO()
+
+    count = convert_file(io.BytesIO(data.tobytes()), output, "g", "kg",
+                         dtype="f8", chunk_size=100)
+
+    assert count == 1000
+    assert np.allclose(np.frombuffer(output.getvalue()), data / 1000.0)
+
+    # integer files are written as float64, unless asked to keep their dtype
+    data = np.arange(10, dtype="i4")
+    output = io.BytesIO()
+    convert_file(io.BytesIO(data.tobytes()), output, "m", "cm", dtype="i4")
+    assert np.all(np.frombuffer(output.getvalue()) == data * 100.0)
+
+    output = io.BytesIO()
+    convert_file(io.BytesIO(data.tobytes()), output, "m", "cm", dtype="i4",
+                 out_dtype="i4")
+    assert np.all(np.frombuffer(output.getvalue(), "i4") == data * 100)
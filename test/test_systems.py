@@ -0,0 +1,101 @@
+"""
+
+Test unit systems.
+
+Copyright 2012, Casey W. Stark. See LICENSE.txt for more information.
+
+"""
+
+from utils import equal_sigfigs
+
+from dimensionful.dimensions import energy, length, mass_density
+from dimensionful.quantity import Quantity
+from dimensionful.systems import UnitSystem, get_unit_system, unit_systems
+from dimensionful.units import Unit, register_unit
+
+# @todo: global option?
+required_precision = 4
+
+def test_system_units():
+    """
+    Equivalent units in the built in systems.
+
+    """
+    si = get_unit_system("SI")
+    assert si is unit_systems["si"]
+    assert get_unit_system(si) is si
+
+    u1 = si.get_unit(energy)
+    assert u1 == Unit("kg * m**2 / s**2")
+    assert u1.cgs_value == 1e7
+    assert u1.dimensions == energy
+
+    # cached for each dimension vector
+    assert si.get_unit(energy) is u1
+    assert Unit("erg").get_system_equivalent("si") is u1
+
+    u2 = Unit("g * cm**-3").get_system_equivalent("astro")
+    assert u2 == Unit("Msun * pc**-3")
+    assert equal_sigfigs(u2.cgs_value, Unit("Msun * pc**-3").cgs_value, 12)
+    assert u2.dimensions == mass_density
+
+    # dimensionless
+    assert unit_systems["cgs"].get_unit(Unit("cm / m").dimensions).is_dimensionless
+
+def test_custom_system():
+    """
+    Make a system of our own, and check bad ones fail.
+
+    """
+    system = UnitSystem("mine", ["Msun", "km", "s", "K"])
+    assert Unit("erg").get_system_equivalent(system) == Unit("Msun * km**2 * s**-2")
+
+    try:
+        UnitSystem("bad", ["cm", "km", "s", "K"])
+    except Exception:
+        pass
+    else:
+        assert False
+
+    try:
+        get_unit_system("imperial")
+    except Exception:
+        pass
+    else:
+        assert False
+
+def test_quantity_systems():
+    """
+    Convert quantities to systems.
+
+    """
+    q1 = Quantity(1.0, "erg")
+    q2 = q1.in_system("si")
+
+    assert q2.units == Unit("kg * m**2 / s**2")
+    assert equal_sigfigs(q2.data, 1e-7, required_precision)
+    assert q1.data == 1.0
+
+    q3 = Quantity(1.0, "Msun / yr")
+    q3.to_system("astro")
+    assert q3.units == Unit("Msun / yr")
+    assert equal_sigfigs(q3.data, 1.0, required_precision)
+
+    q3.to_system("cgs")
+    assert q3.units == Unit("g / s")
+    assert equal_sigfigs(q3.data, 1.98892e33 / 31536000, required_precision)
+
+def test_registered_base_units():
+    """
+    A system picks up a base unit registered again with a new value.
+
+    """
+    register_unit("syslen", 10.0, length)
+    system = UnitSystem("registered", ["g", "syslen", "s", "K"])
+    assert system.get_unit(length).cgs_value == 10.0
+    assert system.get_cgs_value(energy) == 100
+
+    register_unit("syslen", 20.0, length)
+    assert system.get_unit(length).cgs_value == 20.0
+    assert system.get_cgs_value(energy) == 400
+    assert Quantity(1.0, "cm").in_system(system).data == 0.05
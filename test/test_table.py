@@ -0,0 +1,168 @@
+"""
+
+Test quantity tables.
+
+Copyright 2012, Casey W. Stark. See LICENSE.txt for more information.
+
+"""
+
+from collections import OrderedDict
+
+import numpy as np
+
+from dimensionful.quantity import Quantity
+from dimensionful.quantity_array import QuantityArray
+from dimensionful.table import QuantityTable
+from dimensionful.units import Unit
+
+def make_table():
+    return QuantityTable([
+        ("mass", QuantityArray([1.0, 2.0, 3.0], "Msun")),
+        ("distance", QuantityArray([1.0, 10.0, 100.0], "pc")),
+        ("count", np.array([1, 2, 3])),
+    ])
+
+def test_columns():
+    """
+    Columns are views of the table data, with their own units.
+
+    """
+    table = make_table()
+
+    assert len(table) == 3
+    assert table.names == ["mass", "distance", "count"]
+    assert "mass" in table
+    assert table.units["distance"] == Unit("pc")
+    assert table.units["count"].is_dimensionless
+
+    mass = table["mass"]
+    assert isinstance(mass, QuantityArray)
+    assert mass.units == Unit("Msun")
+    mass.data[0] = 5.0
+    assert table["mass"].data[0] == 5.0
+
+    sub = table[["distance", "mass"]]
+    assert sub.names == ["distance", "mass"]
+    assert np.shares_memory(sub["mass"].data, mass.data)
+
+    row = table[1]
+    assert row["distance"] == Quantity(10.0, "pc")
+
+    table["velocity"] = QuantityArray([1.0, 2.0, 3.0], "km / s")
+    del table["count"]
+    assert table.names == ["mass", "distance", "velocity"]
+
+    try:
+        table["bad"] = QuantityArray([1.0, 2.0], "km")
+    except Exception:
+        pass
+    else:
+        assert False
+
+def test_select():
+    """
+    Select rows with unit-aware conditions, masks, and slices.
+
+    """
+    table = make_table()
+
+    near = table.select(table["distance"] < Quantity(1e19, "cm"))
+    assert len(near) == 1
+    assert near["mass"].data[0] == 1.0
+    assert near.units["mass"] == Unit("Msun")
+
+    both = table.select(table["distance"] > Quantity(2.0, "pc"),
+                        table["mass"] < Quantity(2.5, "Msun"))
+    assert list(both["count"].data) == [2]
+
+    assert list(table[np.array([2, 0])]["count"].data) == [3, 1]
+
+    first = table[:2]
+    assert len(first) == 2
+    assert np.shares_memory(first["mass"].data, table["mass"].data)
+
+    try:
+        table[np.array([True, False])]
+    except Exception:
+        pass
+    else:
+        assert False
+
+def test_append():
+    """
+    Append batches of rows, converting them to the column units.
+
+    """
+    table = make_table()
+    buffer = table["mass"].data
+
+    table.append({"mass": QuantityArray([1.98892e33], "g"),
+                  "distance": QuantityArray([1.0], "kpc"),
+                  "count": np.array([4])})
+
+    assert len(table) == 4
+    assert table.capacity >= 16
+    assert abs(table["mass"].data[3] - 1.0) < 1e-12
+    assert abs(table["distance"].data[3] - 1000.0) < 1e-9
+    assert list(table["count"].data) == [1, 2, 3, 4]
+    # the original array is not written to
+    assert len(buffer) == 3
+
+    capacity = table.capacity
+    for i in range(capacity - len(table)):
+        table.append(table[:1])
+    assert table.capacity == capacity
+
+    table.append(table)
+    assert len(table) == 2 * capacity
+    assert table.capacity >= 2 * capacity
+
+    # a bad batch changes nothing
+    length = len(table)
+    for rows in [{"mass": QuantityArray([1.0], "Msun")},
+                 {"mass": QuantityArray([1.0], "Msun"),
+                  "distance": QuantityArray([1.0], "s"),
+                  "count": np.array([1])}]:
+        try:
+            table.append(rows)
+        except Exception:
+            pass
+        else:
+            assert False
+    assert len(table) == length
+
+def test_conversion():
+    """
+    Convert every column to a unit system at once.
+
+    """
+    table = make_table()
+    mass = table["mass"].data
+
+    cgs = table.in_system("cgs")
+    assert table.units["mass"] == Unit("Msun")
+    assert cgs.units["mass"] == Unit("g")
+    assert cgs.units["distance"] == Unit("cm")
+    assert np.allclose(cgs["mass"].data, [1.98892e33, 3.97784e33, 5.96676e33])
+
+    table.to_system("cgs")
+    assert table.units["mass"] == Unit("g")
+    assert np.shares_memory(table["mass"].data, mass)
+    assert np.allclose(table["distance"].data, cgs["distance"].data)
+    assert list(table["count"].data) == [1, 2, 3]
+
+    table.convert_to({"mass": "Msun", "count": Unit()})
+    assert np.allclose(table["mass"].data, [1.0, 2.0, 3.0])
+    assert table.units["distance"] == Unit("cm")
+
+    # a bad column or unit leaves every column alone
+    for bad in [OrderedDict([("mass", "g"), ("distance", "s")]),
+                OrderedDict([("mass", "g"), ("radius", "cm")])]:
+        try:
+            table.convert_to(bad)
+        except Exception:
+            pass
+        else:
+            assert False
+        assert table.units["mass"] == Unit("Msun")
+        assert np.allclose(table["mass"].data, [1.0, 2.0, 3.0])
@@ -6,6 +6,8 @@ Copyright 2012, Casey W. Stark. See LICENSE.txt for more information.
 
 """
 
+from fractions import Fraction
+
 import nose
 
 from utils import equal_sigfigs
@@ -100,7 +102,8 @@ def test_creation_from_expr():
     assert u1.cgs_value == pc_cgs
     assert u2.cgs_value == yr_cgs
     assert u3.cgs_value == pc_cgs * yr_cgs
-    assert u4.cgs_value == pc_cgs**2 / yr_cgs
+    # the value is worked out exactly and rounded once
+    assert u4.cgs_value == float(Fraction(repr(pc_cgs))**2 / yr_cgs)
 
     assert u1.dimensions == length
     assert u2.dimensions == time
@@ -331,12 +334,14 @@ def test_power():
     u2 = u1**2
 
     assert u2.dimensions == u1_dims**2
-    assert u2.cgs_value == (pc_cgs**2 * mK_cgs**4)**2
+    assert u2.exact_cgs_value == \
+        (Fraction(repr(pc_cgs))**2 * Fraction(repr(mK_cgs))**4)**2
+    assert equal_sigfigs(u2.cgs_value, (pc_cgs**2 * mK_cgs**4)**2, 15)
 
     u3 = u1**(-1.0/3)
 
     assert u3.dimensions == nsimplify(u1_dims**(-1.0/3))
-    assert u3.cgs_value == (pc_cgs**2 * mK_cgs**4)**(-1.0/3)
+    assert u3.cgs_value == u1.cgs_value**(-1.0/3)
 
 def test_cgs_equivalent():
     """
@@ -382,3 +387,397 @@ def test_equality():
     assert u1 == u2
     assert u1.expr == u3
     assert not u1 == u3
+
+def test_interning():
+    """
+    Units built from the same string are the same object.
+
+    """
+    from dimensionful.units import unit_cache
+
+    unit_cache.clear()
+
+    u1 = Unit("Msun / yr")
+    u2 = Unit("Msun/yr")
+    u3 = Unit(" Msun /  yr ")
+
+    assert u1 is u2
+    assert u1 is u3
+
+    info = unit_cache.info()
+    assert info["misses"] == 1
+    assert info["hits"] == 2
+    assert info["size"] == 1
+
+    # custom units are not interned
+    from dimensionful.dimensions import mass
+    u4 = Unit("abc", cgs_value=42, dimensions=mass)
+    assert "abc" not in unit_cache
+
+    # the unit is rebuilt, but there is still only one Unit object for it
+    unit_cache.clear()
+    assert unit_cache.info()["size"] == 0
+    assert Unit("Msun/yr") is u1
+    assert unit_cache.info()["misses"] == 1
+
+    # spaces between tokens are kept, so the result doesn't depend on what is
+    # cached
+    from dimensionful.units import normalize_unit_string
+    assert normalize_unit_string(" m  s ") == "m s"
+    assert normalize_unit_string("1e -5 * m * * 2") == "1e -5*m* *2"
+    assert Unit("ms") is not Unit("m") * Unit("s")
+    for string in ["m s", "1e -5 m"]:
+        try:
+            Unit(string)
+        except Exception:
+            pass
+        else:
+            assert False, string
+
+def test_flyweight():
+    """
+    There is one Unit object for each unit, however it is built.
+
+    """
+    import copy
+    import pickle
+
+    u1 = Unit("km / s")
+    u2 = Unit("km") / Unit("s")
+    u3 = Unit("s**-1 * km")
+
+    assert u1 is u2
+    assert u1 is u3
+    assert copy.deepcopy(u1) is u1
+    assert pickle.loads(pickle.dumps(u1)) is u1
+
+    # equal units with different symbols are different objects
+    u4 = Unit("m / ms")
+    assert u4 is not u1
+    assert u4 == u1
+    assert hash(u4) == hash(u1)
+    assert u4 != Unit("m / s")
+
+    # units can't be changed
+    try:
+        u1.cgs_value = 2.0
+    except AttributeError:
+        pass
+    else:
+        assert False
+
+def test_sympy_adapter():
+    """
+    Units are not sympy objects, but work with sympy.
+
+    """
+    from sympy import Symbol, sqrt, sympify
+
+    u1 = Unit("Msun * pc**2 / yr**2")
+
+    assert u1.expr == Symbol("Msun") * Symbol("pc")**2 / Symbol("yr")**2
+    assert sympify(u1) == u1.expr
+    assert str(u1) == str(u1.expr)
+    assert Unit(sqrt(u1.expr)) == Unit("Msun**(1/2) * pc / yr")
+    assert Symbol("x") * u1 == Symbol("x") * u1.expr
+
+def test_interning_eviction():
+    """
+    The intern table drops the least recently used unit when full.
+
+    """
+    from dimensionful.units import unit_cache
+
+    old_maxsize = unit_cache.maxsize
+    unit_cache.clear()
+    unit_cache.resize(2)
+
+    try:
+        u1 = Unit("cm")
+        u2 = Unit("s")
+        assert Unit("cm") is u1  # cm is now the most recent
+        u3 = Unit("g")  # evicts s
+
+        assert len(unit_cache) == 2
+        assert "cm" in unit_cache
+        assert "g" in unit_cache
+        assert "s" not in unit_cache
+    finally:
+        unit_cache.resize(old_maxsize)
+
+def test_interning_threads():
+    """
+    Threads building the same unit string all get the same object.
+
+    """
+    import threading
+    from dimensionful.units import unit_cache
+
+    unit_cache.clear()
+    results = []
+
+    def build():
+        results.append(Unit("km * s**-1 * Mpc**-1"))
+
+    threads = [threading.Thread(target=build) for i in range(8)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert len(results) == 8
+    assert all(u is results[0] for u in results)
+
+def test_conversion_cache():
+    """
+    Conversion factors are validated once and then looked up.
+
+    """
+    from fractions import Fraction
+    from dimensionful.units import conversion_cache, get_conversion_factor, \
+        get_exact_conversion_factor
+
+    conversion_cache.clear()
+
+    u1 = Unit("Msun / yr")
+    u2 = Unit("g / s")
+    Msun_cgs = 1.98892e33
+    yr_cgs = 31536000
+
+    f1 = get_conversion_factor(u1, u2)
+    f2 = get_conversion_factor(u1, u2)
+
+    assert f1 == f2
+    assert equal_sigfigs(f1, Msun_cgs / yr_cgs, 12)
+    assert get_exact_conversion_factor(u1, u2) == \
+        u1.exact_cgs_value / u2.exact_cgs_value
+
+    info = conversion_cache.info()
+    assert info["size"] == 1
+    assert info["misses"] == 1
+    assert info["hits"] == 2
+
+    # bad dimensions raise and are not stored
+    try:
+        get_conversion_factor(u1, Unit("g"))
+    except Exception:
+        pass
+    else:
+        assert False
+    assert conversion_cache.info()["size"] == 1
+
+def test_lazy_package_import():
+    """
+    Importing the package builds nothing and does not load sympy. Common units
+    and constants are built when they are first used, and using them does not
+    load sympy either.
+
+    """
+    import os
+    import subprocess
+    import sys
+
+    script = ("import sys, dimensionful\n"
+              "assert 'sympy' not in sys.modules\n"
+              "assert 'Msun' not in vars(dimensionful.common_units)\n"
+              "from dimensionful import Msun, hbar\n"
+              "assert 'Msun' in vars(dimensionful.common_units)\n"
+              "assert 'pc' not in vars(dimensionful.common_units)\n"
+              "assert str(Msun) == 'Msun'\n"
+              "from dimensionful import Quantity\n"
+              "Quantity(1.0, Msun).get_in('g')\n"
+              "assert 'sympy' not in sys.modules\n")
+    repo_path = os.path.join(os.path.dirname(os.path.abspath(__file__)),
+                             os.pardir)
+
+    subprocess.check_call([sys.executable, "-c", script], cwd=repo_path)
+
+def test_common_units_and_constants():
+    """
+    The lazily built package attributes are the expected objects.
+
+    """
+    import dimensionful
+    from dimensionful import Msun, G, hbar, h, pi, energy
+    from dimensionful.dimensions import energy as energy_dims
+
+    assert Msun == Unit("Msun")
+    assert dimensionful.Msun is Msun
+    assert dimensionful.Unit is Unit
+    assert energy is energy_dims
+    assert G.units == Unit("cm**3 / g / s**2")
+    assert hbar.data == h.data / (2 * pi)
+
+    try:
+        dimensionful.not_a_unit
+    except AttributeError:
+        pass
+    else:
+        assert False
+
+def test_algebra_cache():
+    """
+    Repeated unit algebra returns the cached Unit object.
+
+    """
+    from dimensionful.units import algebra_cache
+
+    algebra_cache.clear()
+
+    u1 = Unit("Msun")
+    u2 = Unit("yr")
+
+    u3 = u1 / u2
+    assert u1 / u2 is u3
+    assert u1 * u2 is u1 * u2
+    assert u1**2 is u1**2
+    assert u1**2 is not u1**3
+    assert (u1**2).dimensions == u1.dimensions**2
+
+    info = algebra_cache.info()
+    assert info["misses"] == 4
+    assert info["hits"] == 5
+    assert info["size"] == 4
+
+    # equal powers are found, even when they are different objects
+    from dimensionful import instrument
+
+    power = float("2.5")
+    u1**power
+    with instrument.profile() as profile:
+        assert u1**float("2.5") is u1**power
+        assert u1**2.0 is u1**2
+    # only 2.0 is new, since powers of other types are kept apart
+    assert profile.stats["algebra"]["count"] == 1
+
+def test_pickle():
+    """
+    Units pickle as their string, cgs value, and dimension powers, and load
+    as the same object without sympy.
+
+    """
+    import pickle
+
+    from dimensionful.dimensions import length
+    from dimensionful.units import unit_from_string
+
+    u1 = Unit("Msun / yr")
+    assert u1.__reduce__() == (unit_from_string,
+                               ("Msun/yr", u1.cgs_value, (1, 0, -1, 0)))
+    assert len(pickle.dumps(u1, 2)) < 100
+
+    # half powers pickle as ** powers, not sqrt
+    u3 = Unit("cm**(1/2)")
+    assert u3.__reduce__()[1][0] == "cm**(1/2)"
+
+    # custom units with values that aren't a float keep their exact value
+    for unit in [u1, Unit(), Unit("km**(3/2) / s"), u3, Unit("s**(-1/2)"),
+                 Unit("g**(1/2)*cm"), Unit("g**(1/2)/s**(1/2)"),
+                 Unit("furlong", 20116.8, length)**Fraction(1, 2),
+                 Unit("furlong", 20116.8, length) / Unit("s"),
+                 Unit("furlong", 20116.8, length) / Unit("yr")]:
+        for protocol in range(pickle.HIGHEST_PROTOCOL + 1):
+            assert pickle.loads(pickle.dumps(unit, protocol)) is unit
+
+    # a unit whose definition changed keeps its pickled value
+    u2 = unit_from_string("Msun", 2e33, (1, 0, 0, 0))
+    assert u2.cgs_value == 2e33
+    assert u2 != Unit("Msun")
+
+
+def test_exact_values():
+    """
+    Units carry their exact cgs value, so the value doesn't depend on how the
+    unit was built, and conversion factors are rounded once.
+
+    """
+    from dimensionful.units import get_conversion_factor, \
+        get_exact_conversion_factor
+
+    Msun = Unit("Msun")
+    yr = Unit("yr")
+    assert Msun.exact_cgs_value == Fraction(198892 * 10**28)
+    assert Unit("mm").exact_cgs_value == Fraction(1, 10)
+    assert Unit("Msun / yr").cgs_value == float(Fraction(198892 * 10**28,
+                                                         31536000))
+
+    # the same unit, built different ways, is the same object
+    assert Msun / yr * yr is Msun
+    assert (Msun / yr)**2 / (Msun / yr) is Unit("Msun / yr")
+    assert Unit("km**2 / km") is Unit("km")
+    assert Unit("km * ks") == Unit("m * Ms")
+
+    # the factors of a chain of conversions multiply out exactly
+    u1 = Unit("Msun / yr")
+    u2 = Unit("g / s")
+    u3 = Unit("kg / day")
+    there = get_exact_conversion_factor(u1, u2)
+    back = get_exact_conversion_factor(u2, u1)
+    assert there * back == 1
+    assert there * get_exact_conversion_factor(u2, u3) == \
+        get_exact_conversion_factor(u1, u3)
+    assert get_conversion_factor(u1, u2) == float(there)
+
+def test_registry():
+    """
+    Registries look up prefixed symbols with one dict lookup, and parse unit
+    strings again after a unit is registered. Separate registries don't see
+    each other's units.
+
+    """
+    from dimensionful.dimensions import length, mass, time
+    from dimensionful.units import UnitRegistry, default_registry, \
+        lookup_unit_symbol, register_unit
+
+    assert lookup_unit_symbol("km") == (Fraction(10**5), length)
+    assert lookup_unit_symbol("Msun") == (Fraction(198892 * 10**28), mass)
+    assert "kpc" in default_registry
+    assert "kfoo" not in default_registry
+
+    registry = UnitRegistry()
+    assert registry.version == 0
+    assert registry.get_unit("km / s") is Unit("km / s")
+
+    try:
+        registry.get_unit("furlong / fortnight")
+    except Exception:
+        pass
+    else:
+        assert False
+
+    registry.register_unit("furlong", 20116.8, length)
+    registry.register_unit("fortnight", 1209600, time, prefixable=False)
+    assert registry.version == 2
+    assert len(registry.unit_cache) == 0
+
+    u1 = registry.get_unit("furlong / fortnight")
+    assert u1.exact_cgs_value == Fraction(201168, 10 * 1209600)
+    assert registry.get_unit("furlong/fortnight") is u1
+    assert registry.get_unit("kfurlong").cgs_value == 20116800
+    assert "kfortnight" not in registry
+
+    # other registries don't know the new units
+    assert "furlong" not in default_registry
+    assert "furlong" not in UnitRegistry()
+
+    # changing a unit changes the units parsed after
+    registry.register_unit("furlong", Fraction(201168, 10), length)
+    assert registry.get_unit("furlong / fortnight") is u1
+    registry.register_unit("furlong", 2e4, length)
+    assert registry.get_unit("furlong / fortnight") != u1
+
+    # and the default registry works the same way
+    version = default_registry.version
+    register_unit("smoot", 170.18, length)
+    assert default_registry.version == version + 1
+    assert Unit("smoot / s").cgs_value == 170.18
+    assert Unit("ksmoot").cgs_value == 170180
+
+    for bad in [("2x", 1, length), ("a b", 1, length), ("x", 0, length),
+                ("x", -1, length), ("x", 1, "length")]:
+        try:
+            registry.register_unit(*bad)
+        except Exception:
+            pass
+        else:
+            assert False, bad